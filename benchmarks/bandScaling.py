@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+'''Times edge, colorDiff, median and chromaKey split over row bands with 1 up
+to all cores on a synthetic 4K frame.
+
+The speedup over one worker should grow close to the worker count.
+
+    python benchmarks/bandScaling.py [height width]
+'''
+
+from __future__ import print_function
+
+import multiprocessing
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+import ops
+import parallel
+from blurRadius import best
+
+#(name, function of the foreground and background, halo rows) of the timed operations
+OPERATIONS = [
+    ('edge', lambda a, b: ops.edge(a), 1),
+    ('colorDiff', ops.colorDiff, 0),
+    ('median', lambda a, b: ops.median(a), 1),
+    ('chromaKey', lambda a, b: ops.chromaKey(a, b, 200, 260, 0.3), 0),
+]
+
+
+def workerCounts():
+    '''Gets the worker counts to time, doubling up to the number of cores
+
+        Returns:
+            A list of int worker counts
+    '''
+    cores = multiprocessing.cpu_count()
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+
+if __name__ == '__main__':
+    height, width = (int(sys.argv[1]), int(sys.argv[2])) if len(sys.argv) > 2 else (2160, 3840)
+    random = np.random.RandomState(0)
+    aArray = random.randint(0, 256, (height, width, 4)).astype(np.uint8)
+    bArray = random.randint(0, 256, (height, width, 4)).astype(np.uint8)
+
+    counts = workerCounts()
+    print("synthetic %dx%d, %d cores" % (width, height, multiprocessing.cpu_count()))
+    print("%-10s" % "operation" + "".join("%14s" % ("%d workers" % count) for count in counts))
+    for name, function, halo in OPERATIONS:
+        times = []
+        for count in counts:
+            parallel.setWorkers(count)
+            times.append(best(parallel.run, function, [aArray, bArray], halo))
+        print("%-10s" % name + "".join("%8.0f ms %3.1fx" % (seconds * 1000, times[0] / seconds)
+                                       for seconds in times))
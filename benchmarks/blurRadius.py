@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+'''Times ops.boxBlur and ops.gaussianBlur on church.png from radius 1 to 50.
+
+The box blur time should stay flat as the radius grows.
+
+    python benchmarks/blurRadius.py [image]
+'''
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ops
+import pixelEngine
+
+RADII = [1, 2, 3, 5, 10, 20, 30, 50]
+REPEATS = 3
+
+
+def best(function, *args):
+    '''Times a function call
+
+        Returns:
+            The fastest wall time in seconds of REPEATS calls
+    '''
+    times = []
+    for i in range(REPEATS):
+        start = time.time()
+        function(*args)
+        times.append(time.time() - start)
+    return min(times)
+
+
+if __name__ == '__main__':
+    fileName = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, 'Images', 'orgImages', 'church.png')
+    array = pixelEngine.loadImage(fileName)
+    if array is None:
+        sys.exit("cannot load %s" % fileName)
+
+    print("%s %dx%d" % (os.path.basename(fileName), array.shape[1], array.shape[0]))
+    print("%6s %10s %10s" % ("radius", "box ms", "gauss ms"))
+    for radius in RADII:
+        print("%6d %10.1f %10.1f" % (radius, best(ops.boxBlur, array, radius) * 1000,
+                                     best(ops.gaussianBlur, array, radius) * 1000))
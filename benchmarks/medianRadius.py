@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+'''Times the two median filters on a plane of lena_sp_noise.png from radius 1
+to 15 and reports where the sliding histograms overtake sorting.
+
+Sorting costs grow with the window, the sliding histograms stay flat.
+filters.HISTOGRAM_MEDIAN_RADIUS is set to the crossover this reports. Sorting
+is no longer timed past the crossover.
+
+    python benchmarks/medianRadius.py [image]
+'''
+
+from __future__ import print_function
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import filters
+import ops
+import pixelEngine
+from blurRadius import best
+
+RADII = [1, 2, 3, 4, 5, 6, 7, 8, 10, 15]
+
+
+if __name__ == '__main__':
+    fileName = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, 'Images', 'orgImages', 'lena_sp_noise.png')
+    array = pixelEngine.loadImage(fileName)
+    if array is None:
+        sys.exit("cannot load %s" % fileName)
+    plane = array[:, :, ops.GREEN].copy()
+
+    print("%s %dx%d" % (os.path.basename(fileName), array.shape[1], array.shape[0]))
+    print("%6s %10s %10s" % ("radius", "sort ms", "hist ms"))
+    crossover = None
+    for radius in RADII:
+        histogram = best(filters.histogramMedian, plane, radius)
+        if crossover is None:
+            window = best(filters.windowMedian, plane, radius)
+            print("%6d %10.1f %10.1f" % (radius, window * 1000, histogram * 1000))
+            if histogram < window:
+                crossover = radius
+        else:
+            print("%6d %10s %10.1f" % (radius, "-", histogram * 1000))
+
+    print("sliding histograms are faster from radius %s (HISTOGRAM_MEDIAN_RADIUS is %d)"
+          % (crossover, filters.HISTOGRAM_MEDIAN_RADIUS))
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+'''Times every operation of the Edit menu on the sample images and on
+synthetic 1K, 4K and 8K frames, writes a JSON report and compares it with a
+baseline report.
+
+Each case runs in a fresh process so the peak resident memory it reports
+belongs to that case alone. A case regresses when its megapixels per second
+drop more than the threshold below the baseline, and the script then exits
+with status 1:
+
+    python benchmarks/suite.py -o report.json
+    python benchmarks/suite.py --baseline benchmarks/baseline.json --threshold 0.1
+
+Copy a report to benchmarks/baseline.json to make it the default baseline.
+'''
+
+from __future__ import print_function
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+import imagemanip
+import ops
+import parallel
+import pixelEngine
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#synthetic frame name -> (width, height)
+SYNTHETIC = {
+    '1K': (1024, 540),
+    '4K': (4096, 2160),
+    '8K': (8192, 4320),
+}
+
+#operation parameters, the same names as the imagemanip options
+PARAMETERS = ['--gamma', '2.2', '--radius', '3', '--kernel', '1,2,1; 2,4,2; 1,2,1',
+              '--mix', '0.6:0.4', '--lum', '0.4', '--hue', '200:260', '--sat', '0.3']
+
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+REPEATS = 3
+
+
+def operationArguments():
+    '''Parses PARAMETERS the way imagemanip does
+
+        Returns:
+            The parsed arguments for imagemanip.OPERATIONS
+    '''
+    parser = argparse.ArgumentParser()
+    imagemanip.addOperationArguments(parser)
+    return parser.parse_args(['--op', 'gamma'] + PARAMETERS)
+
+
+def synthetic(width, height):
+    '''Builds a frame of color gradients with an alpha ramp
+
+        Args:
+            width: int frame width
+            height: int frame height
+
+        Returns:
+            The (height, width, 4) uint8 pixel array
+    '''
+    columns = np.linspace(0, 255, width).astype(np.uint8)
+    rows = np.linspace(0, 255, height).astype(np.uint8)[:, np.newaxis]
+
+    array = np.empty((height, width, 4), np.uint8)
+    array[:, :, ops.RED] = columns
+    array[:, :, ops.GREEN] = rows
+    array[:, :, ops.BLUE] = columns + rows
+    array[:, :, ops.ALPHA] = 255 - array[:, :, ops.GREEN]
+    return array
+
+
+def loadCase(image):
+    '''Gets the foreground and background of a case
+
+        Args:
+            image: synthetic frame name or image file path
+
+        Returns:
+            A (foreground, background) tuple of pixel arrays, the background
+            is the foreground flipped upside down
+    '''
+    if image in SYNTHETIC:
+        aArray = synthetic(*SYNTHETIC[image])
+    else:
+        aArray = pixelEngine.loadImage(image)
+        if aArray is None:
+            raise IOError("cannot load %s" % image)
+
+    return aArray, np.ascontiguousarray(aArray[::-1])
+
+
+def peakRss():
+    '''Gets the peak resident memory of the process
+
+        Returns:
+            The peak in megabytes or None where it is not available
+    '''
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #bytes on macOS, kilobytes elsewhere
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+def runCase(case):
+    '''Times one operation on one image, in its own process
+
+        Args:
+            case: (operation name, image, repeats, workers) tuple, workers is
+                0 to call the operation directly
+
+        Returns:
+            The result dict of the case
+    '''
+    name, image, repeats, workers = case
+    args = operationArguments()
+    aArray, bArray = loadCase(image)
+    function = imagemanip.OPERATIONS[name]
+
+    if workers:
+        parallel.setWorkers(workers)
+        halo = imagemanip.HALOS[name](args) if name in imagemanip.HALOS else 0
+        call = lambda: parallel.run(lambda a, b: function(a, b, args), [aArray, bArray], halo)
+    else:
+        call = lambda: function(aArray, bArray, args)
+
+    times = []
+    for i in range(repeats):
+        start = time.time()
+        call()
+        times.append(time.time() - start)
+
+    height, width = aArray.shape[:2]
+    seconds = min(times)
+    return {
+        'operation': name,
+        'image': image if image in SYNTHETIC else os.path.basename(image),
+        'width': width,
+        'height': height,
+        'seconds': seconds,
+        'megapixelsPerSecond': width * height / 1e6 / seconds,
+        'peakRssMB': peakRss(),
+    }
+
+
+def compare(results, baseline, threshold):
+    '''Finds the cases that got slower than the baseline
+
+        Args:
+            results: list of result dicts
+            baseline: list of result dicts of the baseline report
+            threshold: float fraction of throughput that may be lost
+
+        Returns:
+            A list of (result, baseline result) tuples of the regressions
+    '''
+    reference = dict(((result['operation'], result['image']), result) for result in baseline)
+    regressions = []
+
+    for result in results:
+        old = reference.get((result['operation'], result['image']))
+        if old is not None and result['megapixelsPerSecond'] < old['megapixelsPerSecond'] * (1 - threshold):
+            regressions.append((result, old))
+
+    return regressions
+
+
+def main(argv=None):
+    '''Runs the benchmark cases, writes the report and checks the baseline
+
+        Args:
+            argv: list of command line arguments, sys.argv if None
+
+        Returns:
+            The exit status, 1 if any case regressed
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--ops', nargs='+', choices=sorted(imagemanip.OPERATIONS),
+                        default=sorted(imagemanip.OPERATIONS), help='operations to time')
+    parser.add_argument('--sizes', nargs='*', choices=sorted(SYNTHETIC), default=sorted(SYNTHETIC),
+                        help='synthetic frames to time')
+    parser.add_argument('--no-samples', action='store_true', help='skip the images in Images/orgImages')
+    parser.add_argument('--repeats', type=int, default=REPEATS, help='calls per case, the fastest counts')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='split the operations over row bands on this many threads, 0 to call them directly')
+    parser.add_argument('-o', '--output', default='benchmark.json', help='JSON report to write')
+    parser.add_argument('--baseline', default=BASELINE, help='JSON report to compare with, if it exists')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fraction of megapixels per second a case may lose against the baseline')
+    args = parser.parse_args(argv)
+
+    images = [] if args.no_samples else sorted(glob.glob(os.path.join(ROOT, 'Images', 'orgImages', '*')))
+    images += sorted(args.sizes, key=lambda size: SYNTHETIC[size])
+    cases = [(name, image, args.repeats, args.workers) for image in images for name in args.ops]
+
+    #a fresh process per case keeps the peak memory of each case apart
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)
+    results = []
+    print("%-12s %-18s %11s %10s %8s %8s" % ("operation", "image", "size", "ms", "MP/s", "RSS MB"))
+    for result in pool.imap(runCase, cases):
+        results.append(result)
+        print("%-12s %-18s %11s %10.1f %8.1f %8s" % (
+            result['operation'], result['image'], "%dx%d" % (result['width'], result['height']),
+            result['seconds'] * 1000, result['megapixelsPerSecond'],
+            "-" if result['peakRssMB'] is None else "%.0f" % result['peakRssMB']))
+    pool.close()
+    pool.join()
+
+    report = {
+        'machine': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'cores': multiprocessing.cpu_count(),
+        },
+        'workers': args.workers,
+        'repeats': args.repeats,
+        'results': results,
+    }
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2, sort_keys=True)
+    print("wrote %s" % args.output)
+
+    if not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline) as baselineFile:
+        baseline = json.load(baselineFile)['results']
+
+    regressions = compare(results, baseline, args.threshold)
+    for result, old in regressions:
+        print("REGRESSION %s on %s: %.1f MP/s, baseline %.1f MP/s" % (
+            result['operation'], result['image'], result['megapixelsPerSecond'],
+            old['megapixelsPerSecond']))
+    print("%d of %d cases regressed more than %.0f%% against %s" % (
+        len(regressions), len(results), args.threshold * 100, args.baseline))
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
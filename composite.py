@@ -0,0 +1,221 @@
+'''Porter-Duff compositing on premultiplied 8-bit pixel arrays.
+
+The operators work on premultiplied ARGB, the byte layout of Qt's
+Format_ARGB32_Premultiplied, where every operator is the same formula for
+the color channels and the alpha, so all four channels are computed at once.
+Products of two 0-255 values are rounded fixed-point divisions by 255 in
+uint16, with no float planes and no per-pixel division. apply() and
+composite() run the operators over strips of ROWS rows so the uint16
+temporaries stay in cache.
+
+Images in the viewer are straight (Format_ARGB32), so composite() converts
+them with premultiply and unpremultiply around the operator, once on the way
+in and once on the way out of each strip.
+'''
+
+import sys
+
+import numpy as np
+
+#byte position of the alpha inside a Format_ARGB32 pixel, as ops.ALPHA
+ALPHA = 3 if sys.byteorder == 'little' else 0
+
+#rows composited at a time, few enough for the uint16 temporaries to stay in cache
+ROWS = 32
+
+
+def multiply(a, b):
+    '''Multiplies 0-255 values as fractions of 255, rounded to the nearest
+    integer: a * b / 255
+
+        Args:
+            a: uint8 array
+            b: uint8 array broadcasting to the shape of a
+
+        Returns:
+            The uint16 array of products (0-255)
+    '''
+    product = a.astype(np.uint16)
+    product *= b
+    product += 128
+    product += product >> 8
+    product >>= 8
+    return product
+
+
+def alpha(array):
+    '''Gets the alpha of a pixel array, shaped to scale all four channels
+
+        Args:
+            array: (height, width, 4) uint8 pixel array
+
+        Returns:
+            The (height, width, 1) uint8 alpha view
+    '''
+    return array[:, :, ALPHA:ALPHA + 1]
+
+
+def clampPixels(values):
+    '''Clamps uint16 sums back to a uint8 pixel array
+    '''
+    return np.minimum(values, 255).astype(np.uint8)
+
+
+def _unpremultiplyTable():
+    '''Builds the straight values of every premultiplied value and alpha
+
+        Returns:
+            The read-only 65536-entry uint8 table, indexed by
+            alpha * 256 + premultiplied value
+    '''
+    alphas = np.arange(256, dtype=np.uint32)[:, np.newaxis]
+    values = np.arange(256, dtype=np.uint32)[np.newaxis, :]
+    straight = (values * 255 + alphas // 2) // np.maximum(alphas, 1)
+    table = np.where(alphas > 0, np.minimum(straight, 255), 0).astype(np.uint8).ravel()
+    table.setflags(write=False)
+    return table
+
+UNPREMULTIPLY = _unpremultiplyTable()
+
+
+def premultiply(array):
+    '''Converts a straight pixel array to premultiplied alpha
+
+        Args:
+            array: straight (height, width, 4) uint8 pixel array
+
+        Returns:
+            The premultiplied pixel array
+    '''
+    out = multiply(array, alpha(array)).astype(np.uint8)
+    out[:, :, ALPHA] = array[:, :, ALPHA]
+    return out
+
+
+def unpremultiply(array):
+    '''Converts a premultiplied pixel array back to straight alpha, fully
+    transparent pixels become transparent black
+
+        Args:
+            array: premultiplied (height, width, 4) uint8 pixel array
+
+        Returns:
+            The straight pixel array
+    '''
+    index = (alpha(array).astype(np.uint16) << 8) | array
+    out = np.take(UNPREMULTIPLY, index)
+    out[:, :, ALPHA] = array[:, :, ALPHA]
+    return out
+
+
+def over(aArray, bArray):
+    '''O = A + B * (1 - alphaA)
+    '''
+    return clampPixels(aArray + multiply(bArray, 255 - alpha(aArray)))
+
+
+def in_(aArray, bArray):
+    '''O = A * alphaB
+    '''
+    return multiply(aArray, alpha(bArray)).astype(np.uint8)
+
+
+def out(aArray, bArray):
+    '''O = A * (1 - alphaB)
+    '''
+    return multiply(aArray, 255 - alpha(bArray)).astype(np.uint8)
+
+
+def atop(aArray, bArray):
+    '''O = A * alphaB + B * (1 - alphaA)
+    '''
+    return clampPixels(multiply(aArray, alpha(bArray)) + multiply(bArray, 255 - alpha(aArray)))
+
+
+def xor(aArray, bArray):
+    '''O = A * (1 - alphaB) + B * (1 - alphaA)
+    '''
+    return clampPixels(multiply(aArray, 255 - alpha(bArray)) + multiply(bArray, 255 - alpha(aArray)))
+
+
+def plus(aArray, bArray):
+    '''O = A + B
+    '''
+    return clampPixels(aArray.astype(np.uint16) + bArray)
+
+
+def screen(aArray, bArray):
+    '''O = A + B - A * B
+    '''
+    return clampPixels(aArray.astype(np.uint16) + bArray - multiply(aArray, bArray))
+
+
+def multiplyOver(aArray, bArray):
+    '''O = A * B + A * (1 - alphaB) + B * (1 - alphaA)
+    '''
+    return clampPixels(multiply(aArray, bArray) + multiply(aArray, 255 - alpha(bArray))
+                       + multiply(bArray, 255 - alpha(aArray)))
+
+
+#operator name -> function(premultiplied foreground, premultiplied background)
+OPERATORS = {
+    'over': over,
+    'in': in_,
+    'out': out,
+    'atop': atop,
+    'xor': xor,
+    'plus': plus,
+    'screen': screen,
+    'multiply': multiplyOver,
+}
+
+
+def strips(function, aArray, bArray):
+    '''Runs a function of two pixel arrays over strips of ROWS rows
+
+        Args:
+            function: function taking a foreground and a background strip
+                and returning the result strip
+            aArray: foreground pixel array
+            bArray: background pixel array of the same size
+
+        Returns:
+            The new pixel array of the results
+    '''
+    out = np.empty(bArray.shape, np.uint8)
+    for top in range(0, bArray.shape[0], ROWS):
+        rows = slice(top, top + ROWS)
+        out[rows] = function(aArray[rows], bArray[rows])
+
+    return out
+
+
+def apply(operator, aArray, bArray):
+    '''Composites two premultiplied pixel arrays with a Porter-Duff operator
+
+        Args:
+            operator: operator name from OPERATORS
+            aArray: premultiplied foreground pixel array
+            bArray: premultiplied background pixel array
+
+        Returns:
+            The premultiplied composited pixel array
+    '''
+    return strips(OPERATORS[operator], aArray, bArray)
+
+
+def composite(operator, aArray, bArray):
+    '''Composites two straight pixel arrays with a Porter-Duff operator,
+    premultiplying them on the way in and unpremultiplying the result
+
+        Args:
+            operator: operator name from OPERATORS
+            aArray: straight foreground pixel array
+            bArray: straight background pixel array
+
+        Returns:
+            The straight composited pixel array
+    '''
+    function = OPERATORS[operator]
+    return strips(lambda a, b: unpremultiply(function(premultiply(a), premultiply(b))),
+                  aArray, bArray)
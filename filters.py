@@ -0,0 +1,389 @@
+'''Spatial filters on single float planes.
+
+convolve applies any NxM kernel, directly for small kernels and through the
+FFT once the kernel has FFT_MIN_TAPS weights or more. The blurs cost the same
+per pixel whatever their radius: separable kernels (box, Gaussian) run as a
+row pass followed by a column pass, and large box blurs read their window sums
+from a summed-area table. Along the border the blurs only average the pixels
+inside the image, so edges do not darken. ops applies these to each color
+plane of a pixel array. median sorts small windows and slides histograms
+over larger ones, whose cost does not grow with the window either.
+'''
+
+import numpy as np
+
+#kernels with at least this many weights are convolved through the FFT
+FFT_MIN_TAPS = 49
+
+#box blurs up to this radius use two 1D passes, larger ones a summed-area table
+SEPARABLE_BOX_RADIUS = 2
+
+#medians from this radius up use the sliding histograms instead of sorting
+HISTOGRAM_MEDIAN_RADIUS = 7
+
+#sorted medians work through this many rows at a time to bound the window stack
+MEDIAN_STRIP_ROWS = 64
+
+
+def directConvolve(plane, kernel):
+    '''Convolves a plane with a kernel by summing one shifted copy of the
+    zero padded plane per kernel weight
+
+        Args:
+            plane: 2D float array
+            kernel: 2D float array of kernel weights, applied as written
+
+        Returns:
+            The filtered float32 plane
+    '''
+    kRows, kCols = kernel.shape
+    height, width = plane.shape
+
+    padded = np.zeros((height + kRows - 1, width + kCols - 1), np.float32)
+    padded[kRows // 2:kRows // 2 + height, kCols // 2:kCols // 2 + width] = plane
+
+    total = np.zeros((height, width), np.float32)
+    for kRow in range(kRows):
+        for kCol in range(kCols):
+            if kernel[kRow, kCol] != 0:
+                total += padded[kRow:kRow + height, kCol:kCol + width] * kernel[kRow, kCol]
+
+    return total
+
+
+def fastLength(length):
+    '''Finds the smallest FFT friendly length (only factors 2, 3 and 5)
+
+        Args:
+            length: int minimum length
+
+        Returns:
+            The int FFT length
+    '''
+    while True:
+        rest = length
+        for factor in (2, 3, 5):
+            while rest % factor == 0:
+                rest //= factor
+        if rest == 1:
+            return length
+        length += 1
+
+
+def fftConvolve(plane, kernel):
+    '''Convolves a plane with a kernel by multiplying their spectra. Gives the
+    same result as directConvolve up to float rounding.
+
+        Args:
+            plane: 2D float array
+            kernel: 2D float array of kernel weights, applied as written
+
+        Returns:
+            The filtered float32 plane
+    '''
+    kRows, kCols = kernel.shape
+    height, width = plane.shape
+    shape = (fastLength(height + kRows - 1), fastLength(width + kCols - 1))
+
+    #flip the kernel so the product of spectra applies it as written
+    spectrum = np.fft.rfft2(plane, shape) * np.fft.rfft2(kernel[::-1, ::-1], shape)
+    full = np.fft.irfft2(spectrum, shape)
+
+    #line the kernel center up the same way as directConvolve
+    top = kRows - 1 - kRows // 2
+    left = kCols - 1 - kCols // 2
+    return full[top:top + height, left:left + width].astype(np.float32)
+
+
+def convolve(plane, kernel):
+    '''Convolves a plane with any NxM kernel. Pixels outside of the image do
+    not contribute to the sum.
+
+        Args:
+            plane: 2D float array
+            kernel: 2D list of kernel weights, applied as written around each
+                pixel (the top left weight multiplies the top left neighbour)
+
+        Returns:
+            The filtered float32 plane
+    '''
+    kernel = np.asarray(kernel, np.float32)
+
+    if kernel.size >= FFT_MIN_TAPS:
+        return fftConvolve(plane, kernel)
+
+    return directConvolve(plane, kernel)
+
+
+def convolve1d(plane, weights, axis):
+    '''Convolves a plane with 1D weights along one axis. Pixels outside of the
+    image do not contribute to the sum.
+
+        Args:
+            plane: 2D float array
+            weights: odd length list of symmetric kernel weights
+            axis: 0 to filter down the columns, 1 to filter along the rows
+
+        Returns:
+            The filtered float32 plane
+    '''
+    radius = len(weights) // 2
+    length = plane.shape[axis]
+
+    padding = [(0, 0), (0, 0)]
+    padding[axis] = (radius, radius)
+    padded = np.pad(plane, padding, 'constant')
+
+    total = np.zeros(plane.shape, np.float32)
+    for tap, weight in enumerate(weights):
+        window = [slice(None), slice(None)]
+        window[axis] = slice(tap, tap + length)
+        total += padded[tuple(window)] * weight
+
+    return total
+
+
+def separableFilter(plane, weights):
+    '''Filters a plane with the outer product of symmetric 1D weights as a row
+    pass and a column pass, normalized by the weights inside the image.
+
+        Args:
+            plane: 2D float array
+            weights: odd length list of symmetric kernel weights
+
+        Returns:
+            The filtered float32 plane
+    '''
+    weights = np.asarray(weights, np.float32)
+    height, width = plane.shape
+
+    total = convolve1d(convolve1d(plane, weights, 1), weights, 0)
+
+    #sum of the weights that fall inside the image for each row and column
+    rowCover = np.convolve(np.ones(height), weights, 'same').astype(np.float32)
+    colCover = np.convolve(np.ones(width), weights, 'same').astype(np.float32)
+
+    return total / np.outer(rowCover, colCover)
+
+
+def boxSum(plane, radius):
+    '''Sums every (2*radius+1) square window of a plane with a summed-area table
+
+        Args:
+            plane: 2D float array
+            radius: int distance from the center to the edge of the window
+
+        Returns:
+            A (sums, counts) tuple of planes holding the window sums and the
+            number of pixels inside the image for each window
+    '''
+    height, width = plane.shape
+
+    table = np.zeros((height + 1, width + 1), np.float64)
+    np.cumsum(np.cumsum(plane, 0, dtype=np.float64), 1, out=table[1:, 1:])
+
+    rows = np.arange(height)
+    rowLow = np.clip(rows - radius, 0, height)
+    rowHigh = np.clip(rows + radius + 1, 0, height)
+
+    cols = np.arange(width)
+    colLow = np.clip(cols - radius, 0, width)
+    colHigh = np.clip(cols + radius + 1, 0, width)
+
+    strips = table[rowHigh] - table[rowLow]
+    sums = strips[:, colHigh] - strips[:, colLow]
+    counts = np.outer(rowHigh - rowLow, colHigh - colLow)
+
+    return sums, counts
+
+
+def boxBlur(plane, radius):
+    '''Averages every (2*radius+1) square window of a plane
+
+        Args:
+            plane: 2D float array
+            radius: int blur radius, 0 leaves the plane unchanged
+
+        Returns:
+            The blurred float32 plane
+    '''
+    if radius <= SEPARABLE_BOX_RADIUS:
+        return separableFilter(plane, np.ones(2 * radius + 1))
+
+    sums, counts = boxSum(plane, radius)
+    return (sums / counts).astype(np.float32)
+
+
+def gaussianWeights(radius):
+    '''Builds normalized 1D Gaussian weights with a sigma of half the radius
+
+        Args:
+            radius: int kernel radius
+
+        Returns:
+            A float32 array of 2*radius+1 weights
+    '''
+    sigma = radius / 2.0
+    x = np.arange(-radius, radius + 1, dtype=np.float64)
+    weights = np.exp(-(x * x) / (2 * sigma * sigma))
+    return (weights / weights.sum()).astype(np.float32)
+
+
+def gaussianBlur(plane, radius):
+    '''Blurs a plane with a separable Gaussian kernel
+
+        Args:
+            plane: 2D float array
+            radius: int blur radius, 0 leaves the plane unchanged
+
+        Returns:
+            The blurred float32 plane
+    '''
+    if radius < 1:
+        return plane.astype(np.float32)
+
+    return separableFilter(plane, gaussianWeights(radius))
+
+
+def windowSum(values, radius, axis):
+    '''Sums a sliding window of values along one axis with running sums. The
+    window stops at the border of the image.
+
+        Args:
+            values: 2D array of integer or bool values
+            radius: int distance from the center to the edge of the window
+            axis: 0 to slide down the columns, 1 to slide along the rows
+
+        Returns:
+            A 2D int32 array of the window sums
+    '''
+    length = values.shape[axis]
+
+    shape = list(values.shape)
+    shape[axis] = length + 1
+    running = np.zeros(shape, np.int32)
+
+    inner = [slice(None), slice(None)]
+    inner[axis] = slice(1, None)
+    np.cumsum(values, axis, dtype=np.int32, out=running[tuple(inner)])
+
+    index = np.arange(length)
+    high = np.minimum(index + radius + 1, length)
+    low = np.maximum(index - radius, 0)
+
+    return np.take(running, high, axis) - np.take(running, low, axis)
+
+
+def windowMedian(plane, radius):
+    '''Finds the median of the (2*radius+1) square around each pixel by
+    sorting the neighbours, a strip of rows at a time. Along the border only
+    the neighbours inside the image are ranked and the upper median is taken.
+
+        Args:
+            plane: 2D uint8 array
+            radius: int filter radius
+
+        Returns:
+            The filtered uint8 plane
+    '''
+    height, width = plane.shape
+    size = 2 * radius + 1
+
+    #neighbours outside of the image are 256 so that they sort last
+    padded = np.full((height + 2 * radius, width + 2 * radius), 256, np.uint16)
+    padded[radius:radius + height, radius:radius + width] = plane
+
+    count = windowSum(windowSum(np.ones(plane.shape, np.int32), radius, 1), radius, 0)
+    index = count // 2
+
+    out = np.empty(plane.shape, np.uint8)
+    for top in range(0, height, MEDIAN_STRIP_ROWS):
+        bottom = min(top + MEDIAN_STRIP_ROWS, height)
+        window = np.stack([padded[top + r:bottom + r, c:c + width]
+                           for r in range(size) for c in range(size)], axis=-1)
+        window.sort(axis=-1)
+        out[top:bottom] = np.take_along_axis(window, index[top:bottom, :, np.newaxis], -1)[:, :, 0]
+
+    return out
+
+
+def histogramMedian(plane, radius):
+    '''Finds the median of the (2*radius+1) square around each pixel from
+    sliding histograms (Perreault and Hebert). Each column keeps the histogram
+    of the pixels above and below it in the window, which changes by one pixel
+    in and one out per row. The window histograms are differences of running
+    sums of those across the row, and the median is found in a 16 level coarse
+    histogram and then the 16 levels of the bin it falls in. Nothing depends
+    on the radius, so neither does the cost. Along the border only the pixels
+    inside the image are ranked and the upper median is taken.
+
+        Args:
+            plane: 2D uint8 array
+            radius: int filter radius
+
+        Returns:
+            The filtered uint8 plane
+    '''
+    height, width = plane.shape
+
+    count = windowSum(windowSum(np.ones(plane.shape, np.int32), radius, 1), radius, 0)
+    rank = count // 2 + 1
+
+    columns = np.arange(width)
+    high = np.minimum(columns + radius + 1, width)
+    low = np.maximum(columns - radius, 0)
+
+    #level by column, so the running sums run along contiguous rows
+    fine = np.zeros((256, width), np.int32)
+    coarse = np.zeros((16, width), np.int32)
+    fineSum = np.zeros((256, width + 1), np.int32)
+    coarseSum = np.zeros((16, width + 1), np.int32)
+    offsets = np.arange(16)[:, np.newaxis]
+
+    out = np.empty(plane.shape, np.uint8)
+    for row in range(-radius, height):
+        if row + radius < height:
+            line = plane[row + radius]
+            fine[line, columns] += 1
+            coarse[line >> 4, columns] += 1
+        if row - radius - 1 >= 0:
+            line = plane[row - radius - 1]
+            fine[line, columns] -= 1
+            coarse[line >> 4, columns] -= 1
+        if row < 0:
+            continue
+
+        np.cumsum(coarse, 1, out=coarseSum[:, 1:])
+        np.cumsum(fine, 1, out=fineSum[:, 1:])
+
+        #the coarse bin where the window count reaches the rank
+        total = np.cumsum(coarseSum[:, high] - coarseSum[:, low], 0)
+        bins = (total < rank[row]).sum(0)
+        below = np.where(bins > 0, total[bins - 1, columns], 0)
+
+        #then the level within that bin
+        levels = bins * 16 + offsets
+        total = np.cumsum(fineSum[levels, high] - fineSum[levels, low], 0) + below
+        out[row] = bins * 16 + (total < rank[row]).sum(0)
+
+    return out
+
+
+def median(plane, radius):
+    '''Finds the median of the (2*radius+1) square around each pixel.
+    Small windows are sorted, larger ones use the sliding histograms, from
+    HISTOGRAM_MEDIAN_RADIUS up where benchmarks/medianRadius.py measures them
+    as faster.
+
+        Args:
+            plane: 2D uint8 array
+            radius: int filter radius
+
+        Returns:
+            The filtered uint8 plane
+    '''
+    if radius < 1:
+        return plane.copy()
+    if radius < HISTOGRAM_MEDIAN_RADIUS:
+        return windowMedian(plane, radius)
+    return histogramMedian(plane, radius)
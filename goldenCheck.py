@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+'''Checks the image operations against the reference outputs in
+Images/alteredImages.
+
+The reference outputs are screenshots of the viewer window, so the 500x500
+image is cut out of them below the title and menu bars (and, where the
+window was narrower, only the part not covered by its scroll bars). Each
+operation is run again on the image in Images/orgImages it was made from and
+compared within the tolerance of the case: the largest channel difference and
+the PSNR. A heatmap of the differences is written for every case that does
+not match exactly:
+
+    python goldenCheck.py -o diffs/
+
+With --workers the operations run band by band on the thread pool (see
+parallel), to check that path as well. The exit status is 1 if any case is
+out of tolerance.
+'''
+
+from __future__ import print_function
+
+import argparse
+import math
+import os
+import sys
+
+import numpy as np
+
+import ops
+import parallel
+import pixelEngine
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+#where the image sits in the window screenshots
+SCREEN_TOP = 51
+SCREEN_LEFT = 2
+
+#scale of the differences in the heatmaps
+HEATMAP_GAIN = 8
+
+
+class Case(object):
+    '''One reference output and how to make it again
+
+    Attributes:
+        golden: file name in Images/alteredImages
+        sources: file names in Images/orgImages, passed to function in order
+        function: function taking the source arrays and returning the result
+        halo: int rows of context the function needs, for running it in bands
+        maxAbs: largest channel difference allowed
+        minPsnr: lowest PSNR in dB allowed
+        visible: (height, width) of the image visible in the screenshot, None
+            for the whole image
+        known: reason the reference is expected to differ, None if it should
+            match; known differences are reported but do not fail the check
+    '''
+
+    def __init__(self, golden, sources, function, halo=0, maxAbs=1, minPsnr=50.0, visible=None,
+                 known=None):
+        self.golden = golden
+        self.sources = sources
+        self.function = function
+        self.halo = halo
+        self.maxAbs = maxAbs
+        self.minPsnr = minPsnr
+        self.visible = visible
+        self.known = known
+
+
+CASES = [
+    Case('gammaAltered.png', ['church.png'], lambda a: ops.gamma(a, 1.2)),
+    Case('contrastAltered.png', ['skull.png'], ops.contrast),
+    Case('MonochromeAltered.png', ['church.png'], ops.monochrome),
+    Case('edgeDetectAltered.png', ['church.png'], ops.edge, halo=1),
+    Case('blurAltered.png', ['church.png'], ops.blur, halo=1),
+    Case('sharpenAltered.png', ['church.png'], ops.sharpen, halo=1),
+    Case('medianAltered.png', ['lena_sp_noise.png'], ops.median, halo=1, visible=(490, 483)),
+    Case('colorDifferenceAltered.png', ['starwars.png', 'church.png'], ops.colorDiff),
+    Case('chromaAltered.png', ['starwars.png', 'church.png'],
+         lambda a, b: ops.chromaKey(a, b, 225, 235, 0.7)),
+    Case('lumaAltered.png', ['skull.png', 'church.png'], lambda a, b: ops.lumaKey(a, b, 0.1)),
+]
+
+
+def compare(expected, actual):
+    '''Measures the color differences between two pixel arrays
+
+        Args:
+            expected: reference pixel array
+            actual: pixel array of the same size
+
+        Returns:
+            A (difference plane, largest difference, PSNR in dB) tuple, the
+            PSNR is infinite for identical images
+    '''
+    channels = [ops.RED, ops.GREEN, ops.BLUE]
+    difference = np.abs(expected[:, :, channels].astype(np.int16) - actual[:, :, channels])
+
+    mse = np.mean(difference.astype(np.float64) ** 2)
+    psnr = 10 * math.log10(255.0 ** 2 / mse) if mse else float('inf')
+
+    return difference.max(axis=2), int(difference.max()), psnr
+
+
+def heatmap(difference):
+    '''Draws the differences in red on black
+
+        Args:
+            difference: 2D array of channel differences
+
+        Returns:
+            The (height, width, 4) uint8 pixel array of the heatmap
+    '''
+    plane = np.minimum(difference.astype(np.int32) * HEATMAP_GAIN, 255).astype(np.uint8)
+    return ops.pack(plane, plane // 4, np.zeros_like(plane))
+
+
+def check(case, imageDir, diffDir=None, banded=False):
+    '''Runs a case and compares it with its reference
+
+        Args:
+            case: Case to check
+            imageDir: directory holding orgImages and alteredImages
+            diffDir: directory the heatmap is written to, None for no heatmap
+            banded: True to run the operation band by band on the thread pool
+
+        Returns:
+            A (status, largest difference, PSNR) tuple, status is 'ok',
+            'FAIL' or 'known'
+    '''
+    sources = []
+    for name in case.sources:
+        array = pixelEngine.loadImage(os.path.join(imageDir, 'orgImages', name))
+        if array is None:
+            raise IOError("cannot load %s" % name)
+        sources.append(array)
+
+    golden = pixelEngine.loadImage(os.path.join(imageDir, 'alteredImages', case.golden))
+    if golden is None:
+        raise IOError("cannot load %s" % case.golden)
+
+    if banded:
+        result = parallel.run(case.function, sources, case.halo)
+    else:
+        result = case.function(*sources)
+    height, width = case.visible or result.shape[:2]
+    expected = golden[SCREEN_TOP:SCREEN_TOP + height, SCREEN_LEFT:SCREEN_LEFT + width]
+
+    difference, maxAbs, psnr = compare(expected, result[:height, :width])
+
+    if case.known is not None:
+        status = 'known'
+    elif maxAbs <= case.maxAbs and psnr >= case.minPsnr:
+        status = 'ok'
+    else:
+        status = 'FAIL'
+
+    if diffDir is not None and maxAbs > 0:
+        fileName = os.path.join(diffDir, os.path.splitext(case.golden)[0] + 'Diff.png')
+        pixelEngine.saveImage(heatmap(difference), fileName)
+
+    return status, maxAbs, psnr
+
+
+def main(argv=None):
+    '''Checks every case and prints the results
+
+        Args:
+            argv: list of command line arguments, sys.argv if None
+
+        Returns:
+            The exit status, 1 if any case failed
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--images', default=os.path.join(ROOT, 'Images'),
+                        help='directory holding orgImages and alteredImages')
+    parser.add_argument('-o', '--output', help='directory for the difference heatmaps')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='run the operations in row bands on this many threads, 0 to call them directly')
+    args = parser.parse_args(argv)
+
+    if args.workers:
+        parallel.setWorkers(args.workers)
+
+    if args.output and not os.path.isdir(args.output):
+        os.makedirs(args.output)
+
+    failed = 0
+    print("%-6s %-28s %8s %8s %8s" % ("", "reference", "max", "PSNR", "limit"))
+    for case in CASES:
+        status, maxAbs, psnr = check(case, args.images, args.output, args.workers > 0)
+        failed += status == 'FAIL'
+        print("%-6s %-28s %8d %8.1f %8s" % (status, case.golden, maxAbs, psnr,
+                                            "%d/%.0f" % (case.maxAbs, case.minPsnr)))
+        if case.known:
+            print("       %s" % case.known)
+
+    print("%d of %d cases failed" % (failed, len(CASES)))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+'''Lazy operation graph for chained edits.
+
+Each edit appends a node instead of computing a new image. Nothing runs until
+a node is evaluated for display or saving. Point operation nodes carry a
+lookup table (see lut) and are elementwise, so a run of them is fused with
+the node below it into a single pass: consecutive tables compose into one
+and a monochrome node absorbs the tables above it. Only kernel and
+compositing nodes, which need their whole input, produce intermediate
+buffers.
+
+Once a node has been evaluated it keeps its result and drops its inputs, so
+the history behind it can be freed.
+
+Nodes that know the halo their function needs are computed band by band on
+the shared thread pool (see parallel.process), which spreads them over the
+cores and lets a caller follow their progress and abort them between bands.
+A node whose function goes through a result cache (resultCache.Cached) looks
+the whole result up before splitting it into bands and stores it once
+assembled.
+'''
+
+import lut
+import ops
+import parallel
+import resultCache
+
+
+class Node(object):
+    '''One operation in the graph
+
+    Attributes:
+        inputs: list of input nodes, empty once the node is evaluated
+        function: function taking the input arrays and returning the result
+        table: lookup table of a point operation node, None otherwise
+        monochrome: True for a monochrome node, which can absorb point tables
+        value: the result array once evaluated, None before
+        halo: int pixels of context the function needs around a band, None if
+            it has to see the whole image
+        progress: True if the function takes the progress function of
+            evaluate() as a progress keyword argument
+    '''
+
+    def __init__(self, inputs=(), function=None, table=None, monochrome=False, value=None,
+                 halo=None, progress=False):
+        self.inputs = list(inputs)
+        self.function = function
+        self.table = table
+        self.monochrome = monochrome
+        self.value = value
+        self.halo = halo
+        self.progress = progress
+
+    def evaluate(self, progress=None):
+        '''Computes the result of the node, fusing the point operations that
+        lead up to it
+
+            Args:
+                progress: optional function called with the number of bands
+                    done and the total while a node with a halo is computed;
+                    it can raise to abort, leaving the node unevaluated
+
+            Returns:
+                The (height, width, 4) uint8 pixel array of the node
+        '''
+        if self.value is not None:
+            return self.value
+
+        #collect the unevaluated point operations down to the next boundary
+        tables = []
+        node = self
+        while node.value is None and node.table is not None:
+            tables.append(node.table)
+            node = node.inputs[0]
+        tables.reverse()
+
+        if not tables:
+            inputs = [inputNode.evaluate(progress) for inputNode in self.inputs]
+
+            def compute(function):
+                if self.halo is not None:
+                    return parallel.run(function, inputs, self.halo, progress)
+                if self.progress:
+                    return function(*inputs, progress=progress)
+                return function(*inputs)
+
+            if isinstance(self.function, resultCache.Cached):
+                self.value = self.function.evaluate(inputs, compute)
+            else:
+                self.value = compute(self.function)
+        elif node.value is None and node.monochrome:
+            self.value = ops.monochrome(node.inputs[0].evaluate(progress), lut.compose(*tables))
+        else:
+            self.value = ops.applyTable(node.evaluate(progress), lut.compose(*tables))
+
+        self.inputs = []
+        return self.value
+
+
+def source(array):
+    '''Starts a graph from a pixel array
+
+        Args:
+            array: (height, width, 4) uint8 pixel array
+
+        Returns:
+            The evaluated source node
+    '''
+    return Node(value=array)
+
+
+def point(node, table):
+    '''Appends a point operation
+
+        Args:
+            node: input node
+            table: 256-entry uint8 lookup table of the operation
+
+        Returns:
+            The new node
+    '''
+    return Node([node], table=table)
+
+
+def monochrome(node):
+    '''Appends a monochrome operation
+
+        Args:
+            node: input node
+
+        Returns:
+            The new node
+    '''
+    return Node([node], ops.monochrome, monochrome=True, halo=0)
+
+
+def apply(function, *nodes, **options):
+    '''Appends any other operation, which is evaluated on its own
+
+        Args:
+            function: function taking one pixel array per input node and
+                returning the result
+            nodes: input nodes
+            options: halo, the int pixels of context the function needs
+                around each pixel, lets the node be evaluated band by band;
+                leave it out when the function needs the whole image.
+                progress=True passes the progress function of evaluate() to
+                a whole-image function as a progress keyword argument.
+
+        Returns:
+            The new node
+    '''
+    return Node(nodes, function, halo=options.get('halo'), progress=options.get('progress', False))
@@ -0,0 +1,175 @@
+'''Undo and redo history of edited images.
+
+Each state is stored as a grid of tiles. When a state is recorded, tiles that
+are identical to the same tile of the state before it are shared with that
+state instead of copied, so an edit that only touches part of the image only
+stores the tiles it changed. Tiles are never modified once stored, which is
+what makes the sharing safe.
+
+The memory held by all tiles is capped by a byte budget. When a new state
+pushes it over, the oldest states are dropped first; the current state is
+always kept.
+'''
+
+import numpy as np
+
+#edge length of the square tiles in pixels
+TILE_SIZE = 128
+
+#default memory budget of the history in bytes
+HISTORY_BYTES = 256 * 1024 * 1024
+
+
+class Snapshot(object):
+    '''One state of the image as a grid of read-only tiles
+
+    Attributes:
+        shape: shape of the image array
+        tiles: dict of (top, left) -> tile array
+    '''
+
+    def __init__(self, array, previous=None, tileSize=TILE_SIZE):
+        self.shape = array.shape
+        self.tiles = {}
+
+        #tiles can only be shared with a state of the same size
+        if previous is not None and previous.shape != array.shape:
+            previous = None
+
+        height, width = array.shape[:2]
+        for top in range(0, height, tileSize):
+            for left in range(0, width, tileSize):
+                tile = array[top:top + tileSize, left:left + tileSize]
+
+                if previous is not None and np.array_equal(previous.tiles[top, left], tile):
+                    self.tiles[top, left] = previous.tiles[top, left]
+                else:
+                    tile = tile.copy()
+                    tile.setflags(write=False)
+                    self.tiles[top, left] = tile
+
+    def assemble(self):
+        '''Puts the tiles back together
+
+            Returns:
+                The pixel array of the state
+        '''
+        array = np.empty(self.shape, np.uint8)
+        for (top, left), tile in self.tiles.items():
+            array[top:top + tile.shape[0], left:left + tile.shape[1]] = tile
+        return array
+
+
+class History(object):
+    '''Undo/redo stack of tile snapshots within a memory budget
+
+    Attributes:
+        maxBytes: memory budget of the stored tiles in bytes
+        tileSize: int edge length of the tiles
+        nbytes: memory held by the stored tiles
+    '''
+
+    def __init__(self, maxBytes=HISTORY_BYTES, tileSize=TILE_SIZE):
+        self.maxBytes = maxBytes
+        self.tileSize = tileSize
+        self.nbytes = 0
+
+        self._states = []
+        self._index = -1
+
+        #number of states holding each tile, by id of the tile
+        self._references = {}
+
+    def _retain(self, snapshot):
+        '''Counts the tiles of a new state
+
+            Args:
+                snapshot: Snapshot being added
+        '''
+        for tile in snapshot.tiles.values():
+            count = self._references.get(id(tile), 0)
+            if count == 0:
+                self.nbytes += tile.nbytes
+            self._references[id(tile)] = count + 1
+
+    def _release(self, snapshot):
+        '''Uncounts the tiles of a dropped state, freeing those no state holds
+
+            Args:
+                snapshot: Snapshot being dropped
+        '''
+        for tile in snapshot.tiles.values():
+            count = self._references[id(tile)] - 1
+            if count == 0:
+                self.nbytes -= tile.nbytes
+                del self._references[id(tile)]
+            else:
+                self._references[id(tile)] = count
+
+    def clear(self):
+        '''Drops every state
+        '''
+        self._states = []
+        self._index = -1
+        self._references = {}
+        self.nbytes = 0
+
+    def push(self, array):
+        '''Records a new current state, dropping the states that could be redone
+
+            Args:
+                array: (height, width, 4) uint8 pixel array of the new state
+        '''
+        for snapshot in self._states[self._index + 1:]:
+            self._release(snapshot)
+        del self._states[self._index + 1:]
+
+        previous = self._states[-1] if self._states else None
+        snapshot = Snapshot(array, previous, self.tileSize)
+        self._retain(snapshot)
+        self._states.append(snapshot)
+
+        while self.nbytes > self.maxBytes and len(self._states) > 1:
+            self._release(self._states.pop(0))
+
+        self._index = len(self._states) - 1
+
+    def canUndo(self):
+        '''Checks for a state before the current one
+
+            Returns:
+                True if undo() can step back
+        '''
+        return self._index > 0
+
+    def canRedo(self):
+        '''Checks for an undone state after the current one
+
+            Returns:
+                True if redo() can step forward
+        '''
+        return self._index < len(self._states) - 1
+
+    def undo(self):
+        '''Steps back to the previous state
+
+            Returns:
+                The pixel array of the previous state or None if there is none
+        '''
+        if not self.canUndo():
+            return None
+
+        self._index -= 1
+        return self._states[self._index].assemble()
+
+    def redo(self):
+        '''Steps forward to the state that was undone
+
+            Returns:
+                The pixel array of the next state or None if there is none
+        '''
+        if not self.canRedo():
+            return None
+
+        self._index += 1
+        return self._states[self._index].assemble()
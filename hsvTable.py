@@ -0,0 +1,128 @@
+'''Precomputed hue and saturation tables for keying 8-bit images.
+
+Both tables are opt-in: build one once and pass it to ops.chromaKey (or use
+--hsv-table on the command line) to turn the hue/saturation conversion into
+table gathers.
+
+PairTable splits the conversion over channel pairs. Saturation only depends
+on the (max, min) pair and hue on the (difference, delta) pair plus which
+channel is the max, so it needs a 256x256 and a 511x256 float32 table:
+about 0.8 MB. The tables hold the same float32 ratios ops.hsv divides out
+and the hue is finished in the same float32 steps, so the values are
+identical to ops.hsv, bit for bit.
+
+FullTable stores hue and saturation for every one of the 16,777,216 rgb
+colors as uint16 (hue in hundredths of a degree, saturation in 1/65535
+steps): 2 x 32 MB = 64 MB, and a single gather per plane. Values are quantized,
+so a pixel sitting right on a threshold can key differently than ops.hsv.
+'''
+
+import numpy as np
+
+import ops
+
+
+class PairTable(object):
+    '''Hue and saturation from tables indexed by channel pairs (about 0.8 MB)
+
+    Attributes:
+        saturation: (max, min) -> saturation float32 table
+        hue: (difference + 255, delta) -> difference / delta float32 table,
+            the hue within the sector of the max channel in sixths of 360
+        nbytes: memory used by the tables
+    '''
+
+    def __init__(self):
+        #float32 division of the exact differences, as ops.hsv does it
+        maxc = np.arange(256, dtype=np.float32)[:, np.newaxis]
+        minc = np.arange(256, dtype=np.float32)[np.newaxis, :]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            saturation = np.where(maxc > 0, (maxc - minc) / maxc, 0)
+        self.saturation = np.where(minc <= maxc, saturation, 0).astype(np.float32)
+
+        difference = np.arange(-255, 256, dtype=np.float32)[:, np.newaxis]
+        delta = np.arange(256, dtype=np.float32)[np.newaxis, :]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hue = np.where(delta > 0, difference / delta, 0)
+        self.hue = hue.astype(np.float32)
+
+        self.nbytes = self.saturation.nbytes + self.hue.nbytes
+
+    def hueSaturation(self, array):
+        '''Gets the hue and saturation planes of a pixel array
+
+            Args:
+                array: (height, width, 4) uint8 pixel array
+
+            Returns:
+                A list with the hue (0-360) and saturation (0-1) planes
+        '''
+        red = array[:, :, ops.RED].astype(np.int16)
+        green = array[:, :, ops.GREEN].astype(np.int16)
+        blue = array[:, :, ops.BLUE].astype(np.int16)
+
+        maxc = np.maximum(np.maximum(red, green), blue)
+        minc = np.minimum(np.minimum(red, green), blue)
+        delta = maxc - minc
+
+        #same precedence and float32 steps as ops.hsv: red, then green, then blue
+        redMax = red == maxc
+        greenMax = ~redMax & (green == maxc)
+        difference = np.where(redMax, green - blue, np.where(greenMax, blue - red, red - green))
+        sector = np.where(redMax, 0, np.where(greenMax, 2, 4)).astype(np.float32)
+
+        h = (sector + self.hue[difference + 255, delta]) * np.float32(60)
+        h = np.where(h < 0, h + np.float32(360), h)
+        h = np.where(delta > 0, h, 0)
+
+        return [h, self.saturation[maxc, minc]]
+
+
+class FullTable(object):
+    '''Quantized hue and saturation for every 8-bit rgb color (64 MB)
+
+    Attributes:
+        hue: uint16 table of hue in hundredths of a degree
+        saturation: uint16 table of saturation in 1/65535 steps
+        nbytes: memory used by the tables
+    '''
+
+    def __init__(self):
+        self.hue = np.empty(1 << 24, np.uint16)
+        self.saturation = np.empty(1 << 24, np.uint16)
+
+        green, blue = np.meshgrid(np.arange(256, dtype=np.float32),
+                                  np.arange(256, dtype=np.float32), indexing='ij')
+
+        #one red value (65536 colors) at a time keeps the build memory small
+        for red in range(256):
+            h, s, v = ops.hsv(np.full(green.shape, red, np.float32), green, blue)
+            block = slice(red << 16, (red + 1) << 16)
+            self.hue[block] = np.round(h * 100).ravel()
+            self.saturation[block] = np.round(s * 65535).ravel()
+
+        self.nbytes = self.hue.nbytes + self.saturation.nbytes
+
+    def hueSaturation(self, array):
+        '''Gets the hue and saturation planes of a pixel array
+
+            Args:
+                array: (height, width, 4) uint8 pixel array
+
+            Returns:
+                A list with the hue (0-360) and saturation (0-1) planes
+        '''
+        index = array[:, :, ops.RED].astype(np.int32) << 16
+        index |= array[:, :, ops.GREEN].astype(np.int32) << 8
+        index |= array[:, :, ops.BLUE]
+
+        h = self.hue[index] / np.float32(100)
+        s = self.saturation[index] / np.float32(65535)
+        return [h, s]
+
+
+#table classes by command line name
+TABLES = {
+    'pairs': PairTable,
+    'full': FullTable,
+}
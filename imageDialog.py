@@ -12,6 +12,66 @@ class imageDialog(QWidget):
       if ok:
          return num
 
+   def getBlurRadius(self):
+      num,ok = QInputDialog.getInt(self,"Blur Radius Input","Enter blur radius (1-50)",1,1,50)
+
+      if ok:
+         return num
+
+   def getMedianRadius(self):
+      num,ok = QInputDialog.getInt(self,"Median Radius Input","Enter median radius (1-15)",1,1,15)
+
+      if ok:
+         return num
+
+   def getWorkers(self, current):
+      num,ok = QInputDialog.getInt(self,"Worker Threads Input","Enter number of worker threads (1-256)",current,1,256)
+
+      if ok:
+         return num
+
+   def getKernel(self):
+      text,ok = QInputDialog.getText(self,"Kernel Input","Enter kernel rows separated by semicolons (0,-1,0; -1,5,-1; 0,-1,0)")
+
+      if ok:
+         return text
+
+   def getOperator(self, operators):
+      text,ok = QInputDialog.getItem(self,"Operator Input","Choose the compositing operator",operators,0,False)
+
+      if ok:
+         return str(text)
+
+   def getLayer(self, count):
+      num,ok = QInputDialog.getInt(self,"Layer Input","Enter layer number (1-%d)" % count,count,1,count)
+
+      if ok:
+         return num
+
+   def getOpacity(self, current):
+      num,ok = QInputDialog.getDouble(self,"Opacity Input","Enter layer opacity (0-1)",current,0,1,2)
+
+      if ok:
+         return num
+
+   def getOffset(self, current):
+      text,ok = QInputDialog.getText(self,"Offset Input","Enter layer offset as x,y",QLineEdit.Normal,"%d,%d" % current)
+
+      if ok:
+         return text
+
+   def getFps(self, current):
+      num,ok = QInputDialog.getDouble(self,"Frame Rate Input","Enter playback frame rate (1-120 fps)",current,1,120,2)
+
+      if ok:
+         return num
+
+   def getSequenceOperation(self, operations):
+      text,ok = QInputDialog.getItem(self,"Sequence Operation Input","Choose the operation applied to every frame",operations,0,False)
+
+      if ok:
+         return str(text)
+
    def getAMix(self):
       num,ok = QInputDialog.getDouble(self,"Foreground Image Input","Enter Foreground Mix Value")
 
@@ -0,0 +1,238 @@
+'''Background decoding of image files with a decode cache and prefetching.
+
+Files are decoded on a small thread pool of their own, so decoding never
+waits behind the operation bands on the parallel pool. Decoded pixel arrays
+are kept in least recently used order within a byte budget, keyed by the
+absolute path and modification time of the file, so choosing the same
+foreground again does not decode it again and a file changed on disk is
+decoded afresh.
+
+Loading a frame of a numbered sequence (name.0042.png) also queues the
+decode of the frames around it, PREFETCH_AHEAD after and PREFETCH_BEHIND
+before, so stepping through a shot finds them decoded.
+
+The hits, misses and prefetches counters, with the bytes in use, are
+available from stats().
+'''
+
+import collections
+import os
+import re
+import threading
+from multiprocessing.pool import ThreadPool
+
+import pixelEngine
+
+#default budget of the decoded arrays in bytes
+CACHE_BYTES = 1024 * 1024 * 1024
+
+#decoder threads
+IO_THREADS = 4
+
+#frames of a sequence decoded ahead of and behind the one loaded
+PREFETCH_AHEAD = 8
+PREFETCH_BEHIND = 2
+
+#frame number right before the extension: name.0042.png, name_042.exr
+FRAME_NUMBER = re.compile(r'^(.*?)(\d+)(\.[^./\\]+)$')
+
+
+def frameName(fileName, step):
+    '''Gets the name of another frame of a numbered sequence, keeping the
+    zero padding of the frame number
+
+        Args:
+            fileName: path of a frame
+            step: int frames to move, negative to go back
+
+        Returns:
+            The path of the frame or None if fileName is not numbered or the
+            frame number would be negative
+    '''
+    match = FRAME_NUMBER.match(fileName)
+    if match is None:
+        return None
+
+    prefix, number, extension = match.groups()
+    frame = int(number) + step
+    if frame < 0:
+        return None
+
+    return '%s%0*d%s' % (prefix, len(number), frame, extension)
+
+
+def decode(fileName):
+    '''Decodes an image file into a read-only pixel array
+
+        Args:
+            fileName: path of the image file
+
+        Returns:
+            The pixel array or None if it cannot be loaded
+    '''
+    array = pixelEngine.loadImage(fileName)
+    if array is not None:
+        array.setflags(write=False)
+    return array
+
+
+class Loader(object):
+    '''Decodes files on background threads into a byte-budgeted LRU cache
+
+    Attributes:
+        maxBytes: budget of the decoded arrays in bytes
+        ahead: frames of a sequence prefetched after the one loaded
+        behind: frames of a sequence prefetched before the one loaded
+        hits: loads answered from the cache or a decode already under way
+        misses: loads that had to start the decode
+        prefetches: decodes started ahead of a load
+    '''
+
+    def __init__(self, maxBytes=CACHE_BYTES, threads=IO_THREADS, ahead=PREFETCH_AHEAD,
+                 behind=PREFETCH_BEHIND):
+        self.maxBytes = maxBytes
+        self.ahead = ahead
+        self.behind = behind
+
+        self.hits = 0
+        self.misses = 0
+        self.prefetches = 0
+
+        self._pool = ThreadPool(threads)
+        self._lock = threading.Lock()
+        self._cache = collections.OrderedDict()
+        self._bytes = 0
+
+        #decodes under way by key
+        self._pending = {}
+
+    def key(self, fileName):
+        '''Builds the cache key of a file
+
+            Args:
+                fileName: path of the file
+
+            Returns:
+                An (absolute path, modification time) tuple or None if the
+                file does not exist
+        '''
+        try:
+            return os.path.abspath(fileName), os.path.getmtime(fileName)
+        except OSError:
+            return None
+
+    def _start(self, key):
+        '''Gets the cached array or the decode under way of a key, starting
+        the decode if there is neither; the lock must be held
+
+            Returns:
+                A (array, AsyncResult) tuple, one of them None
+        '''
+        array = self._cache.pop(key, None)
+        if array is not None:
+            self._cache[key] = array
+            return array, None
+
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pool.apply_async(self._decode, (key,))
+            self._pending[key] = pending
+        return None, pending
+
+    def _decode(self, key):
+        '''Decodes a file on a pool thread and caches the result. A decode
+        that raises is no longer pending either, so the file can be retried.
+        '''
+        array = None
+        try:
+            array = decode(key[0])
+        finally:
+            with self._lock:
+                del self._pending[key]
+                if array is not None and array.nbytes <= self.maxBytes:
+                    self._cache[key] = array
+                    self._bytes += array.nbytes
+                    while self._bytes > self.maxBytes:
+                        oldKey, oldArray = self._cache.popitem(last=False)
+                        self._bytes -= oldArray.nbytes
+
+        return array
+
+    def request(self, fileName):
+        '''Starts decoding a file in the background unless it is cached
+
+            Args:
+                fileName: path of the image file
+        '''
+        key = self.key(fileName)
+        if key is None:
+            return
+
+        with self._lock:
+            if key not in self._cache and key not in self._pending:
+                self.prefetches += 1
+                self._start(key)
+
+    def prefetch(self, fileName):
+        '''Starts decoding the frames around a frame of a numbered sequence,
+        nearest first, up to the first missing frame in each direction
+
+            Args:
+                fileName: path of a frame
+        '''
+        for direction, count in ((1, self.ahead), (-1, self.behind)):
+            for step in range(1, count + 1):
+                name = frameName(fileName, direction * step)
+                if name is None or not os.path.exists(name):
+                    break
+                self.request(name)
+
+    def load(self, fileName, prefetch=True):
+        '''Gets the decoded pixels of a file, waiting for its decode if it is
+        not cached yet
+
+            Args:
+                fileName: path of the image file
+                prefetch: True to also start decoding the frames around it
+
+            Returns:
+                The read-only pixel array or None if it cannot be loaded
+        '''
+        key = self.key(fileName)
+        if key is None:
+            return None
+
+        with self._lock:
+            if key in self._cache or key in self._pending:
+                self.hits += 1
+            else:
+                self.misses += 1
+            array, pending = self._start(key)
+
+        if prefetch:
+            self.prefetch(fileName)
+
+        return array if array is not None else pending.get()
+
+    def clear(self):
+        '''Drops every decoded array
+        '''
+        with self._lock:
+            self._cache.clear()
+            self._bytes = 0
+
+    def stats(self):
+        '''Gets the counters of the cache
+
+            Returns:
+                A dict of the hits, misses and prefetches counters with the
+                entries and bytes in use
+        '''
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'prefetches': self.prefetches,
+                'entries': len(self._cache),
+                'bytes': self._bytes,
+            }
@@ -23,9 +23,26 @@
 ##
 #############################################################################
 
+import os
+import time
+
 from PyQt4 import QtCore, QtGui
 from imageDialog import *
-import math
+import composite
+import graph
+import history
+import imageLoader
+import layers
+import lut
+import ops
+import parallel
+import parameterPanel
+import pixelEngine
+import playback
+import preview
+import profiler
+import resultCache
+import worker
 
 class ImageViewer(QtGui.QMainWindow):
     '''This class uses PyQt to view, manipulate and composite images.
@@ -35,12 +52,9 @@ class ImageViewer(QtGui.QMainWindow):
      and over. It also includes edge-detect, blue, sharpen and median
      spaial filtering using the specific kernels given below. Finally, the
      matte creation and manipulation operations luma-key, chroma-key, and
-     color-difference method are used.
-
-    Attributes:
-        edgeArray: Array used for the kernel in edge detection function
-        blurArray: Array used for the kernel in blur function
-        sharpenArray: Array used for the kernel in sharpen function
+     color-difference method are used. The spatial filter kernels are the
+     presets in ops.KERNELS, and any other kernel can be entered with Custom
+     Kernel.
     '''
 
     def __init__(self):
@@ -51,6 +65,43 @@ class ImageViewer(QtGui.QMainWindow):
         self.printer = QtGui.QPrinter()
         self.scaleFactor = 0.0
 
+        #tip of the lazy operation graph of the edits made to the image
+        self.node = None
+
+        #results of the kernel and compositing operations by input and parameters
+        self.cache = resultCache.ResultCache()
+
+        #decoded image files, with the frames around an opened sequence frame
+        self.loader = imageLoader.Loader()
+
+        #path of the opened image, for stepping through its sequence
+        self.fileName = None
+
+        #undo/redo states of the edited image
+        self.history = history.History()
+
+        #worker evaluating the edit being made, None when idle
+        self.job = None
+
+        #cancelled workers superseded by a newer edit that have not stopped yet
+        self.supersededJobs = []
+
+        #foreground of the keyer being rendered, reused to re-run it with new parameters
+        self.keyForeground = None
+
+        #layers composited over the image by the layer actions, None until one is added
+        self.stack = None
+
+        #phase timings of the operations, shown in the status bar
+        self.profiler = profiler.Profiler()
+
+        #sequence being played, None when not playing
+        self.playback = None
+
+        #polls the playback clock, at twice the frame rate to keep the frames on time
+        self.playTimer = QtCore.QTimer(self)
+        self.playTimer.timeout.connect(self.tickPlayback)
+
         self.imageLabel = QtGui.QLabel()
         self.imageLabel.setBackgroundRole(QtGui.QPalette.Base)
         self.imageLabel.setSizePolicy(QtGui.QSizePolicy.Ignored, QtGui.QSizePolicy.Ignored)
@@ -61,14 +112,31 @@ class ImageViewer(QtGui.QMainWindow):
         self.scrollArea.setWidget(self.imageLabel)
         self.setCentralWidget(self.scrollArea)
 
-        e = [[-1.0,-1.0,-1.0], [-1.0,8.0,-1.0], [-1.0,-1.0,-1.0]]
-        self.edgeArray = e
-
-        b = [[.111, .1111, .1111], [.1111, .1111, .1111], [.1111, .1111, .1111]]
-        self.blurArray = b
-
-        s = [[-1.0, -1.0, -1.0], [-1.0, 9.0, -1.0], [-1.0, -1.0, -1.0]]
-        self.sharpenArray = s
+        self.progressBar = QtGui.QProgressBar()
+        self.progressBar.setRange(0, 100)
+        self.progressBar.hide()
+        self.statusBar().addPermanentWidget(self.progressBar)
+
+        #live parameter panel, re-rendering the visible part of the image
+        self.panel = parameterPanel.ParameterPanel(self)
+        self.panel.hide()
+        self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.panel)
+        self.liveActive = False
+        self.liveForeground = None
+        self.livePixmap = None
+
+        #coalesces panel changes to at most one render per display frame
+        self.liveTimer = QtCore.QTimer(self)
+        self.liveTimer.setSingleShot(True)
+        self.liveTimer.setInterval(16)
+        self.liveTimer.timeout.connect(self.renderLive)
+
+        self.panel.changed.connect(self.changeLive)
+        self.panel.applied.connect(self.applyLive)
+        self.panel.foregroundRequested.connect(self.chooseLiveForeground)
+        self.panel.visibilityChanged.connect(self.endLive)
+        self.scrollArea.horizontalScrollBar().valueChanged.connect(self.scheduleLive)
+        self.scrollArea.verticalScrollBar().valueChanged.connect(self.scheduleLive)
 
         self.createActions()
         self.createMenus()
@@ -82,22 +150,231 @@ class ImageViewer(QtGui.QMainWindow):
         fileName = QtGui.QFileDialog.getOpenFileName(self, "Open File",
                 QtCore.QDir.currentPath())
         if fileName:
-            image = QtGui.QImage(fileName)
-            if image.isNull():
-                QtGui.QMessageBox.information(self, "Image Viewer",
-                        "Cannot load %s." % fileName)
-                return
+            self.openFile(str(fileName))
+
+    def openFile(self, fileName):
+        '''Opens an image file as the new image, dropping the edit history
+
+            Args:
+                fileName: path of the image file
+        '''
+        array = self.loadArray(fileName)
+        if array is None:
+            QtGui.QMessageBox.information(self, "Image Viewer",
+                    "Cannot load %s." % fileName)
+            return
+
+        self.fileName = fileName
+        self.history.clear()
+        self.push(graph.source(array), 'open')
+        self.scaleFactor = 1.0
+
+        self.saveAct.setEnabled(True)
+        self.printAct.setEnabled(True)
+        self.fitToWindowAct.setEnabled(True)
+        self.updateActions()
+
+        if not self.fitToWindowAct.isChecked():
+            self.imageLabel.adjustSize()
+
+    def nextFrame(self):
+        '''Opens the next frame of the numbered sequence of the image
+        '''
+        self.stepFrame(1)
+
+    def previousFrame(self):
+        '''Opens the previous frame of the numbered sequence of the image
+        '''
+        self.stepFrame(-1)
+
+    def stepFrame(self, step):
+        '''Opens another frame of the numbered sequence of the image, which
+        the loader has usually decoded already
+
+            Args:
+                step: int frames to move, negative to go back
+        '''
+        if self.fileName is None or self.job is not None or self.playback is not None:
+            return
+
+        fileName = imageLoader.frameName(self.fileName, step)
+        if fileName is None or not os.path.exists(fileName):
+            self.statusBar().showMessage("No frame %s" % (fileName or "in sequence"), 2000)
+            return
+
+        self.openFile(fileName)
+
+    def playSequence(self):
+        '''Plays the numbered sequence of a chosen frame at a target frame
+        rate, applying an operation to every frame on worker threads ahead of
+        the playhead. Cancel stops the playback.
+        '''
+        if self.job is not None:
+            return
+
+        fileName = QtGui.QFileDialog.getOpenFileName(self, "Play Sequence",
+                QtCore.QDir.currentPath())
+        if not fileName:
+            return
+
+        pattern = playback.sequencePattern(str(fileName))
+        frames = playback.sequenceFrames(pattern) if pattern is not None else []
+        if not frames:
+            QtGui.QMessageBox.information(self, "Image Viewer",
+                    "%s is not a frame of a numbered sequence." % fileName)
+            return
 
-            self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(image))
-            self.scaleFactor = 1.0
+        aArray = self.loadArray(frames[0])
+        if aArray is None:
+            QtGui.QMessageBox.information(self, "Image Viewer",
+                    "Cannot load %s." % frames[0])
+            return
 
-            self.printAct.setEnabled(True)
-            self.fitToWindowAct.setEnabled(True)
-            self.updateActions()
+        function = self.sequenceOperation(aArray)
+        if function is None:
+            return
 
+        fps = box.getFps(playback.FPS)
+        if fps is None:
+            return
+
+        def process(array):
+            with self.profiler.phase('compute', array.nbytes, 'playback'):
+                return function(array)
+
+        if self.node is None:
+            self.showArray(aArray)
             if not self.fitToWindowAct.isChecked():
                 self.imageLabel.adjustSize()
 
+        self.playback = playback.Playback(frames, fps, process, self.loader)
+        self.setBusy(True)
+        self.playback.start(time.time())
+        self.playTimer.start(max(int(500 / fps), 1))
+
+    def sequenceOperation(self, aArray):
+        '''Asks for the Edit operation applied to every frame of a sequence
+        and its parameters. The keyers composite the frames over the image.
+
+            Args:
+                aArray: pixel array of the first frame
+
+            Returns:
+                A function taking a frame pixel array and returning the array
+                to show, or None if no usable operation was chosen
+        '''
+        names = ["None", "Gamma", "Contrast", "Monochrome", "Edge Detect", "Blur", "Sharpen",
+                 "Median"]
+        if self.node is not None:
+            names += ["Luma Key", "Chroma Key", "Color Difference"]
+
+        name = box.getSequenceOperation(names)
+        if name is None:
+            return None
+
+        if name == "None":
+            return lambda array: array
+
+        if name == "Gamma":
+            gVal = box.getGamma()
+            if gVal is None:
+                return None
+            table = lut.gamma(gVal)
+            return lambda array: ops.applyTable(array, table)
+
+        if name == "Contrast":
+            table = lut.contrast()
+            return lambda array: ops.applyTable(array, table)
+
+        if name == "Monochrome":
+            return ops.monochrome
+
+        if name == "Edge Detect":
+            return ops.edge
+
+        if name == "Sharpen":
+            return ops.sharpen
+
+        if name == "Blur":
+            radius = box.getBlurRadius()
+            return None if radius is None else lambda array: ops.blur(array, radius)
+
+        if name == "Median":
+            radius = box.getMedianRadius()
+            return None if radius is None else lambda array: ops.median(array, radius)
+
+        #the keyers need frames the size of the image
+        bArray = self.currentArray()
+        if aArray.shape[:2] != bArray.shape[:2]:
+            QtGui.QMessageBox.information(self, "Sequence does not have the image size",
+                                          "Cannot key the sequence over the image.")
+            return None
+
+        if name == "Luma Key":
+            lumValue = box.getLum()
+            return None if lumValue is None else lambda array: ops.lumaKey(array, bArray, lumValue)
+
+        if name == "Chroma Key":
+            hueLow = box.getHueLow()
+            hueHigh = box.getHueHigh() if hueLow is not None else None
+            satLow = box.getSatLow() if hueHigh is not None else None
+            if satLow is None:
+                return None
+            return lambda array: ops.chromaKey(array, bArray, hueLow, hueHigh, satLow)
+
+        return lambda array: ops.colorDiff(array, bArray)
+
+    def tickPlayback(self):
+        '''Shows the frame of the playing sequence that is due, with the
+        achieved frame rate and the dropped frames in the status bar
+        '''
+        now = time.time()
+        try:
+            array = self.playback.tick(now)
+        except Exception as error:
+            self.stopPlayback()
+            QtGui.QMessageBox.information(self, "Image Viewer",
+                    "The playback failed: %s" % error)
+            return
+
+        if array is None:
+            return
+
+        self.showArray(array, 'playback')
+        self.profiler.finish('playback', ('playback',))
+        frame, count = self.playback.frame(), len(self.playback.frames)
+        self.progressBar.setValue(100 * (frame + 1) // count)
+        self.statusBar().showMessage("Frame %d/%d | %.1f fps (target %g) | %d dropped" %
+                (frame + 1, count, self.playback.achievedFps(now), self.playback.fps,
+                 self.playback.dropped))
+
+    def stopPlayback(self):
+        '''Stops the playing sequence and shows the image again
+        '''
+        self.playTimer.stop()
+        self.playback.stop()
+
+        message = "Played %d frames at %.1f fps (target %g), %d dropped" % (
+                self.playback.shown, self.playback.achievedFps(time.time()), self.playback.fps,
+                self.playback.dropped)
+        self.playback = None
+        self.setBusy(False)
+
+        if self.node is not None:
+            self.showArray(self.node.value)
+        self.profiler.finish('playback', (None, 'playback'))
+        self.statusBar().showMessage(message)
+
+    def save(self):
+        '''Evaluates the edits made to the image and saves the result
+        '''
+        fileName = QtGui.QFileDialog.getSaveFileName(self, "Save File",
+                QtCore.QDir.currentPath())
+        if fileName:
+            if not pixelEngine.saveImage(self.node.evaluate(), fileName):
+                QtGui.QMessageBox.information(self, "Image Viewer",
+                        "Cannot save %s." % fileName)
+
     def print_(self):
         '''Prints using the code provide by Trolltech
         '''
@@ -111,156 +388,349 @@ class ImageViewer(QtGui.QMainWindow):
             painter.setWindow(self.imageLabel.pixmap().rect())
             painter.drawPixmap(0, 0, self.imageLabel.pixmap())
 
-    def clamp(self, val):
-        ''' Clamps the normalized values from 0 to 1
+    def currentArray(self):
+        '''Gets the edited image as a pixel array
+
+            Returns:
+                A (height, width, 4) uint8 pixel array of the current graph node
+        '''
+        return self.node.evaluate()
+
+    def loadArray(self, fileName):
+        '''Gets the pixels of an image file from the loader, profiling the
+        wait for its decode as the decode phase
 
             Args:
-                val: A float representing a rgb values
+                fileName: path of the image file
 
             Returns:
-                The rgb value clamped between 0 and 1
+                A read-only (height, width, 4) uint8 pixel array or None if it
+                cannot be loaded
         '''
+        with self.profiler.phase('decode'):
+            return self.loader.load(str(fileName))
 
-        if(val > 1.0):
-            return 1.0
-        elif(val < 0.0):
-            return 0.0
-        else:
-            return val
+    def push(self, node, name, previews=(), action=None):
+        '''Makes a graph node the current edit and displays its result. Nodes
+        that still have to be computed are evaluated on a worker thread and
+        only swapped in once done. A node pushed while another one renders
+        supersedes it, and the results of the old one are discarded.
+
+            Args:
+                node: graph node of the new edit
+                name: string operation name for the profiler
+                previews: functions rendering low-resolution previews shown
+                    while the node is evaluated, coarsest first
+                action: edit action left enabled while the node renders, to
+                    re-run it with new parameters
+        '''
+        if self.job is not None:
+            self.job.cancel()
+            self.supersededJobs.append(self.job)
+            self.job = None
+
+        if node.value is not None:
+            self.finishPush(node, name)
+            return
+
+        self.job = worker.Job(node, name, previews, self.profiler, self)
+        self.job.previewed.connect(self.showPreview)
+        self.job.progressed.connect(self.showProgress)
+        self.job.succeeded.connect(self.finishJob)
+        self.job.failed.connect(self.failJob)
+        self.job.cancelled.connect(self.cancelJob)
+        self.job.finished.connect(self.endJob)
+        self.job.finished.connect(self.job.deleteLater)
+
+        self.setBusy(True, action)
+        self.job.start()
+
+    def pushKey(self, name, params, function, aArray, bNode, action):
+        '''Composites a keyed foreground over the image, showing previews of
+        the key at low resolution while the full result renders
+
+            Args:
+                name: string operation name for the result cache and profiler
+                params: tuple of the keyer parameters
+                function: pixel-local function taking the foreground and
+                    background arrays and returning the composite
+                aArray: foreground pixel array
+                bNode: graph node of the image to key over, taken before the
+                    parameter dialogs, during which a running job can finish
+                    and change the current edit
+                action: action of the keyer, which re-runs it while it renders
+        '''
+        bArray = bNode.evaluate()
+        node = graph.apply(self.cache.wrap(name, params, function),
+                           graph.source(aArray), bNode, halo=0)
 
-    def clampInt(self, val):
-        ''' Clamps values from 0 to 255
+        self.push(node, name, preview.stages(function, [aArray, bArray]), action)
+        self.keyForeground = aArray
+
+    def keyerForeground(self, bArray):
+        '''Gets the foreground of a keyer. While the keyer is still rendering
+        its foreground is reused, so running it again only asks for new
+        parameters.
 
             Args:
-                val: A float representing a rgb values
+                bArray: background pixel array the foreground has to match in size
 
             Returns:
-                The rgb value clamped between 0 and 255
+                The foreground pixel array or None if no usable image was chosen
         '''
+        if self.job is not None and self.keyForeground is not None:
+            return self.keyForeground
+        return self.openForeground(bArray)
 
-        if(val > 255):
-            return 255
-        elif(val < 0):
-            return 0
-        else:
-            return val
-
-    def gamma(self):
-        '''Raises each pixel to the power of 1 divided by the gamma value supplied.
-        This changes the midtones of the image.
+    def finishPush(self, node, name):
+        '''Swaps an evaluated graph node in as the current edit and shows the
+        phase timings of the operation in the status bar
 
+            Args:
+                node: evaluated graph node of the new edit
+                name: string operation name for the profiler
         '''
-        image = self.imageLabel.pixmap().toImage()
-        outImage = image.copy()
+        self.node = node
+        self.showArray(node.value)
+        self.livePixmap = None
 
-        #Get user input Value
-        gVal = box.getGamma()
+        #any other edit flattens the layers into the image
+        if name != 'layers':
+            self.stack = None
+        #the job rendering the node, if any, recorded its phases under itself
+        self.statusBar().showMessage(self.profiler.finish(name, (None, self.job)))
 
-        for row in range(0,image.height()):
-            for col in range(0,image.width()):
+        self.history.push(node.value)
+        self.updateHistoryActions()
 
-                curPixel = image.pixel(row,col)
-                red = QtGui.qRed(curPixel) ** gVal
-                green = QtGui.qGreen(curPixel) ** gVal
-                blue = QtGui.qBlue(curPixel) ** gVal
+    def showPreview(self, array):
+        '''Displays a preview of the running job, scaled to the image size
+        '''
+        if self.sender() is self.job:
+            self.showArray(array)
 
-                newPixel = QtGui.qRgb(self.clampInt(red),self.clampInt(green),self.clampInt(blue))
-                outImage.setPixel(row,col,newPixel)
+    def showProgress(self, percent):
+        '''Updates the progress bar for the running job
+        '''
+        if self.sender() is self.job:
+            self.progressBar.setValue(percent)
 
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(outImage))
+    def finishJob(self, array):
+        '''Swaps in the result of the running job
+        '''
+        if self.sender() is self.job:
+            self.finishPush(self.job.node, self.job.name)
 
-    def contrast(self):
-        '''Changes brightness relationship between the upper and lower color
-        ranges of an image. Uses the function O = (I - 1/3) * 3)
+    def failJob(self, message):
+        '''Reports the error that stopped the running job
+        '''
+        if self.sender() is self.job:
+            self.showArray(self.node.value)
+            self.dropLayers()
+            self.profiler.finish(self.job.name + " (failed)", (None, self.job))
+            QtGui.QMessageBox.information(self, "Image Viewer",
+                    "The operation failed: %s" % message)
+
+    def cancelJob(self):
+        '''Restores the image shown before the cancelled job
+        '''
+        if self.sender() is self.job:
+            self.showArray(self.node.value)
+            self.dropLayers()
+            self.profiler.finish(self.job.name + " (cancelled)", (None, self.job))
+            self.statusBar().showMessage("Cancelled", 2000)
+
+    def dropLayers(self):
+        '''Drops the layer stack after its render did not finish, since it
+        holds the change the image shown does not have
+        '''
+        if self.job.name == 'layers':
+            self.stack = None
 
+    def endJob(self):
+        '''Cleans up after the running job, or a superseded one, has stopped
+        '''
+        if self.sender() is self.job:
+            self.job = None
+            self.keyForeground = None
+            self.setBusy(False)
+        elif self.sender() in self.supersededJobs:
+            self.supersededJobs.remove(self.sender())
+            self.profiler.finish(self.sender().name + " (superseded)", (self.sender(),))
+
+    def cancel(self):
+        '''Stops the running operation, keeping the image from before it
         '''
-        image = self.imageLabel.pixmap().toImage()
-        outImage = image.copy()
+        if self.job is not None:
+            self.job.cancel()
+        if self.playback is not None:
+            self.stopPlayback()
 
-        for row in range(0,image.height()):
-            for col in range(0,image.width()):
+    def setBusy(self, busy, action=None):
+        '''Disables the edits while an operation runs and shows its progress
 
-                curPixel = image.pixel(row,col)
-                red = (QtGui.qRed(curPixel) - 85) * 3
-                green = (QtGui.qGreen(curPixel) - 85) * 3
-                blue = (QtGui.qBlue(curPixel) - 85) * 3
+            Args:
+                busy: True while a worker is running
+                action: edit action to leave enabled while busy
+        '''
+        for editAction in self.editMenu.actions():
+            editAction.setEnabled(not busy)
+        if action is not None:
+            action.setEnabled(True)
+        self.openAct.setEnabled(not busy)
+        self.playSequenceAct.setEnabled(not busy)
+        self.panel.applyButton.setEnabled(not busy)
+        self.cancelAct.setEnabled(busy)
+
+        if busy:
+            self.progressBar.setValue(0)
+            self.progressBar.show()
+        else:
+            self.progressBar.hide()
+            self.updateHistoryActions()
 
-                newPixel = QtGui.qRgb( self.clampInt(red), self.clampInt(green), self.clampInt(blue))
-                outImage.setPixel(row,col,newPixel)
+    def closeEvent(self, event):
+        '''Stops the running operation, and any it superseded that are still
+        winding down, before the window closes
+        '''
+        if self.job is not None:
+            self.job.cancel()
+            self.supersededJobs.append(self.job)
+        for job in self.supersededJobs:
+            job.wait()
+        if self.playback is not None:
+            self.stopPlayback()
+        super(ImageViewer, self).closeEvent(event)
+
+    def undo(self):
+        '''Steps back to the image before the last edit
+        '''
+        array = self.history.undo()
+        if array is not None:
+            self.stack = None
+            self.node = graph.source(array)
+            self.showArray(array)
+            self.livePixmap = None
+            self.statusBar().showMessage(self.profiler.finish('undo'))
+        self.updateHistoryActions()
+
+    def redo(self):
+        '''Steps forward to the image of an undone edit
+        '''
+        array = self.history.redo()
+        if array is not None:
+            self.stack = None
+            self.node = graph.source(array)
+            self.showArray(array)
+            self.livePixmap = None
+            self.statusBar().showMessage(self.profiler.finish('redo'))
+        self.updateHistoryActions()
+
+    def updateHistoryActions(self):
+        '''Enables undo and redo when there is a state to step to
+        '''
+        self.undoAct.setEnabled(self.history.canUndo())
+        self.redoAct.setEnabled(self.history.canRedo())
 
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(outImage))
+    def showArray(self, array, token=None):
+        '''Displays a pixel array in the imageLabel
 
-    def monochrome(self):
-        '''Produces a monochromatic image by averaging the three channels together.
-        Uses the function O = (R * 0.309) + (G * 0.609) + (B * 0.082)
+            Args:
+                array: (height, width, 4) uint8 pixel array
+                token: profiler token of the operation displaying it
+        '''
+        self.imageLabel.setPixmap(self.upload(array, token))
 
+    def upload(self, array, token=None):
+        '''Turns a pixel array into a pixmap, profiling the from-buffer and
+        upload phases. The pixmap is made straight from the array memory, so
+        the upload is the only copy.
+
+            Args:
+                array: (height, width, 4) uint8 pixel array
+                token: profiler token of the operation uploading it
+
+            Returns:
+                A QPixmap of the pixels
         '''
+        with self.profiler.phase('from-buffer', 0 if array.flags.c_contiguous else array.nbytes, token):
+            image = pixelEngine.arrayView(array)
+        with self.profiler.phase('upload', array.nbytes, token):
+            return QtGui.QPixmap.fromImage(image)
 
-        image = self.imageLabel.pixmap().toImage()
-        outImage = image.copy()
+    def openForeground(self, bArray):
+        '''Opens a new image as a foreground image for the compositing operations
 
-        for row in range(0,image.height()):
-            for col in range(0,image.width()):
+            Args:
+                bArray: background pixel array the foreground has to match in size
 
-                curPixel = image.pixel(row,col)
-                r = QtGui.qRed(curPixel) * 0.309
-                g = QtGui.qGreen(curPixel) * 0.609
-                b = QtGui.qBlue(curPixel) * 0.082
-                newValue = r + g + b
+            Returns:
+                The foreground pixel array or None if no usable image was chosen
+        '''
+        fileName = QtGui.QFileDialog.getOpenFileName(self, "Open Foreground Image",
+                                                     QtCore.QDir.currentPath())
+        if not fileName:
+            return None
 
-                newPixel = QtGui.qRgb( self.clampInt(newValue), self.clampInt(newValue), self.clampInt(newValue))
-                outImage.setPixel(row,col,newPixel)
+        aArray = self.loadArray(fileName)
+        if aArray is None:
+            QtGui.QMessageBox.information(self, "Foreground Image cannot load",
+                                          "Cannot load %s." % fileName)
+            return None
 
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(outImage))
+        #Ensure both images are the same size
+        if(aArray.shape[0]!= bArray.shape[0]):
+            QtGui.QMessageBox.information(self, "Images do not have same height", "Cannot load %s." % fileName)
+            return None
 
-    def edge(self):
-        '''A spatial filter that uses a specified kernel to detect edges in the
-        image, producing bright pixels where the transition areas occured.
+        if(aArray.shape[1]!= bArray.shape[1]):
+            QtGui.QMessageBox.information(self, "Images do not have same width", "Cannot load %s." % fileName)
+            return None
 
-            Kernel:
-                [ -1, -1, -1]
-                [ -1,  8, -1]
-                [ -1, -1, -1]
+        return aArray
+
+    def gamma(self):
+        '''Raises each pixel to the power of 1 divided by the gamma value supplied.
+        This changes the midtones of the image.
 
         '''
-        image = self.imageLabel.pixmap().toImage()
-        outImage = image.copy()
+        #Get user input Value
+        gVal = box.getGamma()
+        if gVal is None:
+            return
 
-        for row in range(0,image.height()):
-            for col in range(0,image.width()):
+        self.push(graph.point(self.node, lut.gamma(gVal)), 'gamma')
 
-                red = 0.0
-                green = 0.0
-                blue = 0.0
+    def contrast(self):
+        '''Changes brightness relationship between the upper and lower color
+        ranges of an image. Uses the function O = (I - 1/3) * 3)
 
-                imgPixel = image.pixel(row, col)
+        '''
+        self.push(graph.point(self.node, lut.contrast()), 'contrast')
 
-                #Loop -1 to 2 so that multiplication will start in the top left
-                #index of the kernel
-                for kRow in range(-1,2):
-                    iRow = row + kRow
-                    for kCol in range(-1,2):
-                        iCol = col + kCol
+    def monochrome(self):
+        '''Produces a monochromatic image by averaging the three channels together.
+        Uses the function O = (R * 0.309) + (G * 0.609) + (B * 0.082)
 
-                        #If the pixel aligned with the kernel is actually in the image
-                        if(iRow >= 0 and iRow < image.height() and iCol >= 0 and iCol < image.width()):
-                            curPixel = image.pixel(iRow, iCol)
-                            red += (QtGui.qRed(curPixel) * self.edgeArray[kRow+1][kCol+1])
-                            green += (QtGui.qGreen(curPixel) * self.edgeArray[kRow+1][kCol+1])
-                            blue += (QtGui.qBlue(curPixel) * self.edgeArray[kRow+1][kCol+1])
+        '''
+        self.push(graph.monochrome(self.node), 'monochrome')
 
-                red = self.clampInt(red)
-                green = self.clampInt(green)
-                blue = self.clampInt(blue)
+    def edge(self):
+        '''A spatial filter that uses a specified kernel to detect edges in the
+        image, producing bright pixels where the transition areas occured.
 
-                newPixelColor = QtGui.qRgb(red,green,blue)
-                outImage.setPixel(row,col,newPixelColor)
+            Kernel:
+                [ -1, -1, -1]
+                [ -1,  8, -1]
+                [ -1, -1, -1]
 
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(outImage))
+        '''
+        self.push(graph.apply(self.cache.wrap('edge', (), ops.edge), self.node, halo=1), 'edge')
 
     def blur(self):
         '''A spatial filter that uses a specified kernel to blur the image by
-        averaging the neighboring pixels with the current pixel.
+        averaging the neighboring pixels with the current pixel. Radii larger
+        than 1 average the whole (2 * radius + 1) square around the pixel.
 
             Kernel:
                 [ 1/9, 1/9, 1/9]
@@ -268,40 +738,14 @@ class ImageViewer(QtGui.QMainWindow):
                 [ 1/9, 1/9, 1/9]
 
         '''
-        image = self.imageLabel.pixmap().toImage()
-        outImage = image.copy()
-
-        for row in range(0,image.height()):
-            for col in range(0,image.width()):
-
-                red = 0.0
-                green = 0.0
-                blue = 0.0
-
-                imgPixel = image.pixel(row, col)
-
-                #Loop -1 to 2 so that multiplication will start in the top left
-                #index of the kernel
-                for kRow in range(-1,2):
-                    iRow = row + kRow
-                    for kCol in range(-1,2):
-                        iCol = col + kCol
-
-                        #If the pixel aligned with the kernel is actually in the image
-                        if(iRow >= 0 and iRow < image.height() and iCol >= 0 and iCol < image.width()):
-                            curPixel = image.pixel(iRow, iCol)
-                            red += (QtGui.qRed(curPixel) * self.blurArray[kRow+1][kCol+1])
-                            green += (QtGui.qGreen(curPixel) * self.blurArray[kRow+1][kCol+1])
-                            blue += (QtGui.qBlue(curPixel) * self.blurArray[kRow+1][kCol+1])
-
-                red = self.clampInt(red)
-                green = self.clampInt(green)
-                blue = self.clampInt(blue)
-
-                newPixelColor = QtGui.qRgb(red,green,blue)
-                outImage.setPixel(row,col,newPixelColor)
+        #get user input for the blur radius
+        radius = box.getBlurRadius()
+        if radius is None:
+            return
 
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(outImage))
+        self.push(graph.apply(self.cache.wrap('blur', (radius,),
+                                                lambda array: ops.blur(array, radius)),
+                              self.node, halo=radius), 'blur')
 
     def sharpen(self):
         '''A spatial filter that uses a specified kernel to sharpen the image by
@@ -313,149 +757,61 @@ class ImageViewer(QtGui.QMainWindow):
                 [ -1, -1, -1]
 
         '''
-        image = self.imageLabel.pixmap().toImage()
-        outImage = image.copy()
-
-        for row in range(0,image.height()):
-            for col in range(0,image.width()):
-
-                red = 0.0
-                green = 0.0
-                blue = 0.0
-
-                imgPixel = image.pixel(row, col)
-
-                #Loop -1 to 2 so that multiplication will start in the top left
-                #index of the kernel
-                for kRow in range(-1,2):
-                    iRow = row + kRow
-                    for kCol in range(-1,2):
-                        iCol = col + kCol
-
-                        #If the pixel aligned with the kernel is actually in the image
-                        if(iRow >= 0 and iRow < image.height() and iCol >= 0 and iCol < image.width()):
-                            curPixel = image.pixel(iRow, iCol)
-                            red += (QtGui.qRed(curPixel) * self.sharpenArray[kRow+1][kCol+1])
-                            green += (QtGui.qGreen(curPixel) * self.sharpenArray[kRow+1][kCol+1])
-                            blue += (QtGui.qBlue(curPixel) * self.sharpenArray[kRow+1][kCol+1])
+        self.push(graph.apply(self.cache.wrap('sharpen', (), ops.sharpen), self.node, halo=1), 'sharpen')
 
-                red = self.clampInt(red)
-                green = self.clampInt(green)
-                blue = self.clampInt(blue)
-
-                newPixelColor = QtGui.qRgb(red,green,blue)
-                outImage.setPixel(row,col,newPixelColor)
-
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(outImage))
-
-    def medianArray(self, array):
-        '''Finds the median index of an unsorted array
+    def customKernel(self):
+        '''A spatial filter that convolves the image with a kernel entered by
+        the user, written as rows separated by semicolons.
+        '''
+        #get user input for the kernel
+        text = box.getKernel()
+        if not text:
+            return
 
-            Args:
-                array: unsorted array of hsv values from 0 to 1
+        try:
+            kernel = ops.parseKernel(str(text))
+        except ValueError as error:
+            QtGui.QMessageBox.information(self, "Invalid kernel", str(error))
+            return
 
-            Returns:
-                The median index of an unsorted array
-        '''
-        sortList = sorted(array)
-        return len(sortList)/2
+        self.push(graph.apply(self.cache.wrap('convolve', (kernel,),
+                                                lambda array: ops.convolve(array, kernel)),
+                              self.node, halo=max(len(kernel), len(kernel[0])) // 2), 'convolve')
 
     def median(self):
         '''Filter that ranks the kernel pixels in terms of brightness and then
-        changes the value to be the same as the median.
+        changes the value to be the same as the median. The kernel is the
+        (2 * radius + 1) square around the pixel.
         '''
-        image = self.imageLabel.pixmap().toImage()
-        outImage = image.copy()
-
-        for row in range(0,image.height()):
-            for col in range(0,image.width()):
-
-                #load rgb values into a list so that the median index can be retrieved
-                red = []
-                green = []
-                blue = []
-                value = []
-
-                imgPixel = image.pixel(row, col)
-
-                for kRow in range(-1,2):
-                    for kCol in range(-1,2):
-                        iRow = row + kRow
-                        iCol = col + kCol
-
-                        if(iRow >= 0 and iRow < image.height() and iCol >= 0 and iCol < image.width()):
-                            curPixel = image.pixel(iRow, iCol)
-
-                            #append each values to its respective list
-                            red.append(QtGui.qRed(curPixel))
-                            green.append(QtGui.qGreen(curPixel))
-                            blue.append(QtGui.qBlue(curPixel))
-
-                            #convert to hsv and load resulting values into a new array
-                            hsvPixel = self.hsv(QtGui.qRed(curPixel), QtGui.qGreen(curPixel), QtGui.qBlue(curPixel))
-                            value.append(hsvPixel[2])
-
-                #find the median of the values
-                medianIndex = self.medianArray(value)
-
-                sortRed = sorted(red)
-                sortGreen = sorted(green)
-                sortBlue = sorted(blue)
-
-                #retrieve the correct rgb values
-                redVal = self.clampInt(sortRed[medianIndex])
-                greenVal = self.clampInt(sortGreen[medianIndex])
-                blueVal = self.clampInt(sortBlue[medianIndex])
-
-                newPixelColor = QtGui.qRgb(redVal,greenVal,blueVal)
-                outImage.setPixel(row,col,newPixelColor)
+        #get user input for the median radius
+        radius = box.getMedianRadius()
+        if radius is None:
+            return
 
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(outImage))
+        self.push(graph.apply(self.cache.wrap('median', (radius,),
+                                                lambda array: ops.median(array, radius)),
+                              self.node, halo=radius), 'median')
 
     def mix(self):
         '''Calculates the normalized addition of two images. Uses the formula:
         O = (A * aMix) + (B * bMix)
         '''
         #store the imageLabel as the background image
-        bImage = self.imageLabel.pixmap().toImage()
-        outImage = bImage.copy()
+        bArray = self.currentArray()
 
-        #open a new image as a foreground image
-        fileName = QtGui.QFileDialog.getOpenFileName(self, "Open Foreground Image",
-                                                     QtCore.QDir.currentPath())
-        if fileName:
-            aImage = QtGui.QImage(fileName)
-            if aImage.isNull():
-                QtGui.QMessageBox.information(self, "New Image cannot load",
-                                              "Cannot load %s." % fileName)
-                return
-
-        #Ensure both images are the same size
-        if(aImage.height()!= bImage.height()):
-            QtGui.QMessageBox.information(self, "Images do not have same height", "Cannot load %s." % fileName)
-            return
-        if(aImage.width()!= bImage.width()):
-            QtGui.QMessageBox.information(self, "Images do not have same width", "Cannot load %s." % fileName)
+        aArray = self.openForeground(bArray)
+        if aArray is None:
             return
 
         #get user input for mix values
         aMix = box.getAMix()
-        bMix = box.getBMix()
-
-        for row in range(0,aImage.height()):
-            for col in range(0,aImage.width()):
-
-                aPixel = aImage.pixel(row,col)
-                bPixel = bImage.pixel(row,col)
-
-                red = (QtGui.qRed(aPixel) * aMix) + (QtGui.qRed(bPixel) * bMix)
-                green = (QtGui.qGreen(aPixel) * aMix) + (QtGui.qGreen(bPixel) * bMix)
-                blue = (QtGui.qBlue(aPixel) * aMix) + (QtGui.qBlue(bPixel) * bMix)
-
-                newPixelColor = QtGui.qRgb(self.clampInt(red),self.clampInt(green), self.clampInt(blue))
-                outImage.setPixel(row,col,newPixelColor)
+        bMix = box.getBMix() if aMix is not None else None
+        if bMix is None:
+            return
 
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(outImage))
+        self.push(graph.apply(self.cache.wrap('mix', (aMix, bMix),
+                                                lambda a, b: ops.mix(a, b, aMix, bMix)),
+                              graph.source(aArray), self.node, halo=0), 'mix')
 
     def keyMix(self):
         '''Uses a matte as a key to determine how two images mix together on a pixel
@@ -464,44 +820,15 @@ class ImageViewer(QtGui.QMainWindow):
             Note: In this function, the alpha of the foreground (second image) is used
             as the matte. Thus, the foreground image must be a straight image.
         '''
-
         #store the imageLabel as the background image
-        bImage = self.imageLabel.pixmap().toImage()
-        outImage = bImage.copy()
-
-        #open a new image as a foreground image
-        fileName = QtGui.QFileDialog.getOpenFileName(self, "Open Foreground Image",
-                                                     QtCore.QDir.currentPath())
-        if fileName:
-            aImage = QtGui.QImage(fileName)
-            if aImage.isNull():
-                QtGui.QMessageBox.information(self, "Foreground Image cannot load",
-                                              "Cannot load %s." % fileName)
-                return
-
-        #Ensure both images are the same size
-        if(aImage.height()!= bImage.height()):
-            QtGui.QMessageBox.information(self, "Images do not have same height", "Cannot load %s." % fileName)
-            return
+        bArray = self.currentArray()
 
-        if(aImage.width()!= bImage.width()):
-            QtGui.QMessageBox.information(self, "Images do not have same width", "Cannot load %s." % fileName)
+        aArray = self.openForeground(bArray)
+        if aArray is None:
             return
 
-        for row in range(0,aImage.height()):
-            for col in range(0,aImage.width()):
-
-                aPixel = aImage.pixel(row,col)
-                bPixel = bImage.pixel(row,col)
-
-                red = (QtGui.qRed(aPixel) * (QtGui.qAlpha(aPixel)/255)) + ((1 - (QtGui.qAlpha(aPixel)/255)) * QtGui.qRed(bPixel))
-                green = (QtGui.qGreen(aPixel) * (QtGui.qAlpha(aPixel)/255)) + ((1 - (QtGui.qAlpha(aPixel)/255)) * QtGui.qGreen(bPixel))
-                blue = (QtGui.qBlue(aPixel) * (QtGui.qAlpha(aPixel)/255)) + ((1 - (QtGui.qAlpha(aPixel)/255)) * QtGui.qBlue(bPixel))
-
-                newPixelColor = QtGui.qRgb(self.clampInt(red), self.clampInt(green), self.clampInt(blue))
-                outImage.setPixel(row,col,newPixelColor)
-
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(outImage))
+        self.push(graph.apply(self.cache.wrap('keyMix', (), ops.keyMix),
+                              graph.source(aArray), self.node, halo=0), 'keyMix')
 
     def over(self):
         '''Layers a four channel image over another image. Uses the formula: O = A + [(1- alphaA) * B]
@@ -509,105 +836,140 @@ class ImageViewer(QtGui.QMainWindow):
             Note: In this function the foreground image is assumed to be a premultiplied image.
         '''
         #store the imageLabel as the background image
-        bImage = self.imageLabel.pixmap().toImage()
-        outImage = bImage.copy()
+        bArray = self.currentArray()
 
-        #open a new image as a foreground image
-        fileName = QtGui.QFileDialog.getOpenFileName(self, "Open Foreground Image",
-                                                     QtCore.QDir.currentPath())
-        if fileName:
-            aImage = QtGui.QImage(fileName)
-            if aImage.isNull():
-                QtGui.QMessageBox.information(self, "Foreground Image cannot load",
-                                              "Cannot load %s." % fileName)
-                return
-
-        #Ensure both images are the same size
-        if(aImage.height()!= bImage.height()):
-            QtGui.QMessageBox.information(self, "Images do not have same height", "Cannot load %s." % fileName)
+        aArray = self.openForeground(bArray)
+        if aArray is None:
             return
 
-        if(aImage.width()!= bImage.width()):
-            QtGui.QMessageBox.information(self, "Images do not have same width", "Cannot load %s." % fileName)
-            return
+        self.push(graph.apply(self.cache.wrap('over', (), ops.over),
+                              graph.source(aArray), self.node, halo=0), 'over')
 
+    def porterDuff(self):
+        '''Composites a foreground image with the image using one of the
+        Porter-Duff operators in composite.OPERATORS. Both images are
+        premultiplied for the operator and the result is made straight again.
+        '''
+        #store the imageLabel as the background image
+        bArray = self.currentArray()
 
-        for row in range(0,aImage.height()):
-            for col in range(0,aImage.width()):
+        aArray = self.openForeground(bArray)
+        if aArray is None:
+            return
 
-                aPixel = aImage.pixel(row,col)
-                bPixel = bImage.pixel(row,col)
+        operator = box.getOperator(sorted(composite.OPERATORS))
+        if operator is None:
+            return
 
-                red = QtGui.qRed(aPixel) + ((1 - (QtGui.qAlpha(aPixel)/255)) * QtGui.qRed(bPixel))
-                green = QtGui.qGreen(aPixel) + ((1 - (QtGui.qAlpha(aPixel)/255)) * QtGui.qGreen(bPixel))
-                blue = QtGui.qBlue(aPixel) + ((1 - (QtGui.qAlpha(aPixel)/255)) * QtGui.qBlue(bPixel))
-                alpha = QtGui.qAlpha(aPixel) + ((1 - (QtGui.qAlpha(aPixel)/255)) * QtGui.qAlpha(bPixel))
+        self.push(graph.apply(self.cache.wrap('composite', (operator,),
+                                                lambda a, b: composite.composite(operator, a, b)),
+                              graph.source(aArray), self.node, halo=0), operator)
 
-                newPixelColor = QtGui.qRgba(self.clampInt(red), self.clampInt(green), self.clampInt(blue), self.clampInt(alpha))
-                outImage.setPixel(row,col,newPixelColor)
+    def addLayer(self):
+        '''Puts an image of any size on a new layer over the image, with a
+        compositing operator, an opacity and an offset. The first layer turns
+        the image itself into the bottom layer of the stack.
+        '''
+        fileName = QtGui.QFileDialog.getOpenFileName(self, "Open Layer Image",
+                                                     QtCore.QDir.currentPath())
+        if not fileName:
+            return
 
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(outImage))
+        aArray = self.loadArray(fileName)
+        if aArray is None:
+            QtGui.QMessageBox.information(self, "Layer Image cannot load",
+                                          "Cannot load %s." % fileName)
+            return
 
-    def hsv(self, r, g, b):
-        '''Converts rbg values to thier corresponding hsv values
+        operator = box.getOperator(sorted(composite.OPERATORS))
+        if operator is None:
+            return
+        opacity = box.getOpacity(1.0)
+        if opacity is None:
+            return
+        offset = self.askOffset((0, 0))
+        if offset is None:
+            return
 
-            Note: This code was given to us by Dr. Levine in 6040. I think it
-                works really well, so I incorporated it.
+        if self.stack is None:
+            bArray = self.currentArray()
+            self.stack = layers.Stack(*bArray.shape[:2])
+            self.stack.add(bArray)
 
-            Args:
-                r: float of red color value
-                g: float of green color value
-                b: float of blue color value
+        self.stack.add(aArray, operator, opacity, offset)
+        self.pushLayers()
 
-            Returns:
-                An array with the hsv values: [H, S, V]
+    def moveLayer(self):
+        '''Moves a layer, recompositing only where it was and where it goes
+        '''
+        layer = self.chooseLayer()
+        if layer is None:
+            return
 
+        offset = self.askOffset(layer.offset)
+        if offset is not None:
+            self.stack.move(layer, offset)
+            self.pushLayers()
+
+    def layerOpacity(self):
+        '''Changes the opacity of a layer, recompositing only the area it covers
         '''
-        red = r / 255.0
-        green = g / 255.0
-        blue = b / 255.0
+        layer = self.chooseLayer()
+        if layer is None:
+            return
 
-    	maxc = max(max(red, green), blue)
-    	minc = min(min(red, green), blue)
+        opacity = box.getOpacity(layer.opacity)
+        if opacity is not None:
+            self.stack.setOpacity(layer, opacity)
+            self.pushLayers()
 
-        # value is maximum of r, g, b
-    	v = maxc
+    def chooseLayer(self):
+        '''Asks for one of the layers added over the image
 
-        #saturation and hue 0 if value is 0
-    	if(maxc == 0):
-            s = 0
-            h= 0
+            Returns:
+                The Layer or None if there is none or none was chosen
+        '''
+        if self.stack is None or len(self.stack.layers) < 2:
+            QtGui.QMessageBox.information(self, "Image Viewer", "No layers were added.")
+            return None
 
-        #saturation is color purity on scale 0 - 1
-    	else:
-            s = (maxc - minc) / maxc
-            delta = maxc - minc
+        number = box.getLayer(len(self.stack.layers) - 1)
+        if number is None:
+            return None
+        return self.stack.layers[number]
 
-            #hue doesn't matter if saturation is 0
-            if(delta == 0):
-                h = 0
+    def askOffset(self, current):
+        '''Asks for a layer offset
 
-                #otherwise, determine hue on scale 0 - 360
-            else:
-    			if(red == maxc):
-    				h = (green - blue) / delta
-    			elif(green == maxc):
-    				h = 2.0 + (blue - red) / delta
+            Args:
+                current: (top, left) offset shown to start from
 
-                 #(blue == maxc)
-    			else:
-    				h = 4.0 + (red - green) / delta
+            Returns:
+                The (top, left) offset or None if none was entered
+        '''
+        text = box.getOffset((current[1], current[0]))
+        if not text:
+            return None
+
+        try:
+            x, y = [int(value) for value in str(text).split(',')]
+        except ValueError:
+            QtGui.QMessageBox.information(self, "Invalid offset",
+                                          "Enter the offset as two integers: x,y")
+            return None
+        return y, x
+
+    def pushLayers(self):
+        '''Recomposites the dirty tiles of the layer stack on a worker and
+        makes the result the current edit
+        '''
+        stack = self.stack
 
-    			h = h * 60.0
-    			if(h < 0):
-    				h = h + 360.0
+        def render(progress=None):
+            stack.render(progress)
+            return stack.canvas.copy()
 
-        #put new hsv values into an array and return it
-        hsvPix = []
-    	hsvPix.append(h)
-    	hsvPix.append(s)
-    	hsvPix.append(v)
-    	return hsvPix
+        self.push(graph.apply(render, progress=True), 'layers')
 
     def lumaKey(self):
         '''Extracts a matte based on manipulating luminance values. This is done
@@ -618,69 +980,24 @@ class ImageViewer(QtGui.QMainWindow):
                 matte over a second image.
         '''
         #store the imageLabel as the background image
-        bImage = self.imageLabel.pixmap().toImage()
-        outImage = bImage.copy()
-
-        #open a new image as a foreground image
-        fileName = QtGui.QFileDialog.getOpenFileName(self, "Open Foreground Image",
-                                                     QtCore.QDir.currentPath())
-        if fileName:
-            aImage = QtGui.QImage(fileName)
-            if aImage.isNull():
-                QtGui.QMessageBox.information(self, "Foreground Image cannot load",
-                                              "Cannot load %s." % fileName)
-                return
+        bNode = self.node
+        bArray = bNode.evaluate()
 
-        #Ensure both images are the same size
-        if(aImage.height()!= bImage.height()):
-            QtGui.QMessageBox.information(self, "Images do not have same height", "Cannot load %s." % fileName)
+        aArray = self.keyerForeground(bArray)
+        if aArray is None:
             return
 
-        if(aImage.width()!= bImage.width()):
-            QtGui.QMessageBox.information(self, "Images do not have same width", "Cannot load %s." % fileName)
-            return
-
-        #set the foreground image as the ImageLabel
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(aImage))
-
-        #apply monochrome and contrast to the foreground image
-        self.monochrome()
-        self.contrast()
+        #show the foreground after monochrome and contrast
+        self.showArray(graph.point(graph.monochrome(graph.source(aArray)), lut.contrast()).evaluate())
 
         #get user input
         lumValue = box.getLum()
+        if lumValue is None:
+            self.showArray(bArray)
+            return
 
-        for row in range(0,aImage.height()):
-            for col in range(0,aImage.width()):
-
-                aPixel = aImage.pixel(row,col)
-                bPixel = bImage.pixel(row,col)
-
-                red = QtGui.qRed(aPixel)
-                green = QtGui.qGreen(aPixel)
-                blue = QtGui.qBlue(aPixel)
-                alpha = 255
-
-                #convert pixel to hsv to compare values
-                hsvPix = self.hsv(red,green,blue)
-
-                #clear lowest value pixels
-                if(hsvPix[2] <= lumValue):
-                    alpha = 0
-
-                #lPixel = new luma pixel
-                lPixel = QtGui.qRgba(red,green,blue,alpha)
-                aImage.setPixel(row,col,lPixel)
-
-                #Layer the foreground matte over the background image
-                red = (QtGui.qRed(lPixel) * (QtGui.qAlpha(lPixel)/255)) + ((1 - (QtGui.qAlpha(lPixel)/255)) * QtGui.qRed(bPixel))
-                green = (QtGui.qGreen(lPixel) * (QtGui.qAlpha(lPixel)/255)) + ((1 - (QtGui.qAlpha(lPixel)/255)) * QtGui.qGreen(bPixel))
-                blue = (QtGui.qBlue(lPixel) * (QtGui.qAlpha(lPixel)/255)) + ((1 - (QtGui.qAlpha(lPixel)/255)) * QtGui.qBlue(bPixel))
-
-                newPixelColor = QtGui.qRgba(self.clampInt(red), self.clampInt(green), self.clampInt(blue), self.clampInt(alpha))
-                outImage.setPixel(row,col,newPixelColor)
-
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(outImage))
+        self.pushKey('lumaKey', (lumValue,), lambda a, b: ops.lumaKey(a, b, lumValue),
+                     aArray, bNode, self.lumaAct)
 
     def chromaKey(self):
         '''Extracts a matte based on a range of hue and saturation values. This
@@ -691,133 +1008,213 @@ class ImageViewer(QtGui.QMainWindow):
                 matte over a second image.
         '''
         #store the imageLabel as the background image
-        bImage = self.imageLabel.pixmap().toImage()
-        outImage = bImage.copy()
-
-        #open a new image as a foreground image
-        fileName = QtGui.QFileDialog.getOpenFileName(self, "Open Foreground Image",
-                                                     QtCore.QDir.currentPath())
-        if fileName:
-            aImage = QtGui.QImage(fileName)
-            if aImage.isNull():
-                QtGui.QMessageBox.information(self, "Foreground Image cannot load",
-                                              "Cannot load %s." % fileName)
-                return
+        bNode = self.node
+        bArray = bNode.evaluate()
 
-        #Ensure both images are the same size
-        if(aImage.height()!= bImage.height()):
-            QtGui.QMessageBox.information(self, "Images do not have same height", "Cannot load %s." % fileName)
-            return
-
-        if(aImage.width()!= bImage.width()):
-            QtGui.QMessageBox.information(self, "Images do not have same width", "Cannot load %s." % fileName)
+        aArray = self.keyerForeground(bArray)
+        if aArray is None:
             return
 
         #set the foreground image as the ImageLabel
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(aImage))
+        self.showArray(aArray)
 
-        #get user input
+        #get user input, stopping at the first cancelled dialog
         hueLow = box.getHueLow()
-        hueHigh = box.getHueHigh()
-        satLow = box.getSatLow()
+        hueHigh = box.getHueHigh() if hueLow is not None else None
+        satLow = box.getSatLow() if hueHigh is not None else None
+        if satLow is None:
+            self.showArray(bArray)
+            return
 
-        for row in range(0,aImage.height()):
-            for col in range(0,aImage.width()):
+        self.pushKey('chromaKey', (hueLow, hueHigh, satLow),
+                     lambda a, b: ops.chromaKey(a, b, hueLow, hueHigh, satLow),
+                     aArray, bNode, self.chromaAct)
 
-                aPixel = aImage.pixel(row,col)
-                bPixel = bImage.pixel(row,col)
+    def colorDiff(self):
+        '''Extracts a matte from a blue-screen image, color corrects it, and
+        composites it over a second image.
+        '''
+        #store the imageLabel as the background image
+        bArray = self.currentArray()
 
-                red = QtGui.qRed(aPixel)
-                green = QtGui.qGreen(aPixel)
-                blue = QtGui.qBlue(aPixel)
-                alpha = 255
+        aArray = self.openForeground(bArray)
+        if aArray is None:
+            return
 
-                #convert to HSV
-                hsvPix = self.hsv(red,green,blue)
+        self.push(graph.apply(self.cache.wrap('colorDiff', (), ops.colorDiff),
+                              graph.source(aArray), self.node, halo=0), 'colorDiff')
 
-                #Hue range in 225-235; Saturation range .7 - 1.0
-                if(hsvPix[0] <= hueHigh and hsvPix[0] >= hueLow and hsvPix[1] >= satLow):
-                    alpha = 0
+    def changeLive(self):
+        '''Starts live rendering after a parameter of the panel changed
+        '''
+        self.liveActive = True
+        self.scheduleLive()
 
-                #cPixel = new chormaKey pixel
-                cPixel = QtGui.qRgba(red,green,blue,alpha)
-                aImage.setPixel(row,col,cPixel)
+    def scheduleLive(self):
+        '''Renders the panel operation on the next display frame, once for
+        any number of changes in between
+        '''
+        if self.liveActive and self.panel.isVisible() and not self.liveTimer.isActive():
+            self.liveTimer.start()
 
-                #place over background image
-                red = (QtGui.qRed(cPixel) * (QtGui.qAlpha(cPixel)/255)) + ((1 - (QtGui.qAlpha(cPixel)/255)) * QtGui.qRed(bPixel))
-                green = (QtGui.qGreen(cPixel) * (QtGui.qAlpha(cPixel)/255)) + ((1 - (QtGui.qAlpha(cPixel)/255)) * QtGui.qGreen(bPixel))
-                blue = (QtGui.qBlue(cPixel) * (QtGui.qAlpha(cPixel)/255)) + ((1 - (QtGui.qAlpha(cPixel)/255)) * QtGui.qBlue(bPixel))
+    def endLive(self, visible):
+        '''Shows the current image again when the panel is closed
 
-                newPixelColor = QtGui.qRgba(self.clampInt(red), self.clampInt(green), self.clampInt(blue), self.clampInt(alpha))
-                outImage.setPixel(row,col,newPixelColor)
+            Args:
+                visible: True if the panel is shown
+        '''
+        if not visible and self.liveActive:
+            self.liveActive = False
+            self.livePixmap = None
+            if self.node is not None:
+                self.showArray(self.node.value)
 
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(outImage))
+    def liveOperation(self):
+        '''Gets the operation set up in the panel
 
-    def colorDiff(self):
-        '''Extracts a matte from a blue-screen image, color corrects it, and
-        composites it over a second image.
+            Returns:
+                A (name, params, function, foreground) tuple where function
+                takes the foreground (except for gamma) and the current image,
+                or None if the operation still needs a foreground
         '''
-        #store the imageLabel as the background image
-        bImage = self.imageLabel.pixmap().toImage()
-        outImage = bImage.copy()
+        operation = self.panel.operation()
+        values = self.panel.values()
 
-        #open a new image as a foreground image
-        fileName = QtGui.QFileDialog.getOpenFileName(self, "Open Foreground Image",
-                                                     QtCore.QDir.currentPath())
-        if fileName:
-            aImage = QtGui.QImage(fileName)
-            if aImage.isNull():
-                QtGui.QMessageBox.information(self, "Foreground Image cannot load",
-                                              "Cannot load %s." % fileName)
-                return
+        if operation == "Gamma":
+            gVal = values['gamma']
+            return 'gamma', (gVal,), lambda b: ops.applyTable(b, lut.gamma(gVal)), None
 
-        #Ensure both images are the same size
-        if(aImage.height()!= bImage.height()):
-            QtGui.QMessageBox.information(self, "Images do not have same height", "Cannot load %s." % fileName)
-            return
+        if self.liveForeground is None:
+            return None
 
-        if(aImage.width()!= bImage.width()):
-            QtGui.QMessageBox.information(self, "Images do not have same width", "Cannot load %s." % fileName)
-            return
+        if operation == "Mix":
+            aMix, bMix = values['aMix'], values['bMix']
+            return ('mix', (aMix, bMix), lambda a, b: ops.mix(a, b, aMix, bMix),
+                    self.liveForeground)
 
-        #set the foreground image as the ImageLabel
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(aImage))
+        if operation == "Luma Key":
+            lumValue = values['lum']
+            return ('lumaKey', (lumValue,), lambda a, b: ops.lumaKey(a, b, lumValue),
+                    self.liveForeground)
 
-        for row in range(0,aImage.height()):
-            for col in range(0,aImage.width()):
+        hueLow, hueHigh, satLow = values['hueLow'], values['hueHigh'], values['satLow']
+        return ('chromaKey', (hueLow, hueHigh, satLow),
+                lambda a, b: ops.chromaKey(a, b, hueLow, hueHigh, satLow), self.liveForeground)
 
-                aPixel = aImage.pixel(row,col)
-                bPixel = bImage.pixel(row,col)
+    def visibleBox(self):
+        '''Gets the part of the image visible in the scroll area and the
+        subsampling that matches its screen resolution
 
-                red = QtGui.qRed(aPixel)
-                green = QtGui.qGreen(aPixel)
-                blue = QtGui.qBlue(aPixel)
-                alpha = 255
+            Returns:
+                A ((top, left, bottom, right), step) tuple in image pixels
+        '''
+        height, width = self.node.value.shape[:2]
+        rect = self.imageLabel.visibleRegion().boundingRect()
+        xScale = width / float(max(self.imageLabel.width(), 1))
+        yScale = height / float(max(self.imageLabel.height(), 1))
+
+        top = max(int(rect.top() * yScale), 0)
+        left = max(int(rect.left() * xScale), 0)
+        bottom = min(int((rect.bottom() + 1) * yScale) + 1, height)
+        right = min(int((rect.right() + 1) * xScale) + 1, width)
+
+        #one image pixel per screen pixel when zoomed out
+        step = max(int(min(xScale, yScale)), 1)
+        return (top, left, bottom, right), step
+
+    def renderLive(self):
+        '''Renders the panel operation over the visible part of the image
+        '''
+        operation = self.liveOperation() if self.node is not None else None
+        if operation is None:
+            return
 
-                #spill suppression
-                if(blue > green):
-                    newBlue = green
-                else:
-                    newBlue = blue
+        name, params, function, aArray = operation
+        arrays = [self.node.value] if aArray is None else [aArray, self.node.value]
 
-                #matte creation
-                mAlpha = QtGui.qBlue(aPixel) - max(QtGui.qGreen(aPixel), QtGui.qRed(aPixel))
-                mAlpha /= 255.0
+        region, step = self.visibleBox()
+        top, left, bottom, right = region
+        if bottom <= top or right <= left:
+            return
+        #a job may be rendering meanwhile, so the live phases go under their own token
+        with self.profiler.phase('compute', token='live'):
+            result = preview.region(function, arrays, region, step)
+
+        if self.livePixmap is None:
+            self.livePixmap = self.upload(self.node.value, 'live')
+
+        with self.profiler.phase('from-buffer', 0 if result.flags.c_contiguous else result.nbytes, 'live'):
+            image = pixelEngine.arrayView(result)
+        with self.profiler.phase('upload', result.nbytes, 'live'):
+            painter = QtGui.QPainter(self.livePixmap)
+            painter.drawImage(QtCore.QRect(left, top, right - left, bottom - top), image)
+            painter.end()
+        self.imageLabel.setPixmap(self.livePixmap)
+        self.statusBar().showMessage(self.profiler.finish("live " + name, ('live',)))
+
+    def chooseLiveForeground(self):
+        '''Opens the foreground image of the panel operations
+        '''
+        if self.node is None:
+            return
 
-                lPixel = QtGui.qRgba(red,green,newBlue,alpha)
-                aImage.setPixel(row,col,lPixel)
+        aArray = self.openForeground(self.node.value)
+        if aArray is not None:
+            self.liveForeground = aArray
+            self.changeLive()
 
-                #image composite
-                red = (mAlpha * QtGui.qRed(bPixel)) + QtGui.qRed(lPixel)
-                green = (mAlpha * QtGui.qGreen(bPixel)) + QtGui.qGreen(lPixel)
-                blue = (mAlpha * QtGui.qBlue(bPixel)) + QtGui.qBlue(lPixel)
-                alpha = (mAlpha * QtGui.qAlpha(bPixel)) + QtGui.qAlpha(lPixel)
+    def applyLive(self):
+        '''Commits the panel operation to the whole image
+        '''
+        operation = self.liveOperation() if self.node is not None else None
+        if operation is None:
+            return
 
-                newPixelColor = QtGui.qRgba(self.clampInt(red), self.clampInt(green), self.clampInt(blue), self.clampInt(alpha))
-                outImage.setPixel(row,col,newPixelColor)
+        name, params, function, aArray = operation
+        self.liveActive = False
+
+        if aArray is None:
+            self.push(graph.point(self.node, lut.gamma(params[0])), name)
+        elif name == 'mix':
+            self.push(graph.apply(self.cache.wrap(name, params, function),
+                                  graph.source(aArray), self.node, halo=0), name)
+        else:
+            self.pushKey(name, params, function, aArray, self.node, None)
 
-        self.imageLabel.setPixmap(QtGui.QPixmap.fromImage(outImage))
+    def workerThreads(self):
+        '''Sets the number of threads the operations are split over
+        '''
+        count = box.getWorkers(parallel.workers())
+        if count is not None:
+            parallel.setWorkers(count)
 
+    def cacheStatistics(self):
+        '''Shows the result and decode cache counters, for sizing their
+        memory budgets
+        '''
+        stats = self.cache.stats()
+        loaderStats = self.loader.stats()
+        QtGui.QMessageBox.information(self, "Result Cache",
+                ("Hits: %(hits)d (%(diskHits)d from disk)\n"
+                 "Misses: %(misses)d\n"
+                 "Evictions: %(evictions)d (%(spills)d spilled)\n"
+                 "Entries: %(entries)d, %(bytes)d bytes" % stats) +
+                ("\n\nDecoded files\n"
+                 "Hits: %(hits)d, misses: %(misses)d, prefetched: %(prefetches)d\n"
+                 "Entries: %(entries)d, %(bytes)d bytes" % loaderStats))
+
+    def saveTrace(self):
+        '''Saves the recorded phase timings as a Chrome trace JSON file, for
+        chrome://tracing or Perfetto
+        '''
+        fileName = QtGui.QFileDialog.getSaveFileName(self, "Save Trace",
+                QtCore.QDir.currentPath(), "Chrome trace (*.json)")
+        if fileName:
+            try:
+                self.profiler.save(str(fileName))
+            except IOError as error:
+                QtGui.QMessageBox.information(self, "Image Viewer",
+                        "Cannot save %s: %s" % (fileName, error))
 
     def zoomIn(self):
         '''Zooms in using the code provide by Trolltech
@@ -851,6 +1248,18 @@ class ImageViewer(QtGui.QMainWindow):
         self.openAct = QtGui.QAction("&Open...", self, shortcut="Ctrl+O",
                 triggered=self.open)
 
+        self.saveAct = QtGui.QAction("&Save As...", self, shortcut="Ctrl+Shift+S",
+                enabled=False, triggered=self.save)
+
+        self.nextFrameAct = QtGui.QAction("&Next Frame", self, shortcut="Ctrl+Right",
+                triggered=self.nextFrame)
+
+        self.previousFrameAct = QtGui.QAction("P&revious Frame", self, shortcut="Ctrl+Left",
+                triggered=self.previousFrame)
+
+        self.playSequenceAct = QtGui.QAction("P&lay Sequence...", self, shortcut="Ctrl+Shift+P",
+                triggered=self.playSequence)
+
         self.printAct = QtGui.QAction("&Print...", self, shortcut="Ctrl+P",
                 enabled=False, triggered=self.print_)
 
@@ -870,6 +1279,27 @@ class ImageViewer(QtGui.QMainWindow):
                 enabled=False, checkable=True, shortcut="Ctrl+F",
                 triggered=self.fitToWindow)
 
+        self.cacheStatisticsAct = QtGui.QAction("&Cache Statistics...", self,
+                triggered=self.cacheStatistics)
+
+        self.workersAct = QtGui.QAction("&Worker Threads...", self,
+                triggered=self.workerThreads)
+
+        self.saveTraceAct = QtGui.QAction("Save &Trace...", self,
+                triggered=self.saveTrace)
+
+        self.panelAct = self.panel.toggleViewAction()
+        self.panelAct.setShortcut("Ctrl+L")
+
+        self.undoAct = QtGui.QAction("&Undo", self, shortcut="Ctrl+Z",
+                enabled=False, triggered=self.undo)
+
+        self.redoAct = QtGui.QAction("&Redo", self, shortcut="Ctrl+Shift+Z",
+                enabled=False, triggered=self.redo)
+
+        self.cancelAct = QtGui.QAction("&Cancel", self, shortcut="Esc",
+                enabled=False, triggered=self.cancel)
+
         self.gammaAct = QtGui.QAction("&Gamma", self, triggered=self.gamma)
 
         self.contrastAct = QtGui.QAction("&Contrast", self, triggered=self.contrast)
@@ -882,6 +1312,8 @@ class ImageViewer(QtGui.QMainWindow):
 
         self.sharpenAct = QtGui.QAction("&Sharpen", self, triggered=self.sharpen)
 
+        self.customKernelAct = QtGui.QAction("C&ustom Kernel...", self, triggered=self.customKernel)
+
         self.medianAct = QtGui.QAction("&Median", self, triggered=self.median)
 
         self.mixAct = QtGui.QAction("&Mix", self, triggered=self.mix)
@@ -890,6 +1322,14 @@ class ImageViewer(QtGui.QMainWindow):
 
         self.overAct = QtGui.QAction("&Over", self, triggered=self.over)
 
+        self.porterDuffAct = QtGui.QAction("Com&posite...", self, triggered=self.porterDuff)
+
+        self.addLayerAct = QtGui.QAction("Add &Layer...", self, triggered=self.addLayer)
+
+        self.moveLayerAct = QtGui.QAction("Mo&ve Layer...", self, triggered=self.moveLayer)
+
+        self.layerOpacityAct = QtGui.QAction("La&yer Opacity...", self, triggered=self.layerOpacity)
+
         self.lumaAct = QtGui.QAction("Luma Key", self, triggered=self.lumaKey)
 
         self.chromaAct = QtGui.QAction("Chroma Key", self, triggered=self.chromaKey)
@@ -901,6 +1341,12 @@ class ImageViewer(QtGui.QMainWindow):
         '''
         self.fileMenu = QtGui.QMenu("&File", self)
         self.fileMenu.addAction(self.openAct)
+        self.fileMenu.addAction(self.saveAct)
+        self.fileMenu.addSeparator()
+        self.fileMenu.addAction(self.nextFrameAct)
+        self.fileMenu.addAction(self.previousFrameAct)
+        self.fileMenu.addAction(self.playSequenceAct)
+        self.fileMenu.addSeparator()
         self.fileMenu.addAction(self.printAct)
         self.fileMenu.addSeparator()
         self.fileMenu.addAction(self.exitAct)
@@ -911,18 +1357,35 @@ class ImageViewer(QtGui.QMainWindow):
         self.viewMenu.addAction(self.normalSizeAct)
         self.viewMenu.addSeparator()
         self.viewMenu.addAction(self.fitToWindowAct)
+        self.viewMenu.addSeparator()
+        self.viewMenu.addAction(self.panelAct)
+        self.viewMenu.addAction(self.cacheStatisticsAct)
+        self.viewMenu.addAction(self.workersAct)
+        self.viewMenu.addAction(self.saveTraceAct)
+
+        #outside the Edit menu, which is disabled while an operation runs
+        self.viewMenu.addSeparator()
+        self.viewMenu.addAction(self.cancelAct)
 
         self.editMenu = QtGui.QMenu("&Edit", self)
+        self.editMenu.addAction(self.undoAct)
+        self.editMenu.addAction(self.redoAct)
+        self.editMenu.addSeparator()
         self.editMenu.addAction(self.gammaAct)
         self.editMenu.addAction(self.contrastAct)
         self.editMenu.addAction(self.monochromeAct)
         self.editMenu.addAction(self.edgeAct)
         self.editMenu.addAction(self.blurAct)
         self.editMenu.addAction(self.sharpenAct)
+        self.editMenu.addAction(self.customKernelAct)
         self.editMenu.addAction(self.medianAct)
         self.editMenu.addAction(self.mixAct)
         self.editMenu.addAction(self.keyMixAct)
         self.editMenu.addAction(self.overAct)
+        self.editMenu.addAction(self.porterDuffAct)
+        self.editMenu.addAction(self.addLayerAct)
+        self.editMenu.addAction(self.moveLayerAct)
+        self.editMenu.addAction(self.layerOpacityAct)
         self.editMenu.addAction(self.lumaAct)
         self.editMenu.addAction(self.chromaAct)
         self.editMenu.addAction(self.DiffAct)
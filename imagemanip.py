@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+'''Command line batch processor for the image operations.
+
+Runs a chain of operations from ops over a list of frames, spreading the
+frames over a process pool and writing each result as soon as it finishes:
+
+    python imagemanip.py run --op chromaKey --hue 225:235 --sat 0.7 \
+        --bg plate.png in/*.png -o out/
+
+Two-image operations (mix, keyMix, over, composite and the keyers) use the
+frame as the foreground and the --bg image as the background, the same way
+the viewer uses the chosen file over the displayed image. composite applies
+the Porter-Duff --operator (see composite).
+
+Images too large for memory are processed tile by tile through memory-mapped
+.npy pixel files (see tiles):
+
+    python imagemanip.py tile --op median --radius 3 plate.npy -o out.npy
+'''
+
+from __future__ import print_function
+
+import argparse
+import functools
+import glob
+import multiprocessing
+import os
+import sys
+import time
+
+import composite
+import graph
+import hsvTable
+import lut
+import ops
+import parallel
+import pixelEngine
+import tiles
+
+#operation name -> function(frame, background, args) returning the new frame
+OPERATIONS = {
+    'gamma': lambda a, b, args: ops.gamma(a, args.gamma),
+    'contrast': lambda a, b, args: ops.contrast(a),
+    'monochrome': lambda a, b, args: ops.monochrome(a),
+    'edge': lambda a, b, args: ops.edge(a),
+    'blur': lambda a, b, args: ops.blur(a, args.radius),
+    'gaussianBlur': lambda a, b, args: ops.gaussianBlur(a, args.radius),
+    'sharpen': lambda a, b, args: ops.sharpen(a),
+    'convolve': lambda a, b, args: ops.convolve(a, args.kernel),
+    'median': lambda a, b, args: ops.median(a, args.radius),
+    'mix': lambda a, b, args: ops.mix(a, b, args.mix[0], args.mix[1]),
+    'keyMix': lambda a, b, args: ops.keyMix(a, b),
+    'over': lambda a, b, args: ops.over(a, b),
+    'composite': lambda a, b, args: composite.composite(args.operator, a, b),
+    'lumaKey': lambda a, b, args: ops.lumaKey(a, b, args.lum),
+    'chromaKey': lambda a, b, args: ops.chromaKey(a, b, args.hue[0], args.hue[1], args.sat,
+                                                  _worker.get('hsvTable')),
+    'colorDiff': lambda a, b, args: ops.colorDiff(a, b),
+}
+
+#point operations as lookup tables, consecutive ones are fused into one pass
+POINT_TABLES = {
+    'gamma': lambda args: lut.gamma(args.gamma),
+    'contrast': lambda args: lut.contrast(),
+}
+
+#pixels of context each spatial operation needs around a tile
+HALOS = {
+    'edge': lambda args: 1,
+    'sharpen': lambda args: 1,
+    'blur': lambda args: args.radius,
+    'gaussianBlur': lambda args: args.radius,
+    'median': lambda args: args.radius,
+    'convolve': lambda args: max(len(args.kernel), len(args.kernel[0])) // 2,
+}
+
+#operations that need the --bg image
+BACKGROUND_OPERATIONS = ('mix', 'keyMix', 'over', 'composite', 'lumaKey', 'chromaKey', 'colorDiff')
+
+#state shared by the frames of one worker process
+_worker = {}
+
+
+def valueRange(text):
+    '''Parses a "low:high" command line range
+
+        Args:
+            text: string of two numbers separated by a colon
+
+        Returns:
+            A (low, high) tuple of floats
+    '''
+    try:
+        low, high = text.split(':')
+        return float(low), float(high)
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected LOW:HIGH, got %r" % text)
+
+
+def kernel(text):
+    '''Parses a command line kernel
+
+        Args:
+            text: string of kernel rows separated by semicolons
+
+        Returns:
+            A 2D list of float kernel weights
+    '''
+    try:
+        return ops.parseKernel(text)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def runChain(frame, background, args):
+    '''Applies the operation chain to a frame through a lazy graph, so runs of
+    point operations, and a monochrome followed by point operations, are
+    fused into one table lookup.
+
+        Args:
+            frame: foreground pixel array
+            background: background pixel array or None
+            args: parsed command line arguments
+
+        Returns:
+            The resulting pixel array
+    '''
+    node = graph.source(frame)
+
+    for name in args.op:
+        if name in POINT_TABLES:
+            node = graph.point(node, POINT_TABLES[name](args))
+        elif name == 'monochrome':
+            node = graph.monochrome(node)
+        else:
+            node = graph.apply(functools.partial(OPERATIONS[name], b=background, args=args), node)
+
+    return node.evaluate()
+
+
+def initWorker(args):
+    '''Loads the background image, builds the hsv table and sizes the band
+    thread pool once per worker process
+
+        Args:
+            args: parsed command line arguments
+    '''
+    _worker['args'] = args
+    _worker['background'] = None
+    _worker['hsvTable'] = None
+
+    #the processes already share the cores, so banded nodes get their share
+    #of threads rather than a pool of cpu_count threads each
+    parallel.setWorkers(max(multiprocessing.cpu_count() // args.jobs, 1))
+
+    if args.hsv_table:
+        _worker['hsvTable'] = hsvTable.TABLES[args.hsv_table]()
+
+    if args.bg:
+        _worker['background'] = pixelEngine.loadImage(args.bg)
+
+
+def processFrame(fileName):
+    '''Runs the operation chain on one frame and writes the result
+
+        Args:
+            fileName: path of the input frame
+
+        Returns:
+            A (fileName, seconds, error) tuple, error is None on success
+    '''
+    args = _worker['args']
+    background = _worker['background']
+    start = time.time()
+
+    frame = pixelEngine.loadImage(fileName)
+    if frame is None:
+        return fileName, time.time() - start, "cannot load %s" % fileName
+
+    if background is not None and frame.shape != background.shape:
+        return fileName, time.time() - start, "size differs from %s" % args.bg
+
+    frame = runChain(frame, background, args)
+
+    outName = os.path.join(args.output, os.path.splitext(os.path.basename(fileName))[0] + '.' + args.format)
+    if not pixelEngine.saveImage(frame, outName):
+        return fileName, time.time() - start, "cannot write %s" % outName
+
+    return fileName, time.time() - start, None
+
+
+def run(args):
+    '''Processes every input frame on a process pool and reports the timings
+
+        Args:
+            args: parsed command line arguments
+
+        Returns:
+            The exit status, 1 if any frame failed
+    '''
+    fileNames = []
+    for pattern in args.inputs:
+        fileNames.extend(sorted(glob.glob(pattern)) or [pattern])
+
+    if args.bg is None and set(args.op) & set(BACKGROUND_OPERATIONS):
+        print("error: --bg is required for %s" % ', '.join(args.op), file=sys.stderr)
+        return 2
+
+    if args.bg is not None and pixelEngine.loadImage(args.bg) is None:
+        print("error: cannot load %s" % args.bg, file=sys.stderr)
+        return 2
+
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+
+    failed = 0
+    start = time.time()
+    pool = multiprocessing.Pool(args.jobs, initWorker, (args,))
+
+    try:
+        for fileName, seconds, error in pool.imap_unordered(processFrame, fileNames):
+            if error is None:
+                print("%s %.3fs" % (fileName, seconds))
+            else:
+                failed += 1
+                print("%s failed: %s" % (fileName, error), file=sys.stderr)
+            sys.stdout.flush()
+    finally:
+        pool.close()
+        pool.join()
+
+    total = time.time() - start
+    done = len(fileNames) - failed
+    print("%d frames in %.2fs (%.2f fps, %d workers)" % (done, total, done / total if total else 0.0, args.jobs))
+
+    return 1 if failed else 0
+
+
+def loadSource(fileName):
+    '''Opens a tiling source, memory-mapped if it is a .npy pixel file
+
+        Args:
+            fileName: path of a .npy pixel file or of any image QImage reads
+
+        Returns:
+            The pixel array or None if it cannot be loaded
+    '''
+    if fileName.endswith('.npy'):
+        try:
+            return tiles.openSource(fileName)
+        except (IOError, ValueError):
+            return None
+
+    #other formats have to be decoded whole
+    return pixelEngine.loadImage(fileName)
+
+
+def tile(args):
+    '''Processes one large image tile by tile into a memory-mapped .npy file
+
+        Args:
+            args: parsed command line arguments
+
+        Returns:
+            The exit status
+    '''
+    if args.bg is None and set(args.op) & set(BACKGROUND_OPERATIONS):
+        print("error: --bg is required for %s" % ', '.join(args.op), file=sys.stderr)
+        return 2
+
+    sources = []
+    for fileName in [args.input] + ([args.bg] if args.bg else []):
+        source = loadSource(fileName)
+        if source is None:
+            print("error: cannot load %s" % fileName, file=sys.stderr)
+            return 2
+        if sources and source.shape != sources[0].shape:
+            print("error: size of %s differs from %s" % (fileName, args.input), file=sys.stderr)
+            return 2
+        sources.append(source)
+
+    _worker['hsvTable'] = hsvTable.TABLES[args.hsv_table]() if args.hsv_table else None
+
+    height, width = sources[0].shape[:2]
+    destination = tiles.createDestination(args.output, height, width)
+    halo = sum(HALOS[name](args) for name in args.op if name in HALOS)
+
+    start = time.time()
+    tiles.process(lambda frame, background=None: runChain(frame, background, args),
+                  sources, destination, halo, args.tile)
+
+    print("%s %dx%d in %.2fs (%d pixel tiles, %d pixel halo)" % (args.output, width, height,
+                                                                time.time() - start, args.tile, halo))
+    return 0
+
+
+def addOperationArguments(parser):
+    '''Adds the operation chain and its parameters to a command parser
+
+        Args:
+            parser: argparse parser of a command
+    '''
+    parser.add_argument('--op', action='append', required=True, choices=sorted(OPERATIONS),
+                        help='operation to apply, repeat to chain operations in order')
+    parser.add_argument('--bg', help='background image for the two-image operations')
+    parser.add_argument('--gamma', type=float, default=1.0, help='gamma value')
+    parser.add_argument('--radius', type=int, default=1, help='blur and median radius')
+    parser.add_argument('--kernel', type=kernel, default=[[1.0]], metavar='ROWS',
+                        help='kernel for convolve, rows separated by semicolons')
+    parser.add_argument('--mix', type=valueRange, default=(0.5, 0.5), metavar='A:B',
+                        help='foreground and background mix values')
+    parser.add_argument('--operator', choices=sorted(composite.OPERATORS), default='over',
+                        help='Porter-Duff operator for composite')
+    parser.add_argument('--lum', type=float, default=0.5, help='luma key value (0-1)')
+    parser.add_argument('--hue', type=valueRange, default=(0.0, 360.0), metavar='LOW:HIGH',
+                        help='chroma key hue range (0-360)')
+    parser.add_argument('--sat', type=float, default=0.0, help='chroma key lowest saturation (0-1)')
+    parser.add_argument('--hsv-table', choices=sorted(hsvTable.TABLES),
+                        help='key through a precomputed hsv table: pairs (0.8 MB, exact) '
+                             'or full (64 MB per worker, quantized)')
+
+
+def main(argv=None):
+    '''Parses the command line and runs the requested command
+
+        Args:
+            argv: list of command line arguments, sys.argv if None
+
+        Returns:
+            The exit status
+    '''
+    parser = argparse.ArgumentParser(prog='imagemanip', description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command')
+
+    runParser = commands.add_parser('run', help='apply operations to a batch of frames')
+    runParser.add_argument('inputs', nargs='+', help='input frames or glob patterns')
+    runParser.add_argument('-o', '--output', required=True, help='output directory')
+    addOperationArguments(runParser)
+    runParser.add_argument('-j', '--jobs', type=int, default=multiprocessing.cpu_count(),
+                           help='worker processes (default: number of cores)')
+    runParser.add_argument('--format', default='png', help='output file extension')
+
+    tileParser = commands.add_parser('tile', help='apply operations to one large image tile by tile')
+    tileParser.add_argument('input', help='.npy pixel file (memory-mapped) or image')
+    tileParser.add_argument('-o', '--output', required=True, help='output .npy pixel file')
+    addOperationArguments(tileParser)
+    tileParser.add_argument('--tile', type=int, default=tiles.TILE_SIZE,
+                            help='tile edge length in pixels (default: %d)' % tiles.TILE_SIZE)
+
+    args = parser.parse_args(argv)
+    if args.command == 'tile':
+        return tile(args)
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+'''Stack of image layers composited with the Porter-Duff operators.
+
+Each layer has its own size, an offset on the canvas, an operator from
+composite.OPERATORS and an opacity. Layers are premultiplied once when they
+are added, and the canvas is built tile by tile: every tile runs through all
+the layers that touch it in one pass and is made straight again only at the
+end, so no full-frame intermediate is ever built.
+
+The stack remembers the rectangles its changes touched. render() only
+recomposites the tiles under them, so moving or changing one layer costs
+the area it covers, not the whole frame. Tiles are independent and spread
+over the shared thread pool (see parallel).
+'''
+
+import numpy as np
+
+import composite
+import parallel
+
+#edge length of the square tiles the canvas is recomposited in
+TILE_SIZE = 128
+
+#operators that clear the canvas outside the layer, so a change reaches everywhere
+CLEARING = ('in', 'out')
+
+
+class Layer(object):
+    '''One layer of a Stack
+
+    Attributes:
+        array: premultiplied (height, width, 4) uint8 pixel array of the layer
+        operator: operator name from composite.OPERATORS, compositing the
+            layer onto the layers below it
+        opacity: float opacity (0-1)
+        offset: (top, left) position of the layer on the canvas
+    '''
+
+    def __init__(self, array, operator='over', opacity=1.0, offset=(0, 0)):
+        if operator not in composite.OPERATORS:
+            raise ValueError("unknown operator %r" % operator)
+
+        self.array = composite.premultiply(array)
+        self.operator = operator
+        self.opacity = opacity
+        self.offset = offset
+
+    def box(self):
+        '''Gets the canvas rectangle covered by the layer
+
+            Returns:
+                A (top, left, bottom, right) tuple, which can reach outside
+                the canvas
+        '''
+        top, left = self.offset
+        return top, left, top + self.array.shape[0], left + self.array.shape[1]
+
+
+class Stack(object):
+    '''Layers composited bottom first onto a transparent canvas
+
+    Attributes:
+        layers: list of Layer, bottom first
+        canvas: straight (height, width, 4) uint8 pixel array of the
+            composite, up to date after render()
+        tileSize: int edge length of the tiles
+    '''
+
+    def __init__(self, height, width, tileSize=TILE_SIZE):
+        self.layers = []
+        self.canvas = np.zeros((height, width, 4), np.uint8)
+        self.tileSize = tileSize
+        self._dirty = []
+
+    def _touch(self, layer):
+        '''Marks the canvas a layer affects as needing recompositing
+        '''
+        if layer.operator in CLEARING:
+            self._dirty.append((0, 0) + self.canvas.shape[:2])
+        else:
+            self._dirty.append(layer.box())
+
+    def add(self, array, operator='over', opacity=1.0, offset=(0, 0)):
+        '''Puts a new layer on top of the stack
+
+            Args:
+                array: straight pixel array of the layer
+                operator: operator name from composite.OPERATORS
+                opacity: float opacity (0-1)
+                offset: (top, left) position of the layer on the canvas
+
+            Returns:
+                The new Layer
+        '''
+        layer = Layer(array, operator, opacity, offset)
+        self.layers.append(layer)
+        self._touch(layer)
+        return layer
+
+    def remove(self, layer):
+        '''Takes a layer out of the stack
+
+            Args:
+                layer: Layer of the stack
+        '''
+        self.layers.remove(layer)
+        self._touch(layer)
+
+    def move(self, layer, offset):
+        '''Moves a layer, dirtying where it was and where it goes
+
+            Args:
+                layer: Layer of the stack
+                offset: new (top, left) position of the layer
+        '''
+        self._touch(layer)
+        layer.offset = offset
+        self._touch(layer)
+
+    def setOpacity(self, layer, opacity):
+        '''Changes the opacity of a layer
+
+            Args:
+                layer: Layer of the stack
+                opacity: float opacity (0-1)
+        '''
+        layer.opacity = opacity
+        self._touch(layer)
+
+    def setOperator(self, layer, operator):
+        '''Changes the operator of a layer
+
+            Args:
+                layer: Layer of the stack
+                operator: operator name from composite.OPERATORS
+        '''
+        if operator not in composite.OPERATORS:
+            raise ValueError("unknown operator %r" % operator)
+
+        self._touch(layer)
+        layer.operator = operator
+        self._touch(layer)
+
+    def dirtyTiles(self):
+        '''Gets the tiles under the rectangles changed since the last render
+
+            Returns:
+                A sorted list of (top, left) tile positions
+        '''
+        height, width = self.canvas.shape[:2]
+        size = self.tileSize
+        tiles = set()
+
+        for top, left, bottom, right in self._dirty:
+            top, left = max(top, 0), max(left, 0)
+            bottom, right = min(bottom, height), min(right, width)
+            for tileTop in range(top // size * size, bottom, size):
+                for tileLeft in range(left // size * size, right, size):
+                    tiles.add((tileTop, tileLeft))
+
+        return sorted(tiles)
+
+    def render(self, progress=None):
+        '''Recomposites the dirty tiles of the canvas
+
+            Args:
+                progress: optional function called with the number of tiles
+                    done and the total after each tile; it can raise to
+                    abort, leaving the tiles of the render dirty
+
+            Returns:
+                A list of the (top, left, bottom, right) boxes of the canvas
+                that were recomposited
+        '''
+        tiles = self.dirtyTiles()
+        self._dirty = []
+        aborted = []
+
+        def renderTile(position):
+            if not aborted:
+                return self._renderTile(position)
+
+        boxes = []
+        try:
+            for tileBox in parallel.pool().imap_unordered(renderTile, tiles):
+                boxes.append(tileBox)
+                if progress is not None:
+                    progress(len(boxes), len(tiles))
+        except Exception:
+            #the tiles still queued are skipped and all are rendered next time
+            aborted.append(True)
+            self._dirty.extend((top, left, top + self.tileSize, left + self.tileSize)
+                               for top, left in tiles)
+            raise
+
+        return boxes
+
+    def _renderTile(self, position):
+        '''Composites the layers over one tile of the canvas
+
+            Args:
+                position: (top, left) of the tile
+
+            Returns:
+                The (top, left, bottom, right) box of the tile
+        '''
+        top, left = position
+        bottom = min(top + self.tileSize, self.canvas.shape[0])
+        right = min(left + self.tileSize, self.canvas.shape[1])
+        tile = np.zeros((bottom - top, right - left, 4), np.uint8)
+
+        for layer in self.layers:
+            layerTop, layerLeft, layerBottom, layerRight = layer.box()
+            inTop, inLeft = max(top, layerTop), max(left, layerLeft)
+            inBottom, inRight = min(bottom, layerBottom), min(right, layerRight)
+
+            if inBottom <= inTop or inRight <= inLeft:
+                if layer.operator in CLEARING:
+                    tile[...] = 0
+                continue
+
+            aTile = layer.array[inTop - layerTop:inBottom - layerTop,
+                                inLeft - layerLeft:inRight - layerLeft]
+            if layer.opacity < 1:
+                opacity = np.uint8(round(max(layer.opacity, 0) * 255))
+                aTile = composite.multiply(aTile, opacity).astype(np.uint8)
+
+            inside = (slice(inTop - top, inBottom - top), slice(inLeft - left, inRight - left))
+            result = composite.OPERATORS[layer.operator](aTile, tile[inside])
+            if layer.operator in CLEARING:
+                tile[...] = 0
+            tile[inside] = result
+
+        self.canvas[top:bottom, left:right] = composite.unpremultiply(tile)
+        return top, left, bottom, right
@@ -0,0 +1,87 @@
+'''Lookup tables for per-channel point operations.
+
+A point operation maps each 0-255 channel value on its own, so it can be
+evaluated once for all 256 values and applied to a buffer with a single table
+lookup per channel (see ops.applyTable). Tables are built once per parameter
+set and cached, and consecutive tables compose into one so the image is only
+read once.
+'''
+
+import numpy as np
+
+#built tables keyed by (operation name, parameters)
+_tables = {}
+
+
+def build(name, function, *params):
+    '''Evaluates a point function on every 8-bit value and caches the result
+
+        Args:
+            name: string naming the operation in the cache
+            function: function mapping a float array of 0-255 values and the
+                params to new values
+            params: parameters of the operation
+
+        Returns:
+            A read-only 256-entry uint8 table, clamped to 0-255
+    '''
+    key = (name,) + params
+    table = _tables.get(key)
+
+    if table is None:
+        with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+            values = function(np.arange(256, dtype=np.float64), *params)
+        table = np.clip(np.nan_to_num(values), 0, 255).astype(np.uint8)
+        table.setflags(write=False)
+        _tables[key] = table
+
+    return table
+
+
+def gamma(gVal):
+    '''Builds the gamma table O = I ** gVal
+
+        Args:
+            gVal: float gamma value
+
+        Returns:
+            The 256-entry uint8 table
+    '''
+    return build('gamma', lambda values, g: values ** g, float(gVal))
+
+
+def contrast():
+    '''Builds the contrast table O = (I - 1/3) * 3
+
+        Returns:
+            The 256-entry uint8 table
+    '''
+    return build('contrast', lambda values: (values - 85) * 3)
+
+
+def threshold(level):
+    '''Builds a key table that clears the values at or below a normalized
+    level and keeps the rest
+
+        Args:
+            level: float level from 0 to 1
+
+        Returns:
+            The 256-entry uint8 table of 0 and 255 values
+    '''
+    return build('threshold', lambda values, l: np.where(values / 255 <= l, 0, 255), float(level))
+
+
+def compose(*tables):
+    '''Composes tables into one that applies them in order
+
+        Args:
+            tables: 256-entry uint8 tables, the first is applied first
+
+        Returns:
+            The composed 256-entry uint8 table
+    '''
+    composed = np.arange(256, dtype=np.uint8)
+    for table in tables:
+        composed = table[composed]
+    return composed
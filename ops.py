@@ -0,0 +1,522 @@
+'''Headless image operations on NumPy pixel buffers.
+
+Every function takes (height, width, 4) uint8 arrays holding 32-bit ARGB
+pixels plus explicit parameters and returns a new array, so nothing here needs
+Qt, a display or an event loop. The channel order inside a pixel is given by
+the BLUE, GREEN, RED and ALPHA indices, which match the memory layout of a
+QImage in Format_ARGB32 (see pixelEngine).
+'''
+
+import sys
+
+import numpy as np
+
+import composite
+import filters
+import lut
+
+#Byte position of each channel inside a Format_ARGB32 pixel (0xAARRGGBB)
+if sys.byteorder == 'little':
+    BLUE, GREEN, RED, ALPHA = 0, 1, 2, 3
+else:
+    ALPHA, RED, GREEN, BLUE = 0, 1, 2, 3
+
+#rows the keyers work on at a time, few enough for their float planes to stay in cache
+KEY_ROWS = 32
+
+
+def clampInt(values):
+    ''' Clamps values from 0 to 255
+
+        Args:
+            values: float array representing rgb values
+
+        Returns:
+            The values clamped between 0 and 255 and truncated to uint8
+    '''
+    return np.clip(values, 0, 255).astype(np.uint8)
+
+
+def rgb(array):
+    '''Splits a pixel array into float planes
+
+        Args:
+            array: (height, width, 4) uint8 pixel array
+
+        Returns:
+            A list of the red, green and blue float32 planes
+    '''
+    return [array[:, :, channel].astype(np.float32) for channel in (RED, GREEN, BLUE)]
+
+
+def pack(red, green, blue, alpha=None, out=None):
+    '''Clamps and packs float planes into a pixel array
+
+        Args:
+            red: float plane of red values
+            green: float plane of green values
+            blue: float plane of blue values
+            alpha: float plane of alpha values, opaque if None
+            out: optional (height, width, 4) uint8 array to pack into
+
+        Returns:
+            The (height, width, 4) uint8 pixel array, a new one if out is None
+    '''
+    if out is None:
+        out = np.empty(red.shape + (4,), np.uint8)
+    out[:, :, RED] = clampInt(red)
+    out[:, :, GREEN] = clampInt(green)
+    out[:, :, BLUE] = clampInt(blue)
+
+    if alpha is None:
+        out[:, :, ALPHA] = 255
+    else:
+        out[:, :, ALPHA] = clampInt(alpha)
+
+    return out
+
+
+def applyTable(array, table):
+    '''Maps the color channels of a pixel array through a point operation
+    lookup table (see lut)
+
+        Args:
+            array: pixel array
+            table: 256-entry uint8 table
+
+        Returns:
+            The new opaque pixel array
+    '''
+    out = np.take(table, array)
+    out[:, :, ALPHA] = 255
+    return out
+
+
+def gamma(array, gVal):
+    '''Raises each channel to the power of the gamma value supplied.
+
+        Args:
+            array: pixel array
+            gVal: float gamma value
+
+        Returns:
+            The gamma corrected pixel array
+    '''
+    return applyTable(array, lut.gamma(gVal))
+
+
+def contrast(array):
+    '''Changes the contrast using the function O = (I - 1/3) * 3
+
+        Args:
+            array: pixel array
+
+        Returns:
+            The contrasted pixel array
+    '''
+    return applyTable(array, lut.contrast())
+
+
+def monochromePlane(array):
+    '''Averages the three channels using O = (R * 0.309) + (G * 0.609) + (B * 0.082)
+
+        Args:
+            array: pixel array
+
+        Returns:
+            The uint8 plane of monochrome values
+    '''
+    red, green, blue = rgb(array)
+    return clampInt((red * 0.309) + (green * 0.609) + (blue * 0.082))
+
+
+def monochrome(array, table=None):
+    '''Produces a monochromatic image by averaging the three channels together.
+    A point operation table can be fused in, so that for example monochrome
+    followed by contrast only reads the image once.
+
+        Args:
+            array: pixel array
+            table: optional 256-entry uint8 table applied to the monochrome values
+
+        Returns:
+            The monochrome pixel array
+    '''
+    value = monochromePlane(array)
+    if table is not None:
+        value = table[value]
+
+    out = np.empty_like(array)
+    out[:, :, RED] = value
+    out[:, :, GREEN] = value
+    out[:, :, BLUE] = value
+    out[:, :, ALPHA] = 255
+    return out
+
+
+#kernel presets for convolve, applied as written around each pixel
+KERNELS = {
+    'edge': [[-1.0, -1.0, -1.0], [-1.0, 8.0, -1.0], [-1.0, -1.0, -1.0]],
+    'blur': [[.111, .1111, .1111], [.1111, .1111, .1111], [.1111, .1111, .1111]],
+    'sharpen': [[-1.0, -1.0, -1.0], [-1.0, 9.0, -1.0], [-1.0, -1.0, -1.0]],
+}
+
+
+def parseKernel(text):
+    '''Parses a kernel written as rows separated by semicolons, for example
+    "0,-1,0; -1,5,-1; 0,-1,0"
+
+        Args:
+            text: string of comma separated weights
+
+        Returns:
+            A 2D list of float kernel weights
+
+        Raises:
+            ValueError: if the text is not a rectangular list of numbers
+    '''
+    kernel = [[float(weight) for weight in row.split(',')] for row in text.split(';') if row.strip()]
+
+    if not kernel or any(len(row) != len(kernel[0]) for row in kernel):
+        raise ValueError("kernel rows must all have the same number of weights")
+
+    return kernel
+
+
+def convolve(array, kernel):
+    '''Convolves the color channels with any NxM kernel. Pixels outside of
+    the image do not contribute to the sum.
+
+        Args:
+            array: pixel array
+            kernel: 2D list of kernel weights
+
+        Returns:
+            The filtered pixel array
+    '''
+    return pack(*[filters.convolve(plane, kernel) for plane in rgb(array)])
+
+
+def edge(array):
+    '''Detects edges by convolving with the edge preset
+
+        Args:
+            array: pixel array
+
+        Returns:
+            The filtered pixel array
+    '''
+    return convolve(array, KERNELS['edge'])
+
+
+def blur(array, radius=1):
+    '''Blurs by averaging the neighbourhood of each pixel. A radius of 1
+    convolves with the blur preset, larger radii use boxBlur.
+
+        Args:
+            array: pixel array
+            radius: int blur radius
+
+        Returns:
+            The filtered pixel array
+    '''
+    if radius == 1:
+        return convolve(array, KERNELS['blur'])
+
+    return boxBlur(array, radius)
+
+
+def boxBlur(array, radius):
+    '''Averages the (2*radius+1) square around each pixel. The cost per pixel
+    does not depend on the radius.
+
+        Args:
+            array: pixel array
+            radius: int blur radius
+
+        Returns:
+            The blurred pixel array
+    '''
+    return pack(*[filters.boxBlur(plane, radius) for plane in rgb(array)])
+
+
+def gaussianBlur(array, radius):
+    '''Blurs with a separable Gaussian kernel whose sigma is half the radius
+
+        Args:
+            array: pixel array
+            radius: int blur radius
+
+        Returns:
+            The blurred pixel array
+    '''
+    return pack(*[filters.gaussianBlur(plane, radius) for plane in rgb(array)])
+
+
+def sharpen(array):
+    '''Sharpens by convolving with the sharpen preset
+
+        Args:
+            array: pixel array
+
+        Returns:
+            The filtered pixel array
+    '''
+    return convolve(array, KERNELS['sharpen'])
+
+
+def median(array, radius=1):
+    '''Replaces each channel with the median of the (2*radius+1) square around
+    it. Along the border only the neighbours inside the image are ranked.
+
+        Args:
+            array: pixel array
+            radius: int filter radius from 1 to 15
+
+        Returns:
+            The filtered pixel array
+    '''
+    out = np.empty_like(array)
+    out[:, :, ALPHA] = 255
+
+    done = {}
+    for channel in (RED, GREEN, BLUE):
+        plane = array[:, :, channel]
+
+        #gray images have identical channels, filter those only once
+        for other, filtered in done.items():
+            if np.array_equal(array[:, :, other], plane):
+                out[:, :, channel] = filtered
+                break
+        else:
+            out[:, :, channel] = done[channel] = filters.median(plane, radius)
+
+    return out
+
+
+def mix(aArray, bArray, aMix, bMix):
+    '''Calculates the normalized addition of two images. Uses the formula:
+    O = (A * aMix) + (B * bMix)
+
+        Args:
+            aArray: foreground pixel array
+            bArray: background pixel array
+            aMix: float foreground mix value
+            bMix: float background mix value
+
+        Returns:
+            The mixed pixel array
+    '''
+    planes = [(a * aMix) + (b * bMix) for a, b in zip(rgb(aArray), rgb(bArray))]
+    return pack(*planes)
+
+
+def keyMix(aArray, bArray):
+    '''Mixes two images using the alpha of the straight foreground as the matte.
+    Uses the formula: O = (A x M) + [(1-M) * B], which is the premultiplied
+    foreground over the background (see composite).
+
+        Args:
+            aArray: straight foreground pixel array
+            bArray: background pixel array
+
+        Returns:
+            The mixed, opaque pixel array
+    '''
+    def mixStrip(a, b):
+        matte = composite.alpha(a)
+        out = composite.clampPixels(composite.multiply(a, matte) + composite.multiply(b, 255 - matte))
+        out[:, :, ALPHA] = 255
+        return out
+
+    return composite.strips(mixStrip, aArray, bArray)
+
+
+def over(aArray, bArray):
+    '''Layers a premultiplied foreground over a background. Uses the formula:
+    O = A + [(1- alphaA) * B]
+
+        Args:
+            aArray: premultiplied foreground pixel array
+            bArray: background pixel array
+
+        Returns:
+            The composited pixel array
+    '''
+    return composite.apply('over', aArray, bArray)
+
+
+def hsv(red, green, blue):
+    '''Converts rgb planes to their corresponding hsv planes
+
+        Args:
+            red: float plane of red values from 0 to 255
+            green: float plane of green values from 0 to 255
+            blue: float plane of blue values from 0 to 255
+
+        Returns:
+            A list with the hue (0-360), saturation (0-1) and value (0-1) planes
+    '''
+    maxc = np.maximum(np.maximum(red, green), blue)
+    minc = np.minimum(np.minimum(red, green), blue)
+    delta = maxc - minc
+
+    #the ratios are taken on the 0-255 scale, where differences of 8-bit values
+    #are exact, so each is rounded once and hsvTable.PairTable can match them
+    #saturation and hue are 0 where value or delta are 0
+    s = np.where(maxc > 0, delta / np.where(maxc > 0, maxc, 1), 0)
+
+    safeDelta = np.where(delta > 0, delta, 1)
+    h = np.where(red == maxc, (green - blue) / safeDelta,
+                 np.where(green == maxc, 2.0 + (blue - red) / safeDelta,
+                          4.0 + (red - green) / safeDelta))
+    h = h * 60.0
+    h = np.where(h < 0, h + 360.0, h)
+    h = np.where(delta > 0, h, 0)
+
+    return [h, s, maxc / np.float32(255)]
+
+
+def hueSaturation(array, table=None):
+    '''Gets the hue and saturation planes of a pixel array
+
+        Args:
+            array: pixel array
+            table: optional precomputed hsvTable to gather the values from
+
+        Returns:
+            A list with the hue (0-360) and saturation (0-1) planes
+    '''
+    if table is not None:
+        return table.hueSaturation(array)
+
+    return hsv(*rgb(array))[:2]
+
+
+def matteOver(aArray, bArray, alpha, out=None):
+    '''Places the foreground over the background through a matte. The matte
+    is kept as the alpha of the result.
+
+        Args:
+            aArray: foreground pixel array
+            bArray: background pixel array
+            alpha: float plane of matte values from 0 to 255
+            out: optional pixel array to write the result into
+
+        Returns:
+            The composited pixel array
+    '''
+    matte = alpha / 255
+    planes = [(a * matte) + ((1 - matte) * b) for a, b in zip(rgb(aArray), rgb(bArray))]
+    return pack(*planes, alpha=alpha, out=out)
+
+
+def keyOver(key, aArray, bArray, matte=None):
+    '''Runs a keyer over strips of KEY_ROWS rows. The matte, the spill
+    suppressed foreground and the composite of a strip are made in one go,
+    so no full size foreground or float plane is ever built.
+
+        Args:
+            key: function taking a foreground strip, a background strip and
+                the output strip, compositing into the output and returning
+                the float matte plane of the strip (0-255)
+            aArray: foreground pixel array
+            bArray: background pixel array
+            matte: optional (height, width) uint8 array the matte is written
+                to, for reuse
+
+        Returns:
+            The composited pixel array
+    '''
+    out = np.empty(bArray.shape, np.uint8)
+    for top in range(0, bArray.shape[0], KEY_ROWS):
+        rows = slice(top, top + KEY_ROWS)
+        alpha = key(aArray[rows], bArray[rows], out[rows])
+        if matte is not None:
+            matte[rows] = clampInt(alpha)
+
+    return out
+
+
+def lumaKey(aArray, bArray, lumValue, matte=None):
+    '''Extracts a matte from the foreground by clearing the pixels whose hsv
+    value (the largest channel) is at or below lumValue and places the
+    foreground over the background through it.
+
+        Args:
+            aArray: foreground pixel array
+            bArray: background pixel array
+            lumValue: float value (0-1) at or below which pixels are cleared
+            matte: optional (height, width) uint8 array the matte is written to
+
+        Returns:
+            The composited pixel array
+    '''
+    table = lut.threshold(lumValue)
+
+    def key(aStrip, bStrip, out):
+        value = np.maximum(np.maximum(aStrip[:, :, RED], aStrip[:, :, GREEN]), aStrip[:, :, BLUE])
+        alpha = table[value].astype(np.float32)
+        matteOver(aStrip, bStrip, alpha, out)
+        return alpha
+
+    return keyOver(key, aArray, bArray, matte)
+
+
+def chromaKey(aArray, bArray, hueLow, hueHigh, satLow, table=None, matte=None):
+    '''Extracts a matte by clearing a range of hue and saturation values and
+    places the foreground over the background through it.
+
+        Args:
+            aArray: foreground pixel array
+            bArray: background pixel array
+            hueLow: lowest hue to clear (0-360)
+            hueHigh: highest hue to clear (0-360)
+            satLow: lowest saturation to clear (0-1)
+            table: optional precomputed hsvTable for the conversion
+            matte: optional (height, width) uint8 array the matte is written to
+
+        Returns:
+            The composited pixel array
+    '''
+    def key(aStrip, bStrip, out):
+        h, s = hueSaturation(aStrip, table)
+
+        cleared = (h <= hueHigh) & (h >= hueLow) & (s >= satLow)
+        alpha = np.where(cleared, 0, 255).astype(np.float32)
+        matteOver(aStrip, bStrip, alpha, out)
+        return alpha
+
+    return keyOver(key, aArray, bArray, matte)
+
+
+def colorDiff(aArray, bArray, matte=None):
+    '''Extracts a matte from a blue-screen foreground, suppresses the blue
+    spill and composites it over the background.
+
+        Args:
+            aArray: blue-screen foreground pixel array
+            bArray: background pixel array
+            matte: optional (height, width) uint8 array the foreground matte
+                (255 where the foreground is kept) is written to
+
+        Returns:
+            The composited pixel array
+    '''
+    def key(aStrip, bStrip, out):
+        red, green, blue = rgb(aStrip)
+
+        #spill suppression
+        newBlue = np.minimum(blue, green)
+
+        #matte creation
+        mAlpha = (blue - np.maximum(green, red)) / 255
+
+        #image composite
+        bRed, bGreen, bBlue = rgb(bStrip)
+        bAlpha = bStrip[:, :, ALPHA].astype(np.float32)
+        pack((mAlpha * bRed) + red, (mAlpha * bGreen) + green,
+             (mAlpha * bBlue) + newBlue, alpha=(mAlpha * bAlpha) + 255, out=out)
+        return 255 - (mAlpha * 255)
+
+    return keyOver(key, aArray, bArray, matte)
@@ -0,0 +1,126 @@
+'''Data-parallel execution of operations over horizontal bands.
+
+The image is split into bands of rows, each cut out with halo rows above and
+below so the spatial filters see the same neighbourhood as on the whole
+image, and the bands run on a thread pool shared by all operations. The
+NumPy calls the operations are made of release the GIL on large arrays, so
+the bands run on separate cores. Bands are rows of C-ordered arrays, so
+cutting them out does not copy the pixels, and each writes its own rows of
+the destination.
+
+The pool has one thread per core by default; setWorkers() changes it.
+'''
+
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+#bands per worker, so workers that finish early pick up more
+BANDS_PER_WORKER = 4
+
+#smallest band height in rows, below which the halo rows dominate
+MIN_BAND_ROWS = 16
+
+_workers = multiprocessing.cpu_count()
+_pool = None
+
+
+def workers():
+    '''Gets the number of worker threads
+
+        Returns:
+            The int worker count
+    '''
+    return _workers
+
+
+def setWorkers(count):
+    '''Sets the number of worker threads, replacing the pool
+
+        Args:
+            count: int worker count, at least 1
+    '''
+    global _workers, _pool
+    _workers = max(int(count), 1)
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+def pool():
+    '''Gets the shared thread pool, creating it on first use
+
+        Returns:
+            The ThreadPool
+    '''
+    global _pool
+    if _pool is None:
+        _pool = ThreadPool(_workers)
+    return _pool
+
+
+def bandBoxes(height, count):
+    '''Splits the rows of an image into bands
+
+        Args:
+            height: int image height
+            count: int number of bands wanted
+
+        Returns:
+            A list of (top, bottom) row ranges
+    '''
+    count = max(min(count, height // MIN_BAND_ROWS), 1)
+    edges = [height * index // count for index in range(count + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def process(function, sources, destination, halo=0, progress=None):
+    '''Runs a function over an image band by band on the thread pool
+
+        Args:
+            function: function taking one band per source and returning the
+                processed band with the same shape
+            sources: list of same-size pixel arrays
+            destination: pixel array the results are written to
+            halo: int rows of context the function needs above and below
+            progress: optional function called with the number of bands done
+                and the total after each band; it can raise to abort
+    '''
+    height = destination.shape[0]
+    boxes = bandBoxes(height, _workers * BANDS_PER_WORKER)
+
+    def runBand(box):
+        top, bottom = box
+        haloTop = max(top - halo, 0)
+        haloBottom = min(bottom + halo, height)
+
+        result = function(*[np.ascontiguousarray(source[haloTop:haloBottom]) for source in sources])
+        destination[top:bottom] = result[top - haloTop:bottom - haloTop]
+
+    if _workers == 1 or len(boxes) == 1:
+        results = (runBand(box) for box in boxes)
+    else:
+        results = pool().imap_unordered(runBand, boxes)
+
+    for done, result in enumerate(results, 1):
+        if progress is not None:
+            progress(done, len(boxes))
+
+
+def run(function, arrays, halo=0, progress=None):
+    '''Runs a function over same-size images band by band
+
+        Args:
+            function: function taking one pixel array per input and returning
+                the result with the same shape
+            arrays: list of input pixel arrays
+            halo: int rows of context the function needs above and below
+            progress: optional progress function, see process()
+
+        Returns:
+            The result pixel array
+    '''
+    destination = np.empty_like(arrays[0])
+    process(function, arrays, destination, halo, progress)
+    return destination
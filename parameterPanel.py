@@ -0,0 +1,131 @@
+'''Non-modal panel of sliders for tuning operations live.
+
+The panel only holds the parameter values; the viewer listens to its changed
+signal and re-renders the visible part of the image, and commits the edit on
+applied.
+'''
+
+from PyQt4 import QtCore, QtGui
+
+#slider parameters: name -> (label, minimum, maximum, default)
+PARAMETERS = {
+    'gamma': ("Gamma", 0.1, 4.0, 1.0),
+    'aMix': ("Foreground mix", 0.0, 1.0, 0.5),
+    'bMix': ("Background mix", 0.0, 1.0, 0.5),
+    'lum': ("Luma threshold", 0.0, 1.0, 0.5),
+    'hueLow': ("Low hue", 0.0, 360.0, 200.0),
+    'hueHigh': ("High hue", 0.0, 360.0, 260.0),
+    'satLow': ("Low saturation", 0.0, 1.0, 0.3),
+}
+
+#operations of the panel and the parameters they use, in menu order
+OPERATIONS = [
+    ("Gamma", ('gamma',)),
+    ("Mix", ('aMix', 'bMix')),
+    ("Luma Key", ('lum',)),
+    ("Chroma Key", ('hueLow', 'hueHigh', 'satLow')),
+]
+
+#positions of each slider
+SLIDER_STEPS = 1000
+
+
+class ParameterPanel(QtGui.QDockWidget):
+    '''Dock with an operation selector and a slider per parameter
+
+    Signals:
+        changed(): an operation or parameter value changed
+        applied(): the user asked to commit the operation
+        foregroundRequested(): the user asked to choose a foreground image
+    '''
+
+    changed = QtCore.pyqtSignal()
+    applied = QtCore.pyqtSignal()
+    foregroundRequested = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None):
+        super(ParameterPanel, self).__init__("Live Parameters", parent)
+
+        self.operationBox = QtGui.QComboBox()
+        for name, params in OPERATIONS:
+            self.operationBox.addItem(name)
+        self.operationBox.currentIndexChanged.connect(self.showParameters)
+
+        self.foregroundButton = QtGui.QPushButton("Foreground...")
+        self.foregroundButton.clicked.connect(lambda: self.foregroundRequested.emit())
+
+        self.applyButton = QtGui.QPushButton("Apply")
+        self.applyButton.clicked.connect(lambda: self.applied.emit())
+
+        layout = QtGui.QFormLayout()
+        layout.addRow("Operation", self.operationBox)
+        layout.addRow(self.foregroundButton)
+
+        self.sliders = {}
+        self.valueLabels = {}
+        self.rows = {}
+        for name in [name for operation, params in OPERATIONS for name in params]:
+            label, minimum, maximum, default = PARAMETERS[name]
+
+            slider = QtGui.QSlider(QtCore.Qt.Horizontal)
+            slider.setRange(0, SLIDER_STEPS)
+            slider.setValue(int(round((default - minimum) / (maximum - minimum) * SLIDER_STEPS)))
+            slider.valueChanged.connect(self.updateValues)
+
+            valueLabel = QtGui.QLabel()
+            row = QtGui.QHBoxLayout()
+            row.addWidget(slider)
+            row.addWidget(valueLabel)
+
+            self.sliders[name] = slider
+            self.valueLabels[name] = valueLabel
+            self.rows[name] = (QtGui.QLabel(label), row)
+            layout.addRow(*self.rows[name])
+
+        layout.addRow(self.applyButton)
+
+        widget = QtGui.QWidget()
+        widget.setLayout(layout)
+        self.setWidget(widget)
+
+        self.updateValues()
+        self.showParameters()
+
+    def operation(self):
+        '''Gets the selected operation
+
+            Returns:
+                The operation name from OPERATIONS
+        '''
+        return OPERATIONS[self.operationBox.currentIndex()][0]
+
+    def values(self):
+        '''Gets the slider values
+
+            Returns:
+                A dict of parameter name -> float value
+        '''
+        values = {}
+        for name, slider in self.sliders.items():
+            label, minimum, maximum, default = PARAMETERS[name]
+            values[name] = minimum + (maximum - minimum) * slider.value() / float(SLIDER_STEPS)
+        return values
+
+    def updateValues(self):
+        '''Shows the slider values next to the sliders and reports the change
+        '''
+        for name, value in self.values().items():
+            self.valueLabels[name].setText("%.2f" % value)
+        self.changed.emit()
+
+    def showParameters(self):
+        '''Shows only the sliders of the selected operation
+        '''
+        params = OPERATIONS[self.operationBox.currentIndex()][1]
+        for name, (label, row) in self.rows.items():
+            label.setVisible(name in params)
+            for index in range(row.count()):
+                row.itemAt(index).widget().setVisible(name in params)
+
+        self.foregroundButton.setVisible(self.operation() != "Gamma")
+        self.changed.emit()
@@ -0,0 +1,112 @@
+'''Bridge between QImages and the NumPy pixel buffers used by ops.
+
+Images are handled as (height, width, 4) uint8 NumPy arrays that view the
+32-bit ARGB pixels of a QImage directly through its bits() buffer, so no
+per-pixel pixel()/setPixel() calls are needed. Results are written back into
+a QImage in a single pass by arrayToImage, or wrapped without any copy by
+arrayView when the image is only read, as for display and saving.
+'''
+
+import numpy as np
+from PyQt4 import QtGui
+
+
+class _ImageBuffer(object):
+    '''Exposes the bits() buffer of a QImage to NumPy and keeps the image
+    alive for as long as an array views it.
+    '''
+
+    def __init__(self, image):
+        self.image = image
+        self.__array_interface__ = {
+            'version': 3,
+            'shape': (image.height(), image.width(), 4),
+            'typestr': '|u1',
+            'strides': (image.bytesPerLine(), 4, 1),
+            'data': (int(image.bits()), False),
+        }
+
+
+def imageToArray(image):
+    '''Views the pixels of a QImage as a NumPy array without copying them.
+
+        Note: The image is converted to Format_ARGB32 first if needed. The
+            returned array shares memory with the image, so writing to it
+            changes the image.
+
+        Args:
+            image: QImage to view
+
+        Returns:
+            A (height, width, 4) uint8 array of the image pixels
+    '''
+    if image.format() != QtGui.QImage.Format_ARGB32:
+        image = image.convertToFormat(QtGui.QImage.Format_ARGB32)
+
+    return np.asarray(_ImageBuffer(image))
+
+
+def arrayToImage(array):
+    '''Writes a pixel array into a new Format_ARGB32 QImage in one pass
+
+        Args:
+            array: (height, width, 4) uint8 pixel array
+
+        Returns:
+            A QImage holding a copy of the pixels
+    '''
+    height, width = array.shape[:2]
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32)
+    imageToArray(image)[...] = array
+    return image
+
+
+def arrayView(array):
+    '''Wraps a pixel array in a Format_ARGB32 QImage without copying it
+
+        Note: The image reads the memory of the array, which it keeps alive,
+            so the array must not change while the image is in use. Arrays
+            whose rows are not contiguous are copied first.
+
+        Args:
+            array: (height, width, 4) uint8 pixel array
+
+        Returns:
+            A QImage sharing the pixels of the array
+    '''
+    array = np.ascontiguousarray(array)
+    height, width = array.shape[:2]
+    image = QtGui.QImage(array.data, width, height, array.strides[0], QtGui.QImage.Format_ARGB32)
+    #the image does not own its pixels
+    image.ndarray = array
+    return image
+
+
+def loadImage(fileName):
+    '''Decodes an image file into a pixel array
+
+        Args:
+            fileName: path of the image file
+
+        Returns:
+            A (height, width, 4) uint8 pixel array or None if it cannot be loaded
+    '''
+    image = QtGui.QImage(fileName)
+    if image.isNull():
+        return None
+
+    return imageToArray(image)
+
+
+def saveImage(array, fileName):
+    '''Encodes a pixel array into an image file, the format is taken from the
+    file extension
+
+        Args:
+            array: (height, width, 4) uint8 pixel array
+            fileName: path of the image file
+
+        Returns:
+            True if the file was written
+    '''
+    return arrayView(array).save(fileName)
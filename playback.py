@@ -0,0 +1,211 @@
+'''Real-time playback of numbered image sequences.
+
+A sequence is given by a pattern such as shot.####.png, where the run of #
+stands for the zero padded frame number. Playback keeps a ring buffer of the
+next RING_FRAMES frames: each slot is decoded (see imageLoader) and run
+through the per-frame operation on a thread pool of its own, ahead of the
+playhead. The playhead follows the clock at the target fps and shows the
+newest frame that is ready, so a frame that is not ready by the time a later
+one is due is dropped rather than delaying the ones after it, and frames the
+clock has passed are not processed at all. The dropped frames and the achieved fps tell
+whether the processing keeps up.
+
+The frames are processed whole and in parallel with each other instead of
+band by band, so the pool of parallel, which an operation may use itself,
+stays free.
+'''
+
+import os
+import re
+import threading
+from multiprocessing.pool import ThreadPool
+
+import imageLoader
+import parallel
+
+#frames decoded and processed ahead of the playhead
+RING_FRAMES = 16
+
+#default target frames per second
+FPS = 24.0
+
+#frame number placeholder of a sequence pattern
+PLACEHOLDER = re.compile(r'#+')
+
+
+def sequencePattern(fileName):
+    '''Gets the pattern of the numbered sequence a frame belongs to
+
+        Args:
+            fileName: path of a frame such as shot.0042.png
+
+        Returns:
+            The pattern such as shot.####.png or None if fileName is not numbered
+    '''
+    match = imageLoader.FRAME_NUMBER.match(fileName)
+    if match is None:
+        return None
+
+    prefix, number, extension = match.groups()
+    return prefix + '#' * len(number) + extension
+
+
+def sequenceFrames(pattern):
+    '''Lists the frames of a sequence pattern that exist, in frame order
+
+        Args:
+            pattern: path with a run of # standing for the frame number
+
+        Returns:
+            A list of frame paths
+    '''
+    directory, name = os.path.split(pattern)
+    placeholder = PLACEHOLDER.search(name)
+    if placeholder is None or not os.path.isdir(directory or os.curdir):
+        return []
+
+    frameName = re.compile(re.escape(name[:placeholder.start()]) +
+                           r'\d{%d}' % (placeholder.end() - placeholder.start()) +
+                           re.escape(name[placeholder.end():]) + '$')
+    return sorted(os.path.join(directory, fileName)
+                  for fileName in os.listdir(directory or os.curdir) if frameName.match(fileName))
+
+
+class Playback(object):
+    '''Plays a list of frames at a target fps through a ring buffer
+
+    Attributes:
+        frames: list of frame paths, played in a loop
+        fps: float target frames per second
+        function: function taking a frame pixel array and returning the
+            array to show, None to show the frames as they are
+        position: int number of the last frame shown, counting on across
+            loops, -1 before the first
+        shown: frames shown
+        dropped: frames skipped because they were not ready in time
+    '''
+
+    def __init__(self, frames, fps, function=None, loader=None, ringFrames=RING_FRAMES,
+                 threads=None):
+        self.frames = list(frames)
+        self.fps = float(fps)
+        self.function = function
+        self.position = -1
+        self.shown = 0
+        self.dropped = 0
+
+        self._loader = loader or imageLoader.Loader()
+        self._ring = [None] * ringFrames
+        self._pool = ThreadPool(threads or parallel.workers())
+        self._lock = threading.Lock()
+        self._startTime = None
+        self._stopped = False
+
+        #frame due at the last tick, the ones before it are too late
+        self._due = 0
+
+    def _render(self, index):
+        '''Decodes and processes a frame on a pool thread
+
+            Args:
+                index: int frame number, counting on across loops
+
+            Returns:
+                The pixel array to show or None if the frame was too late
+                by the time its turn came
+        '''
+        with self._lock:
+            if self._stopped or index <= self.position or index < self._due:
+                return None
+
+        array = self._loader.load(self.frames[index % len(self.frames)], prefetch=False)
+        if array is None or self.function is None:
+            return array
+        return self.function(array)
+
+    def fill(self, start):
+        '''Queues the frames of the ring buffer from a frame on, keeping
+        slots that already hold their frame
+
+            Args:
+                start: int first frame number to buffer
+        '''
+        if self._stopped:
+            return
+
+        for index in range(start, start + len(self._ring)):
+            slot = index % len(self._ring)
+            if self._ring[slot] is None or self._ring[slot][0] != index:
+                self._ring[slot] = (index, self._pool.apply_async(self._render, (index,)))
+
+    def start(self, now):
+        '''Starts the clock and fills the ring buffer
+
+            Args:
+                now: float time.time() of the start
+        '''
+        self._startTime = now
+        self.fill(0)
+
+    def tick(self, now):
+        '''Advances the playhead to the frame due at a time
+
+            Args:
+                now: float time.time()
+
+            Returns:
+                The pixel array of the newest ready frame up to the due one
+                if it was not shown yet, None otherwise
+        '''
+        due = int((now - self._startTime) * self.fps)
+        with self._lock:
+            self._due = due
+        if self._stopped or due <= self.position:
+            return None
+
+        ready = sorted((index, result.get()) for index, result in filter(None, self._ring)
+                       if self.position < index <= due and result.ready())
+        if not ready:
+            return None
+
+        #frames skipped on the way, too late or that cannot be loaded count as dropped
+        arrays = [array for index, array in ready if array is not None]
+        array = arrays[-1] if arrays else None
+        with self._lock:
+            self.dropped += ready[-1][0] - self.position - (array is not None)
+            self.position = ready[-1][0]
+        if array is not None:
+            self.shown += 1
+
+        self.fill(self.position + 1)
+        return array
+
+    def frame(self):
+        '''Gets the sequence frame the playhead is on
+
+            Returns:
+                The int index into frames
+        '''
+        return max(self.position, 0) % len(self.frames)
+
+    def achievedFps(self, now):
+        '''Gets the rate frames were shown at since the start
+
+            Args:
+                now: float time.time()
+
+            Returns:
+                The float frames per second
+        '''
+        elapsed = now - self._startTime
+        return self.shown / elapsed if elapsed > 0 else 0.0
+
+    def stop(self):
+        '''Stops the pool, dropping the frames not processed yet. Waits for
+        the frames being processed, whose results are thrown away.
+        '''
+        with self._lock:
+            self._stopped = True
+        self._pool.terminate()
+        self._pool.join()
+        self._ring = [None] * len(self._ring)
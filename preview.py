@@ -0,0 +1,81 @@
+'''Low-resolution previews of pixel-local operations.
+
+While the full-resolution result of a keyer renders, the same function is run
+on 1/8, 1/4 and 1/2 resolution versions of its inputs, coarsest first, so the
+effect of new thresholds shows almost at once and sharpens as the levels come
+in. The levels take every n-th pixel instead of averaging blocks, which costs
+no more than the level itself and keeps the original pixel colors the
+thresholds are tested against.
+
+region() does the same for the part of the image on screen, which the live
+parameter panel re-renders as its sliders move.
+
+Only functions that work on each pixel on its own can be previewed this way;
+spatial filters would need their radius scaled with the level.
+'''
+
+import functools
+
+import numpy as np
+
+#subsampling factors of the preview levels, coarsest first
+LEVELS = (8, 4, 2)
+
+
+def subsample(array, factor):
+    '''Takes every factor-th pixel of each row and column
+
+        Args:
+            array: (height, width, 4) uint8 pixel array
+            factor: int subsampling factor
+
+        Returns:
+            The smaller pixel array
+    '''
+    return np.ascontiguousarray(array[::factor, ::factor])
+
+
+def render(function, arrays, factor):
+    '''Runs a pixel-local function on subsampled inputs
+
+        Args:
+            function: function taking the pixel arrays and returning the result
+            arrays: list of same-size input pixel arrays
+            factor: int subsampling factor
+
+        Returns:
+            The result pixel array at the reduced size
+    '''
+    return function(*[subsample(array, factor) for array in arrays])
+
+
+def region(function, arrays, box, step=1):
+    '''Runs a pixel-local function on part of its inputs, for example the
+    part visible on screen at the resolution it is displayed at
+
+        Args:
+            function: function taking the pixel arrays and returning the result
+            arrays: list of same-size input pixel arrays
+            box: (top, left, bottom, right) part of the image
+            step: int subsampling factor
+
+        Returns:
+            The result pixel array of the part
+    '''
+    top, left, bottom, right = box
+    return function(*[np.ascontiguousarray(array[top:bottom:step, left:right:step])
+                      for array in arrays])
+
+
+def stages(function, arrays, levels=LEVELS):
+    '''Builds the previews of a pixel-local function
+
+        Args:
+            function: function taking the pixel arrays and returning the result
+            arrays: list of same-size input pixel arrays
+            levels: subsampling factors, coarsest first
+
+        Returns:
+            A list of functions without arguments rendering each level
+    '''
+    return [functools.partial(render, function, arrays, factor) for factor in levels]
@@ -0,0 +1,158 @@
+'''Phase timings and copy counters of the viewer operations.
+
+Each operation goes through up to five phases: decode (waiting for an image
+file to be decoded into a pixel array, see imageLoader), preview, compute,
+from-buffer (wrapping the result in a QImage) and upload (turning it into a
+pixmap).
+Phases are recorded as they happen, from any thread, and collected into the
+pending operation of their token until finish() names it. The phases of an
+edit that spans a file dialog, a worker thread and the display are reported
+together by finishing the tokens of each part at once. Phases without a
+token belong to the GUI thread; a worker job records under itself, so a live
+render or a playback frame finished meanwhile does not take its phases.
+
+Every phase is also kept as a complete event of the Chrome trace format, so
+save() writes a file that chrome://tracing or Perfetto can open.
+'''
+
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+#phases in the order they happen
+PHASES = ('decode', 'preview', 'compute', 'from-buffer', 'upload')
+
+#trace events kept for save(), the oldest are dropped first
+MAX_EVENTS = 100000
+
+
+class Profiler(object):
+    '''Records phases and summarizes them per operation
+
+    Attributes:
+        events: Chrome trace events of the recorded phases
+        totals: dict of operation name -> dict of phase -> [seconds, bytes]
+            over every run of the operation
+    '''
+
+    def __init__(self):
+        self.events = collections.deque(maxlen=MAX_EVENTS)
+        self.totals = {}
+
+        self._start = time.time()
+        self._lock = threading.Lock()
+        #token -> (dict of phase -> [seconds, bytes], trace events)
+        self._pending = {}
+
+    @contextlib.contextmanager
+    def phase(self, name, nbytes=0, token=None):
+        '''Times the code in a with block as a phase of the pending operation
+
+            Args:
+                name: phase name from PHASES
+                nbytes: int bytes copied by the phase
+                token: hashable key of the pending operation, None for the
+                    GUI thread's
+        '''
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.time() - start, nbytes, token)
+
+    def record(self, name, start, seconds, nbytes=0, token=None):
+        '''Adds a phase to the pending operation
+
+            Args:
+                name: phase name from PHASES
+                start: float time.time() the phase started at
+                seconds: float duration of the phase
+                nbytes: int bytes copied by the phase
+                token: hashable key of the pending operation, None for the
+                    GUI thread's
+        '''
+        event = {
+            'name': name,
+            'cat': 'phase',
+            'ph': 'X',
+            'ts': (start - self._start) * 1e6,
+            'dur': seconds * 1e6,
+            'pid': os.getpid(),
+            'tid': threading.current_thread().ident,
+            'args': {'bytes': nbytes},
+        }
+
+        with self._lock:
+            phases, events = self._pending.setdefault(token, ({}, []))
+            total = phases.setdefault(name, [0.0, 0])
+            total[0] += seconds
+            total[1] += nbytes
+            events.append(event)
+            self.events.append(event)
+
+    def finish(self, operation, tokens=(None,)):
+        '''Closes the pending operations of some tokens as one operation
+
+            Args:
+                operation: string operation name
+                tokens: tokens whose phases make up the operation, None for
+                    the GUI thread's
+
+            Returns:
+                The summary string of its phases
+        '''
+        with self._lock:
+            phases = {}
+            for token in tokens:
+                pending, events = self._pending.pop(token, ({}, []))
+                for name, (seconds, nbytes) in pending.items():
+                    total = phases.setdefault(name, [0.0, 0])
+                    total[0] += seconds
+                    total[1] += nbytes
+                for event in events:
+                    event['args']['operation'] = operation
+
+            totals = self.totals.setdefault(operation, {})
+            for name, (seconds, nbytes) in phases.items():
+                total = totals.setdefault(name, [0.0, 0])
+                total[0] += seconds
+                total[1] += nbytes
+
+        return summary(operation, phases)
+
+    def save(self, fileName):
+        '''Writes the recorded phases as a Chrome trace JSON file
+
+            Args:
+                fileName: path of the trace file
+        '''
+        with self._lock:
+            events = list(self.events)
+
+        with open(fileName, 'w') as traceFile:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, traceFile)
+
+
+def summary(operation, phases):
+    '''Formats the phases of an operation for the status bar
+
+        Args:
+            operation: string operation name
+            phases: dict of phase -> (seconds, bytes)
+
+        Returns:
+            A string like "edge: compute 12.0 ms | upload 0.8 ms (1.0 MB)"
+    '''
+    parts = []
+    for name in PHASES:
+        if name in phases:
+            seconds, nbytes = phases[name]
+            part = "%s %.1f ms" % (name, seconds * 1000)
+            if nbytes:
+                part += " (%.1f MB)" % (nbytes / 1e6)
+            parts.append(part)
+
+    return "%s: %s" % (operation, " | ".join(parts))
@@ -0,0 +1,277 @@
+'''Memoization of operation results.
+
+Results are keyed by a hash of the input pixel buffers together with the
+operation name and its parameters, so re-applying the same chromaKey range or
+mix values to the same images returns the earlier result instead of
+recomputing it. Entries live in memory in least recently used order within a
+byte budget. When a spill directory is given, entries evicted from memory are
+written there as .npy files (within their own byte budget) and read back on
+a later hit.
+
+Operations wrapped for the lazy graph (see wrap) are looked up and stored
+whole by the graph node, before it splits the work into bands, so an entry is
+always the result of a whole edit. The cache is locked, so it can be used
+from several threads.
+
+The hits, misses, diskHits, evictions and spills counters, with the bytes in
+use, are available from stats() to size the budgets.
+'''
+
+import collections
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+#default in-memory budget in bytes
+MEMORY_BYTES = 512 * 1024 * 1024
+
+#default spill directory budget in bytes
+SPILL_BYTES = 4 * 1024 * 1024 * 1024
+
+
+def bufferHash(array):
+    '''Hashes the contents, shape and type of a pixel buffer
+
+        Args:
+            array: NumPy array
+
+        Returns:
+            The hex digest string
+    '''
+    array = np.ascontiguousarray(array)
+    digest = hashlib.sha1(repr((array.shape, array.dtype.str)).encode('ascii'))
+    digest.update(array.data)
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    '''Byte-budgeted LRU cache of operation results with an optional disk spill
+
+    Attributes:
+        maxBytes: in-memory budget in bytes
+        spillDir: directory evicted entries are written to, or None
+        maxSpillBytes: budget of the spill directory in bytes
+        hits: lookups answered from memory
+        diskHits: lookups answered from the spill directory
+        misses: lookups that had to compute the result
+        evictions: entries dropped from memory to stay within budget
+        spills: evicted entries written to the spill directory
+    '''
+
+    def __init__(self, maxBytes=MEMORY_BYTES, spillDir=None, maxSpillBytes=SPILL_BYTES):
+        self.maxBytes = maxBytes
+        self.spillDir = spillDir
+        self.maxSpillBytes = maxSpillBytes
+
+        self._memory = collections.OrderedDict()
+        self._memoryBytes = 0
+        self._disk = collections.OrderedDict()
+        self._diskBytes = 0
+
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spills = 0
+
+        #get, put and the counters may be called from several threads
+        self._lock = threading.RLock()
+
+        if spillDir is not None and not os.path.isdir(spillDir):
+            os.makedirs(spillDir)
+
+    def key(self, name, params, arrays):
+        '''Builds the cache key of an operation call
+
+            Args:
+                name: string operation name
+                params: tuple of the operation parameters
+                arrays: list of input pixel arrays
+
+            Returns:
+                The key string
+        '''
+        inputs = [bufferHash(array) for array in arrays]
+        return hashlib.sha1(repr((name, params, inputs)).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        '''Looks up a result, promoting spilled results back into memory
+
+            Args:
+                key: key string from key()
+
+            Returns:
+                The read-only result array or None if it is not cached
+        '''
+        with self._lock:
+            array = self._memory.pop(key, None)
+            if array is not None:
+                self._memory[key] = array
+                self.hits += 1
+                return array
+
+            if key in self._disk:
+                fileName = os.path.join(self.spillDir, key + '.npy')
+                self._diskBytes -= self._disk.pop(key)
+                try:
+                    array = np.load(fileName)
+                    os.remove(fileName)
+                except (IOError, OSError, ValueError):
+                    array = None
+
+                if array is not None:
+                    self.diskHits += 1
+                    self.put(key, array)
+                    return self._memory[key]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, array):
+        '''Stores a result and evicts the least recently used ones over budget
+
+            Args:
+                key: key string from key()
+                array: result array, it is made read-only
+        '''
+        if array.nbytes > self.maxBytes:
+            return
+
+        array.setflags(write=False)
+        with self._lock:
+            if key in self._memory:
+                self._memoryBytes -= self._memory.pop(key).nbytes
+            self._memory[key] = array
+            self._memoryBytes += array.nbytes
+
+            while self._memoryBytes > self.maxBytes:
+                oldKey, oldArray = self._memory.popitem(last=False)
+                self._memoryBytes -= oldArray.nbytes
+                self.evictions += 1
+                self._spill(oldKey, oldArray)
+
+    def _spill(self, key, array):
+        '''Writes an evicted result to the spill directory within its budget;
+        the lock must be held
+
+            Args:
+                key: key string
+                array: evicted result array
+        '''
+        if self.spillDir is None or array.nbytes > self.maxSpillBytes:
+            return
+
+        np.save(os.path.join(self.spillDir, key + '.npy'), array)
+        self._disk[key] = array.nbytes
+        self._diskBytes += array.nbytes
+        self.spills += 1
+
+        while self._diskBytes > self.maxSpillBytes:
+            oldKey, nbytes = self._disk.popitem(last=False)
+            self._diskBytes -= nbytes
+            try:
+                os.remove(os.path.join(self.spillDir, oldKey + '.npy'))
+            except OSError:
+                pass
+
+    def call(self, name, params, function, *arrays):
+        '''Returns the cached result of an operation call or computes and
+        stores it
+
+            Args:
+                name: string operation name
+                params: tuple of the operation parameters
+                function: function taking the arrays and returning the result
+                arrays: input pixel arrays
+
+            Returns:
+                The result array
+        '''
+        key = self.key(name, params, arrays)
+        result = self.get(key)
+
+        if result is None:
+            result = function(*arrays)
+            self.put(key, result)
+
+        return result
+
+    def wrap(self, name, params, function):
+        '''Wraps an operation so that it goes through the cache, for example
+        for graph.apply
+
+            Args:
+                name: string operation name
+                params: tuple of the operation parameters
+                function: function taking input arrays and returning the result
+
+            Returns:
+                The caching Cached operation
+        '''
+        return Cached(self, name, params, function)
+
+    def stats(self):
+        '''Gets the cache counters
+
+            Returns:
+                A dict of the counters and the bytes in use
+        '''
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'diskHits': self.diskHits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'spills': self.spills,
+                'entries': len(self._memory),
+                'bytes': self._memoryBytes,
+                'spilledEntries': len(self._disk),
+                'spilledBytes': self._diskBytes,
+            }
+
+
+class Cached(object):
+    '''An operation that goes through a ResultCache. Called directly it
+    caches each call; a graph node evaluates it with evaluate() instead, so
+    the whole result is cached rather than each band.
+
+    Attributes:
+        cache: the ResultCache
+        name: string operation name
+        params: tuple of the operation parameters
+        function: the uncached function taking input arrays and returning
+            the result
+    '''
+
+    def __init__(self, cache, name, params, function):
+        self.cache = cache
+        self.name = name
+        self.params = params
+        self.function = function
+
+    def __call__(self, *arrays):
+        return self.cache.call(self.name, self.params, self.function, *arrays)
+
+    def evaluate(self, arrays, compute):
+        '''Returns the cached result of the whole operation or computes and
+        stores it
+
+            Args:
+                arrays: list of the whole input pixel arrays
+                compute: function taking the uncached function and returning
+                    the result for the arrays, for example band by band; it
+                    can raise to abort, leaving nothing cached
+
+            Returns:
+                The result array
+        '''
+        key = self.cache.key(self.name, self.params, arrays)
+        result = self.cache.get(key)
+
+        if result is None:
+            result = compute(self.function)
+            self.cache.put(key, result)
+
+        return result
@@ -0,0 +1,95 @@
+'''Checks the fixed-point Porter-Duff operators against the same formulas in
+float.
+
+    python -m unittest testComposite
+'''
+
+import unittest
+
+import numpy as np
+
+import composite
+
+#operator name -> (float formula, rounded products summed by the operator)
+REFERENCES = {
+    'over': (lambda a, b, aAlpha, bAlpha: a + b * (1 - aAlpha), 1),
+    'in': (lambda a, b, aAlpha, bAlpha: a * bAlpha, 1),
+    'out': (lambda a, b, aAlpha, bAlpha: a * (1 - bAlpha), 1),
+    'atop': (lambda a, b, aAlpha, bAlpha: a * bAlpha + b * (1 - aAlpha), 2),
+    'xor': (lambda a, b, aAlpha, bAlpha: a * (1 - bAlpha) + b * (1 - aAlpha), 2),
+    'plus': (lambda a, b, aAlpha, bAlpha: a + b, 0),
+    'screen': (lambda a, b, aAlpha, bAlpha: a + b - a * b, 1),
+    'multiply': (lambda a, b, aAlpha, bAlpha: a * b + a * (1 - bAlpha) + b * (1 - aAlpha), 3),
+}
+
+
+def reference(operator, aArray, bArray):
+    '''Composites premultiplied pixel arrays in float64 on the 0-255 scale
+    '''
+    a = aArray / 255.0
+    b = bArray / 255.0
+    formula = REFERENCES[operator][0]
+    result = formula(a, b, composite.alpha(a), composite.alpha(b))
+    return np.clip(result, 0, 1) * 255
+
+
+class CompositeTest(unittest.TestCase):
+
+    def setUp(self):
+        #not a multiple of ROWS, so the last strip is short
+        shape = (2 * composite.ROWS + 7, 45, 4)
+        random = np.random.RandomState(22)
+        self.aStraight = random.randint(0, 256, shape).astype(np.uint8)
+        self.bStraight = random.randint(0, 256, shape).astype(np.uint8)
+        self.aArray = composite.premultiply(self.aStraight)
+        self.bArray = composite.premultiply(self.bStraight)
+
+    def testMultiplyRounds(self):
+        values = np.arange(256, dtype=np.uint8)
+        a, b = np.meshgrid(values, values)
+        expected = np.floor(a * b.astype(np.float64) / 255 + 0.5)
+        np.testing.assert_array_equal(composite.multiply(a, b), expected)
+
+    def testOperatorsMatchFloat(self):
+        for operator, (_, products) in REFERENCES.items():
+            result = composite.apply(operator, self.aArray, self.bArray)
+            error = np.abs(result - reference(operator, self.aArray, self.bArray)).max()
+            #each rounded product is off by at most half a level
+            self.assertLessEqual(error, 0.5 * products + 1e-9, operator)
+
+    def testStripsMatchWholeImage(self):
+        for operator, function in composite.OPERATORS.items():
+            np.testing.assert_array_equal(composite.apply(operator, self.aArray, self.bArray),
+                                          function(self.aArray, self.bArray))
+
+    def testPremultipliedRoundTrip(self):
+        #every premultiplied value under every alpha
+        values = np.arange(256, dtype=np.uint8)
+        alphas, levels = np.meshgrid(values, values, indexing='ij')
+        array = np.empty((256, 256, 4), np.uint8)
+        array[:, :, :] = np.minimum(levels, alphas)[:, :, np.newaxis]
+        array[:, :, composite.ALPHA] = alphas
+
+        np.testing.assert_array_equal(composite.premultiply(composite.unpremultiply(array)), array)
+
+    def testUnpremultiplyTransparent(self):
+        array = self.aArray.copy()
+        array[:, :, composite.ALPHA] = 0
+        array[:, :, :] = np.minimum(array, composite.alpha(array))
+        self.assertFalse(composite.unpremultiply(array).any())
+
+    def testCompositeOpaque(self):
+        aStraight = self.aStraight.copy()
+        aStraight[:, :, composite.ALPHA] = 255
+        np.testing.assert_array_equal(composite.composite('over', aStraight, self.bStraight), aStraight)
+        np.testing.assert_array_equal(composite.composite('in', aStraight, aStraight), aStraight)
+
+    def testCompositeIsPremultipliedApply(self):
+        for operator in composite.OPERATORS:
+            expected = composite.unpremultiply(composite.apply(operator, self.aArray, self.bArray))
+            np.testing.assert_array_equal(composite.composite(operator, self.aStraight, self.bStraight),
+                                          expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+'''Checks the median filters and the box blur against brute-force references.
+
+    python -m unittest testFilters
+'''
+
+import unittest
+
+import numpy as np
+
+import filters
+
+RADII = [1, 2, 3, 5, 8]
+
+
+def referenceMedian(plane, radius):
+    '''Ranks the in-image pixels of every window and takes the upper median
+    '''
+    height, width = plane.shape
+    out = np.empty(plane.shape, np.uint8)
+    for row in range(height):
+        for col in range(width):
+            window = plane[max(row - radius, 0):row + radius + 1,
+                           max(col - radius, 0):col + radius + 1]
+            values = np.sort(window, axis=None)
+            out[row, col] = values[len(values) // 2]
+    return out
+
+
+def referenceBoxBlur(plane, radius):
+    '''Averages the in-image pixels of every window in float64
+    '''
+    height, width = plane.shape
+    out = np.empty(plane.shape, np.float64)
+    for row in range(height):
+        for col in range(width):
+            out[row, col] = plane[max(row - radius, 0):row + radius + 1,
+                                  max(col - radius, 0):col + radius + 1].mean()
+    return out
+
+
+class MedianTest(unittest.TestCase):
+
+    def setUp(self):
+        #odd sizes so the windows overhang the border differently on each side
+        self.plane = np.random.RandomState(6).randint(0, 256, (23, 31)).astype(np.uint8)
+
+    def testWindowMedian(self):
+        for radius in RADII:
+            np.testing.assert_array_equal(filters.windowMedian(self.plane, radius),
+                                          referenceMedian(self.plane, radius))
+
+    def testHistogramMedian(self):
+        for radius in RADII:
+            np.testing.assert_array_equal(filters.histogramMedian(self.plane, radius),
+                                          referenceMedian(self.plane, radius))
+
+    def testWindowLargerThanImage(self):
+        plane = self.plane[:4, :5]
+        np.testing.assert_array_equal(filters.histogramMedian(plane, 8), referenceMedian(plane, 8))
+
+    def testMedianOnBothSidesOfTheCrossover(self):
+        for radius in (filters.HISTOGRAM_MEDIAN_RADIUS - 1, filters.HISTOGRAM_MEDIAN_RADIUS):
+            np.testing.assert_array_equal(filters.median(self.plane, radius),
+                                          referenceMedian(self.plane, radius))
+
+    def testFewLevels(self):
+        plane = (self.plane // 64 * 64).astype(np.uint8)
+        for radius in RADII:
+            np.testing.assert_array_equal(filters.median(plane, radius), referenceMedian(plane, radius))
+
+
+class BoxBlurTest(unittest.TestCase):
+
+    def setUp(self):
+        self.plane = np.random.RandomState(7).randint(0, 256, (29, 37)).astype(np.float32)
+
+    def testRadii(self):
+        #covers the separable passes and the summed-area table
+        for radius in [0, 1, filters.SEPARABLE_BOX_RADIUS, filters.SEPARABLE_BOX_RADIUS + 1, 10, 40]:
+            np.testing.assert_allclose(filters.boxBlur(self.plane, radius),
+                                       referenceBoxBlur(self.plane, radius), rtol=0, atol=1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
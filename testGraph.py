@@ -0,0 +1,81 @@
+'''Checks that the lazy graph fuses point operations and matches running the
+operations one at a time.
+
+    python -m unittest testGraph
+'''
+
+import unittest
+
+import numpy as np
+
+import graph
+import lut
+import ops
+
+
+class GraphTest(unittest.TestCase):
+
+    def setUp(self):
+        self.array = np.random.RandomState(10).randint(0, 256, (40, 50, 4)).astype(np.uint8)
+        self.tablePasses = 0
+
+        applyTable = ops.applyTable
+
+        def countedApplyTable(array, table):
+            self.tablePasses += 1
+            return applyTable(array, table)
+
+        ops.applyTable = countedApplyTable
+        self.addCleanup(setattr, ops, 'applyTable', applyTable)
+
+    def testPointRunIsOnePass(self):
+        first = graph.point(graph.source(self.array), lut.gamma(1.4))
+        second = graph.point(first, lut.contrast())
+        third = graph.point(second, lut.gamma(0.7))
+
+        result = third.evaluate()
+        self.assertEqual(self.tablePasses, 1)
+        self.assertIsNone(first.value)
+        self.assertIsNone(second.value)
+
+        expected = ops.applyTable(ops.contrast(ops.gamma(self.array, 1.4)), lut.gamma(0.7))
+        np.testing.assert_array_equal(result, expected)
+
+    def testMonochromeAbsorbsTables(self):
+        mono = graph.monochrome(graph.source(self.array))
+        node = graph.point(graph.point(mono, lut.contrast()), lut.gamma(1.2))
+
+        result = node.evaluate()
+        self.assertEqual(self.tablePasses, 0)
+        self.assertIsNone(mono.value)
+        np.testing.assert_array_equal(result, ops.gamma(ops.contrast(ops.monochrome(self.array)), 1.2))
+
+    def testEvaluatedNodeStopsFusion(self):
+        first = graph.point(graph.source(self.array), lut.gamma(1.4))
+        first.evaluate()
+        second = graph.point(first, lut.contrast())
+
+        result = second.evaluate()
+        self.assertEqual(self.tablePasses, 2)
+        np.testing.assert_array_equal(result, ops.contrast(ops.gamma(self.array, 1.4)))
+
+    def testApplyBetweenPointRuns(self):
+        node = graph.point(graph.source(self.array), lut.contrast())
+        node = graph.apply(ops.edge, node, halo=1)
+        node = graph.point(graph.point(node, lut.gamma(2.0)), lut.contrast())
+
+        result = node.evaluate()
+        self.assertEqual(self.tablePasses, 2)
+        expected = ops.contrast(ops.gamma(ops.edge(ops.contrast(self.array)), 2.0))
+        np.testing.assert_array_equal(result, expected)
+
+    def testEvaluateDropsInputs(self):
+        source = graph.source(self.array)
+        node = graph.apply(ops.blur, source)
+        node.evaluate()
+        self.assertEqual(node.inputs, [])
+        self.assertIs(node.evaluate(), node.value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+'''Checks undo and redo of the tile history, the sharing of unchanged tiles
+and the memory budget.
+
+    python -m unittest testHistory
+'''
+
+import unittest
+
+import numpy as np
+
+import history
+
+#tiles of 8 pixels over a 20x30 image: 3 rows of 4 tiles, the last ones cut short
+TILE = 8
+SHAPE = (20, 30, 4)
+
+
+def image(value):
+    '''Builds a pixel array filled with one value
+    '''
+    return np.full(SHAPE, value, np.uint8)
+
+
+class HistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.history = history.History(tileSize=TILE)
+
+    def testUndoRedo(self):
+        for value in (1, 2, 3):
+            self.history.push(image(value))
+
+        self.assertFalse(self.history.canRedo())
+        np.testing.assert_array_equal(self.history.undo(), image(2))
+        np.testing.assert_array_equal(self.history.undo(), image(1))
+        self.assertFalse(self.history.canUndo())
+        self.assertIsNone(self.history.undo())
+
+        np.testing.assert_array_equal(self.history.redo(), image(2))
+        np.testing.assert_array_equal(self.history.redo(), image(3))
+        self.assertIsNone(self.history.redo())
+
+    def testPushDropsRedo(self):
+        for value in (1, 2, 3):
+            self.history.push(image(value))
+        self.history.undo()
+        self.history.push(image(4))
+
+        self.assertFalse(self.history.canRedo())
+        np.testing.assert_array_equal(self.history.undo(), image(2))
+
+    def testUnchangedTilesAreShared(self):
+        first = np.random.RandomState(12).randint(0, 256, SHAPE).astype(np.uint8)
+        second = first.copy()
+        second[TILE + 1, TILE + 2] += 1
+
+        self.history.push(first)
+        self.history.push(second)
+
+        tiles = [snapshot.tiles for snapshot in self.history._states]
+        changed = [position for position in tiles[0] if tiles[0][position] is not tiles[1][position]]
+        self.assertEqual(changed, [(TILE, TILE)])
+        self.assertEqual(self.history.nbytes, first.nbytes + TILE * TILE * 4)
+
+        np.testing.assert_array_equal(self.history.undo(), first)
+        np.testing.assert_array_equal(self.history.redo(), second)
+
+    def testTilesAreReadOnly(self):
+        array = image(1)
+        self.history.push(array)
+        array[...] = 2
+
+        for tile in self.history._states[0].tiles.values():
+            self.assertFalse(tile.flags.writeable)
+        self.history.push(image(3))
+        np.testing.assert_array_equal(self.history.undo(), image(1))
+
+    def testSizeChangeIsNotShared(self):
+        self.history.push(image(1))
+        self.history.push(np.full((10, 30, 4), 1, np.uint8))
+        np.testing.assert_array_equal(self.history.undo(), image(1))
+
+    def testBudgetDropsOldestStates(self):
+        budget = history.History(maxBytes=2 * image(0).nbytes, tileSize=TILE)
+        for value in (1, 2, 3, 4):
+            budget.push(image(value))
+
+        self.assertLessEqual(budget.nbytes, budget.maxBytes)
+        np.testing.assert_array_equal(budget.undo(), image(3))
+        self.assertFalse(budget.canUndo())
+
+    def testCurrentStateIsKeptOverBudget(self):
+        budget = history.History(maxBytes=1, tileSize=TILE)
+        budget.push(image(1))
+        budget.push(image(2))
+
+        self.assertFalse(budget.canUndo())
+        self.assertEqual(budget.nbytes, image(2).nbytes)
+
+    def testReleasingSharedTiles(self):
+        first = image(1)
+        second = first.copy()
+        second[0, 0] = 9
+
+        self.history.push(first)
+        self.history.push(second)
+        self.history.undo()
+        self.history.push(first.copy())
+
+        #the dropped state only held one tile of its own
+        self.assertEqual(self.history.nbytes, first.nbytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
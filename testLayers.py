@@ -0,0 +1,118 @@
+'''Checks that the layer stack recomposites only changed tiles and still gives
+the same canvas as compositing everything afresh.
+
+    python -m unittest testLayers
+'''
+
+import unittest
+
+import numpy as np
+
+import composite
+import layers
+
+#small tiles over a canvas that does not divide into them evenly
+TILE = 16
+HEIGHT, WIDTH = 50, 70
+
+#4 rows of 5 tiles
+TILES = 4 * 5
+
+
+class Abort(Exception):
+    pass
+
+
+class StackTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(23)
+        self.arrays = [random.randint(0, 256, shape).astype(np.uint8)
+                       for shape in [(HEIGHT, WIDTH, 4), (20, 30, 4), (25, 18, 4)]]
+        self.arrays[0][:, :, composite.ALPHA] = 255
+
+        self.stack = layers.Stack(HEIGHT, WIDTH, TILE)
+        self.layers = [self.stack.add(self.arrays[0]),
+                       self.stack.add(self.arrays[1], 'over', 0.8, (5, 10)),
+                       self.stack.add(self.arrays[2], 'atop', 1.0, (30, 40))]
+        self.stack.render()
+
+    def freshCanvas(self):
+        '''Composites the current layers of the stack on a new stack
+        '''
+        fresh = layers.Stack(HEIGHT, WIDTH, TILE)
+        for layer in self.stack.layers:
+            array = self.arrays[self.layers.index(layer)]
+            fresh.add(array, layer.operator, layer.opacity, layer.offset)
+        fresh.render()
+        return fresh.canvas
+
+    def testRenderCoversTheCanvas(self):
+        stack = layers.Stack(HEIGHT, WIDTH, TILE)
+        stack.add(self.arrays[0])
+        boxes = stack.render()
+
+        covered = np.zeros((HEIGHT, WIDTH), int)
+        for top, left, bottom, right in boxes:
+            covered[top:bottom, left:right] += 1
+        self.assertTrue((covered == 1).all())
+        np.testing.assert_array_equal(stack.canvas, self.arrays[0])
+
+    def testNothingChanged(self):
+        self.assertEqual(self.stack.dirtyTiles(), [])
+        self.assertEqual(self.stack.render(), [])
+
+    def testMove(self):
+        self.stack.move(self.layers[1], (-6, 50))
+        dirty = self.stack.dirtyTiles()
+        self.assertLess(len(dirty), TILES)
+
+        self.stack.render()
+        np.testing.assert_array_equal(self.stack.canvas, self.freshCanvas())
+
+    def testOpacity(self):
+        self.stack.setOpacity(self.layers[2], 0.3)
+        self.stack.render()
+        np.testing.assert_array_equal(self.stack.canvas, self.freshCanvas())
+
+    def testOperator(self):
+        for operator in composite.OPERATORS:
+            self.stack.setOperator(self.layers[1], operator)
+            self.stack.render()
+            np.testing.assert_array_equal(self.stack.canvas, self.freshCanvas(), operator)
+
+    def testClearingOperatorDirtiesEverything(self):
+        self.stack.setOperator(self.layers[2], 'in')
+        self.assertEqual(len(self.stack.dirtyTiles()), TILES)
+
+        self.stack.render()
+        np.testing.assert_array_equal(self.stack.canvas, self.freshCanvas())
+
+        #tiles outside the layer are cleared too
+        self.assertFalse(self.stack.canvas[:30].any())
+
+    def testRemove(self):
+        self.stack.remove(self.layers[1])
+        self.stack.render()
+        np.testing.assert_array_equal(self.stack.canvas, self.freshCanvas())
+
+    def testUnknownOperator(self):
+        self.assertRaises(ValueError, self.stack.add, self.arrays[1], 'behind')
+        self.assertRaises(ValueError, self.stack.setOperator, self.layers[1], 'behind')
+
+    def testAbortedRenderStaysDirty(self):
+        self.stack.move(self.layers[2], (0, 0))
+        dirty = self.stack.dirtyTiles()
+
+        def progress(done, total):
+            raise Abort()
+
+        self.assertRaises(Abort, self.stack.render, progress)
+        self.assertEqual(self.stack.dirtyTiles(), dirty)
+
+        self.stack.render()
+        np.testing.assert_array_equal(self.stack.canvas, self.freshCanvas())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+'''Checks that operations run band by band on the thread pool give the same
+pixels as on the whole image.
+
+    python -m unittest testParallel
+'''
+
+import unittest
+
+import numpy as np
+
+import ops
+import parallel
+
+#tall enough for many bands of MIN_BAND_ROWS with a short last one
+HEIGHT = 16 * parallel.MIN_BAND_ROWS + 5
+
+
+class Abort(Exception):
+    pass
+
+
+class ParallelTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(16)
+        self.array = random.randint(0, 256, (HEIGHT, 37, 4)).astype(np.uint8)
+        self.other = random.randint(0, 256, (HEIGHT, 37, 4)).astype(np.uint8)
+
+        self.addCleanup(parallel.setWorkers, parallel.workers())
+        parallel.setWorkers(3)
+
+    def testBandBoxesCoverTheRows(self):
+        for height in (1, parallel.MIN_BAND_ROWS - 1, parallel.MIN_BAND_ROWS, HEIGHT):
+            for count in (1, 2, 7, 100):
+                boxes = parallel.bandBoxes(height, count)
+                self.assertEqual(boxes[0][0], 0)
+                self.assertEqual(boxes[-1][1], height)
+                for (_, bottom), (top, _) in zip(boxes, boxes[1:]):
+                    self.assertEqual(bottom, top)
+                if len(boxes) > 1:
+                    self.assertGreaterEqual(min(bottom - top for top, bottom in boxes),
+                                            parallel.MIN_BAND_ROWS)
+
+    def testPointOperations(self):
+        for function in (ops.contrast, ops.monochrome, lambda array: ops.gamma(array, 0.6)):
+            np.testing.assert_array_equal(parallel.run(function, [self.array]), function(self.array))
+
+    def testTwoInputs(self):
+        function = lambda aArray, bArray: ops.mix(aArray, bArray, 0.3, 0.7)
+        np.testing.assert_array_equal(parallel.run(function, [self.array, self.other]),
+                                      function(self.array, self.other))
+
+    def testHaloOperations(self):
+        cases = [(ops.edge, 1), (ops.blur, 1), (ops.sharpen, 1),
+                 (lambda array: ops.boxBlur(array, 9), 9),
+                 (lambda array: ops.median(array, 2), 2),
+                 (lambda array: ops.median(array, 8), 8)]
+        for function, halo in cases:
+            np.testing.assert_array_equal(parallel.run(function, [self.array], halo), function(self.array))
+
+    def testOneWorker(self):
+        parallel.setWorkers(1)
+        np.testing.assert_array_equal(parallel.run(ops.edge, [self.array], 1), ops.edge(self.array))
+
+    def testProgressCountsBands(self):
+        calls = []
+        parallel.run(ops.contrast, [self.array], progress=lambda done, total: calls.append((done, total)))
+
+        total = len(parallel.bandBoxes(HEIGHT, parallel.workers() * parallel.BANDS_PER_WORKER))
+        self.assertEqual(calls, [(done, total) for done in range(1, total + 1)])
+
+    def testProgressAborts(self):
+        def progress(done, total):
+            raise Abort()
+
+        self.assertRaises(Abort, parallel.run, ops.contrast, [self.array], 0, progress)
+
+        #the pool is still usable afterwards
+        np.testing.assert_array_equal(parallel.run(ops.contrast, [self.array]), ops.contrast(self.array))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+'''Checks the least recently used eviction and the disk spill of the result
+cache, and that graph nodes cache whole results.
+
+    python -m unittest testResultCache
+'''
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import graph
+import ops
+import resultCache
+
+#bytes of one 10x10 pixel array
+ENTRY_BYTES = 10 * 10 * 4
+
+
+def entry(value):
+    '''Builds a small pixel array filled with one value
+    '''
+    return np.full((10, 10, 4), value, np.uint8)
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.spillDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spillDir)
+
+    def testLeastRecentlyUsedIsEvicted(self):
+        cache = resultCache.ResultCache(maxBytes=3 * ENTRY_BYTES)
+        for key in 'abc':
+            cache.put(key, entry(ord(key)))
+
+        cache.get('a')
+        cache.put('d', entry(4))
+
+        self.assertIsNone(cache.get('b'))
+        for key in 'acd':
+            self.assertIsNotNone(cache.get(key))
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['bytes'], 3 * ENTRY_BYTES)
+
+    def testEntriesAreReadOnly(self):
+        cache = resultCache.ResultCache()
+        cache.put('a', entry(1))
+        self.assertFalse(cache.get('a').flags.writeable)
+
+    def testTooLargeIsNotStored(self):
+        cache = resultCache.ResultCache(maxBytes=ENTRY_BYTES - 1)
+        cache.put('a', entry(1))
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def testSpillAndReadBack(self):
+        cache = resultCache.ResultCache(maxBytes=ENTRY_BYTES, spillDir=self.spillDir)
+        cache.put('a', entry(1))
+        cache.put('b', entry(2))
+        self.assertEqual(cache.stats()['spilledEntries'], 1)
+
+        np.testing.assert_array_equal(cache.get('a'), entry(1))
+        stats = cache.stats()
+        self.assertEqual(stats['diskHits'], 1)
+
+        #reading a back pushed b out to disk in turn
+        self.assertEqual(stats['spilledEntries'], 1)
+        np.testing.assert_array_equal(cache.get('b'), entry(2))
+
+    def testSpillBudget(self):
+        cache = resultCache.ResultCache(maxBytes=ENTRY_BYTES, spillDir=self.spillDir,
+                                        maxSpillBytes=2 * ENTRY_BYTES)
+        for value in range(5):
+            cache.put(str(value), entry(value))
+
+        self.assertEqual(cache.stats()['spilledBytes'], 2 * ENTRY_BYTES)
+        self.assertIsNone(cache.get('0'))
+        np.testing.assert_array_equal(cache.get('3'), entry(3))
+
+    def testKeyDependsOnContentAndParameters(self):
+        cache = resultCache.ResultCache()
+        key = cache.key('gamma', (1.2,), [entry(1)])
+        self.assertEqual(key, cache.key('gamma', (1.2,), [entry(1)]))
+        self.assertNotEqual(key, cache.key('gamma', (1.3,), [entry(1)]))
+        self.assertNotEqual(key, cache.key('gamma', (1.2,), [entry(2)]))
+        self.assertNotEqual(key, cache.key('gamma', (1.2,), [np.full((10, 10, 4), 1, np.uint16)]))
+
+    def testGraphCachesWholeResult(self):
+        cache = resultCache.ResultCache()
+        calls = []
+
+        def edge(array):
+            calls.append(array.shape)
+            return ops.edge(array)
+
+        array = np.random.RandomState(11).randint(0, 256, (300, 40, 4)).astype(np.uint8)
+        function = cache.wrap('edge', (), edge)
+
+        first = graph.apply(function, graph.source(array), halo=1).evaluate()
+        bands = len(calls)
+        second = graph.apply(function, graph.source(array.copy()), halo=1).evaluate()
+
+        self.assertIs(second, first)
+        self.assertEqual(len(calls), bands)
+        self.assertEqual(cache.stats()['entries'], 1)
+        np.testing.assert_array_equal(first, ops.edge(array))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+'''Tiled, out-of-core processing for images larger than memory.
+
+Sources and destinations are .npy files of (height, width, 4) uint8 pixels
+opened as memory maps, so only the tile being worked on is read into memory.
+Each tile is cut out with a halo of extra pixels around it, large enough for
+the neighbourhood of the spatial filters, and only its inner part is written
+to the destination. Tiles therefore give the same result as processing the
+whole image at once, while peak memory follows the tile size instead of the
+image size.
+'''
+
+import numpy as np
+
+#edge length of the square tiles in pixels
+TILE_SIZE = 1024
+
+
+def openSource(fileName):
+    '''Memory-maps a .npy pixel file for reading
+
+        Args:
+            fileName: path of a .npy file holding a (height, width, 4) uint8 array
+
+        Returns:
+            The read-only memory-mapped pixel array
+
+        Raises:
+            ValueError: if the file does not hold a pixel array
+    '''
+    source = np.load(fileName, mmap_mode='r')
+
+    if source.dtype != np.uint8 or source.ndim != 3 or source.shape[2] != 4:
+        raise ValueError("%s is not a (height, width, 4) uint8 pixel array" % fileName)
+
+    return source
+
+
+def createDestination(fileName, height, width):
+    '''Creates a memory-mapped .npy pixel file for writing
+
+        Args:
+            fileName: path of the .npy file to create
+            height: int image height
+            width: int image width
+
+        Returns:
+            The writable memory-mapped pixel array
+    '''
+    return np.lib.format.open_memmap(fileName, mode='w+', dtype=np.uint8, shape=(height, width, 4))
+
+
+def tileBoxes(height, width, tileSize=TILE_SIZE):
+    '''Splits an image into tiles
+
+        Args:
+            height: int image height
+            width: int image width
+            tileSize: int edge length of the tiles
+
+        Returns:
+            A list of (top, left, bottom, right) tile boxes
+    '''
+    return [(top, left, min(top + tileSize, height), min(left + tileSize, width))
+            for top in range(0, height, tileSize)
+            for left in range(0, width, tileSize)]
+
+
+def process(function, sources, destination, halo=0, tileSize=TILE_SIZE, progress=None):
+    '''Runs a function over an image tile by tile
+
+        Args:
+            function: function taking one tile per source and returning the
+                processed tile with the same shape
+            sources: list of same-size pixel arrays, usually memory maps
+            destination: pixel array the results are written to
+            halo: int pixels of context the function needs around each tile
+            tileSize: int edge length of the tiles
+            progress: optional function called with the number of tiles done
+                and the total after each tile; it can raise to abort
+    '''
+    height, width = destination.shape[:2]
+    boxes = tileBoxes(height, width, tileSize)
+
+    for done, (top, left, bottom, right) in enumerate(boxes, 1):
+        haloTop = max(top - halo, 0)
+        haloLeft = max(left - halo, 0)
+        haloBottom = min(bottom + halo, height)
+        haloRight = min(right + halo, width)
+
+        tiles = [np.ascontiguousarray(source[haloTop:haloBottom, haloLeft:haloRight])
+                 for source in sources]
+        result = function(*tiles)
+
+        destination[top:bottom, left:right] = result[top - haloTop:bottom - haloTop,
+                                                     left - haloLeft:right - haloLeft]
+
+        if progress is not None:
+            progress(done, len(boxes))
+
+    if hasattr(destination, 'flush'):
+        destination.flush()
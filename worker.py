@@ -0,0 +1,98 @@
+'''Background evaluation of graph nodes for the viewer.
+
+A Job evaluates a node on a QThread so the window keeps repainting while a
+long median or chromaKey runs. A job can first render quick previews (see
+preview.stages), each sent with the previewed signal. The node is then
+computed band by band (see graph.Node.evaluate), which gives the progress
+signal and lets cancel() stop the job between bands; the node is then left
+unevaluated and the image shown before is kept. A node computed in one piece
+cannot be stopped part way, but its result is dropped once it is done. Most
+of the NumPy work releases the GIL, so the GUI thread stays responsive while
+the job runs.
+'''
+
+import time
+
+from PyQt4 import QtCore
+
+
+class Cancelled(Exception):
+    '''Raised inside a job to abort it after cancel()
+    '''
+
+
+class Job(QtCore.QThread):
+    '''Evaluates a graph node on a worker thread
+
+    Signals:
+        previewed(object): a preview pixel array, coarsest first
+        progressed(int): percent of the bands of the current operation done
+        succeeded(object): the result pixel array
+        failed(str): message of the error that stopped the evaluation
+        cancelled(): the job stopped after cancel()
+
+    Attributes:
+        node: graph node being evaluated
+        name: string name of the operation
+        previews: functions without arguments rendering the previews
+        profiler: profiler.Profiler recording the preview and compute
+            phases under the job as token, None for no profiling
+    '''
+
+    previewed = QtCore.pyqtSignal(object)
+    progressed = QtCore.pyqtSignal(int)
+    succeeded = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+    cancelled = QtCore.pyqtSignal()
+
+    def __init__(self, node, name, previews=(), profiler=None, parent=None):
+        super(Job, self).__init__(parent)
+        self.node = node
+        self.name = name
+        self.previews = list(previews)
+        self.profiler = profiler
+        self._cancelled = False
+
+    def cancel(self):
+        '''Asks the job to stop after the band being computed
+        '''
+        self._cancelled = True
+
+    def _progress(self, done, total):
+        '''Reports the bands done and aborts the evaluation once cancelled
+        '''
+        if self._cancelled:
+            raise Cancelled()
+        self.progressed.emit(100 * done // total)
+
+    def run(self):
+        '''Renders the previews, then evaluates the node and emits the outcome
+        '''
+        try:
+            for render in self.previews:
+                if self._cancelled:
+                    raise Cancelled()
+                start = time.time()
+                array = render()
+                self._record('preview', start, array.nbytes)
+                self.previewed.emit(array)
+
+            start = time.time()
+            result = self.node.evaluate(self._progress)
+            self._record('compute', start, result.nbytes)
+
+            #nodes computed in one piece never call _progress
+            if self._cancelled:
+                raise Cancelled()
+        except Cancelled:
+            self.cancelled.emit()
+        except Exception as error:
+            self.failed.emit(str(error))
+        else:
+            self.succeeded.emit(result)
+
+    def _record(self, phase, start, nbytes):
+        '''Adds a phase that started at start and ends now to the profiler
+        '''
+        if self.profiler is not None:
+            self.profiler.record(phase, start, time.time() - start, nbytes, self)